@@ -26,7 +26,7 @@ class AdminActivitySerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 class AdminCategorySerializer(serializers.ModelSerializer):
-    product_count = serializers.SerializerMethodField()
+    product_count = serializers.IntegerField(read_only=True)
     image = serializers.ImageField(required=False)
     slug = serializers.SlugField(required=False)
     
@@ -34,9 +34,6 @@ class AdminCategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'slug', 'description', 'image', 'product_count', 'created_at', 'updated_at']
     
-    def get_product_count(self, obj):
-        return obj.products.count()
-        
     def validate_name(self, value):
         if not value:
             raise serializers.ValidationError("Name is required")
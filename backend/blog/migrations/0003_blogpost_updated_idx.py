@@ -0,0 +1,17 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_blogpost_blog_post_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['updated_at'], name='blog_post_updated_idx'),
+        ),
+    ]
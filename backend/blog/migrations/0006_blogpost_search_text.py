@@ -0,0 +1,77 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:16
+
+import re
+import unicodedata
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Trigram indexes answer the LIKE '%term%' lookups on search_text
+# (store.search.normalized_match); PostgreSQL only, other databases scan.
+CREATE_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS blog_blogpost_search_text_trgm_idx ON blog_blogpost USING gin (search_text gin_trgm_ops)',
+]
+DROP_INDEXES = [
+    'DROP INDEX IF EXISTS blog_blogpost_search_text_trgm_idx',
+]
+
+
+# ecommerce.normalization.normalize_text as of this migration
+CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا', 'ؤ': 'و', 'ئ': 'ی',
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    '\u200c': ' ',
+})
+IGNORED_RE = re.compile('[\u064b-\u065f\u0670\u0640\u200b\u200d\u200e\u200f\ufeff]')
+BATCH_SIZE = 500
+
+
+def normalize_text(text):
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text)
+    text = IGNORED_RE.sub('', text.translate(CHARACTER_MAP))
+    return ' '.join(text.casefold().split())
+
+
+def fill_search_text(model, fields):
+    batch = []
+    for instance in model.objects.only('pk', *fields).iterator(chunk_size=BATCH_SIZE):
+        instance.search_text = '\n'.join(normalize_text(getattr(instance, field) or '') for field in fields)
+        batch.append(instance)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['search_text'])
+
+
+def fill_and_index(apps, schema_editor):
+    fill_search_text(apps.get_model('blog', 'BlogPost'), ('title', 'excerpt', 'content'))
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in CREATE_INDEXES:
+            schema_editor.execute(statement)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in DROP_INDEXES:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_tag_post_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        TrigramExtension(),
+        migrations.RunPython(fill_and_index, drop_indexes),
+    ]
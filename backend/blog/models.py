@@ -1,10 +1,13 @@
 from django.db import models
 from django.utils.text import slugify
 from django.utils import timezone
+from ecommerce.normalization import refresh_search_text
 
 class Tag(models.Model):
     name = models.CharField(max_length=50)
     slug = models.SlugField(max_length=100, unique=True, blank=True)
+    # Number of posts with the tag, kept exact by blog.signals
+    post_count = models.PositiveIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.name
@@ -20,6 +23,8 @@ class BlogPost(models.Model):
     content = models.TextField()
     excerpt = models.TextField(max_length=500, blank=True)
     cover_image = models.ImageField(upload_to='blog/covers/', blank=True, null=True)
+    # Resized copies of cover_image, filled in by ecommerce.images
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     tags = models.ManyToManyField(Tag, blank=True, related_name='posts')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -29,14 +34,27 @@ class BlogPost(models.Model):
     meta_description = models.TextField(max_length=160, blank=True)
     canonical_url = models.URLField(blank=True)
     is_published = models.BooleanField(default=False)
+    # normalize_text() of SEARCH_TEXT_FIELDS, trigram-indexed on PostgreSQL
+    search_text = models.TextField(blank=True, default='', editable=False)
+    
+    SEARCH_TEXT_FIELDS = ('title', 'excerpt', 'content')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='blog_post_created_id_idx'),
+            # MAX(updated_at) for ETag / Last-Modified, see ecommerce.conditional
+            models.Index(fields=['updated_at'], name='blog_post_updated_idx'),
+        ]
         verbose_name = 'Blog Post'
         verbose_name_plural = 'Blog Posts'
     
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        refresh_search_text(self, self.SEARCH_TEXT_FIELDS, kwargs)
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self):
         return f"/blog/{self.slug}/" 
\ No newline at end of file
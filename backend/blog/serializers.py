@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from ecommerce.images import ImageSrcsetField
 from .models import BlogPost, Tag
 
 
@@ -8,25 +9,32 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug']
 
 
+class TagListSerializer(TagSerializer):
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['post_count']
+
+
 class BlogPostListSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
+    cover_image_srcset = ImageSrcsetField(source='cover_image_variants')
     
     class Meta:
         model = BlogPost
         fields = [
-            'id', 'title', 'slug', 'excerpt', 'cover_image',
+            'id', 'title', 'slug', 'excerpt', 'cover_image', 'cover_image_srcset',
             'tags', 'created_at', 'updated_at', 'is_published'
         ]
 
 
 class BlogPostDetailSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
+    cover_image_srcset = ImageSrcsetField(source='cover_image_variants')
     
     class Meta:
         model = BlogPost
         fields = [
             'id', 'title', 'slug', 'content', 'excerpt', 
-            'cover_image', 'tags', 'created_at', 'updated_at',
+            'cover_image', 'cover_image_srcset', 'tags', 'created_at', 'updated_at',
             'meta_title', 'meta_description', 'canonical_url', 
             'is_published'
         ]
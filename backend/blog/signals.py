@@ -1,8 +1,14 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.text import slugify
+from ecommerce.counters import refresh_counts
+from ecommerce.images import register_variants
+from store.cache import invalidate_model
 from .models import BlogPost, Tag
 
+register_variants(BlogPost, 'cover_image', 'cover_image_variants')
+
 @receiver(pre_save, sender=BlogPost)
 def generate_blog_post_slug(sender, instance, **kwargs):
     if not instance.slug:
@@ -14,7 +20,68 @@ def generate_blog_post_slug(sender, instance, **kwargs):
     if not instance.meta_description and instance.excerpt:
         instance.meta_description = instance.excerpt[:157] + '...' if len(instance.excerpt) > 160 else instance.excerpt
 
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+def invalidate_blog_post_payloads(sender, instance, **kwargs):
+    # Post totals (blog.views) and title suggestions (store.autocomplete)
+    invalidate_model('blog.BlogPost')
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def invalidate_post_counts_on_tag_change(sender, instance, action, **kwargs):
+    # Totals of ?tag= listings change with tag membership
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_model('blog.BlogPost')
+
 @receiver(pre_save, sender=Tag)
 def generate_tag_slug(sender, instance, **kwargs):
     if not instance.slug:
-        instance.slug = slugify(instance.name) 
\ No newline at end of file
+        instance.slug = slugify(instance.name)
+
+# Tags are embedded in post payloads but have no timestamp of their own, so
+# tag changes move the updated_at of the affected posts (used for ETags).
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def touch_posts_on_tag_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        posts = BlogPost.objects.filter(pk__in=pk_set) if reverse else BlogPost.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        posts = instance.posts.all() if reverse else BlogPost.objects.filter(pk=instance.pk)
+    else:
+        return
+    posts.update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_posts_on_tag_save(sender, instance, **kwargs):
+    if instance.pk:
+        instance.posts.update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_post_counts_on_tag_save(sender, instance, **kwargs):
+    # Deleting a tag drops its links without m2m_changed; ?tag= totals go stale
+    invalidate_model('blog.BlogPost')
+
+# Tag.post_count counter cache
+
+def refresh_post_counts(tag_ids):
+    refresh_counts(Tag, 'post_count', BlogPost.tags.through, 'tag', tag_ids)
+
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def count_posts_on_tag_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        refresh_post_counts({instance.pk} if reverse else pk_set)
+    elif action == 'pre_clear':
+        # The links are gone by post_clear
+        instance._cleared_tag_ids = {instance.pk} if reverse else set(instance.tags.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_post_counts(instance.__dict__.pop('_cleared_tag_ids', set()))
+
+@receiver(pre_delete, sender=BlogPost)
+def remember_deleted_post_tags(sender, instance, **kwargs):
+    # Deleting a post removes its tag links without an m2m_changed
+    instance._deleted_tag_ids = set(instance.tags.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=BlogPost)
+def count_posts_on_delete(sender, instance, **kwargs):
+    refresh_post_counts(instance.__dict__.pop('_deleted_tag_ids', set()))
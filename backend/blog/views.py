@@ -3,13 +3,18 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.utils.decorators import method_decorator
+from ecommerce.conditional import conditional_on, queryset_state
+from ecommerce.pagination import BLOG_POST_ORDERINGS, KeysetPaginator, wants_cursor
+from ecommerce.counting import count_mode, counted_page
+from ecommerce.search import match_text, search_terms
 from .models import BlogPost, Tag
 from .serializers import (
     BlogPostListSerializer,
     BlogPostDetailSerializer,
     BlogPostCreateUpdateSerializer,
     TagSerializer,
+    TagListSerializer,
     BlogPostSerializer
 )
 
@@ -18,7 +23,13 @@ class IsAdminUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.is_staff
 
+def blog_state(request, *args, **kwargs):
+    return queryset_state(BlogPost.objects.all(), Tag.objects.all())
+
+blog_conditional = conditional_on(blog_state)
+
 # Public API endpoints
+@method_decorator(blog_conditional, name='get')
 class BlogPostListView(generics.ListAPIView):
     serializer_class = BlogPostListSerializer
     permission_classes = [permissions.AllowAny]
@@ -35,11 +46,8 @@ class BlogPostListView(generics.ListAPIView):
         # Apply search filter if search parameter is provided
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(content__icontains=search) |
-                Q(excerpt__icontains=search)
-            )
+            # Normalized like BlogPost.search_text, see ecommerce.normalization
+            queryset = match_text(queryset, search)
         
         return queryset
     
@@ -54,26 +62,34 @@ class BlogPostListView(generics.ListAPIView):
         if page_size not in [4, 8, 16, 32]:
             page_size = 8
         
-        # Calculate offset and limit
-        offset = (page - 1) * page_size
+        if wants_cursor(request):
+            paginator = KeysetPaginator(BLOG_POST_ORDERINGS['newest'], page_size)
+            page = paginator.paginate(queryset, request.query_params.get('cursor'))
+            serializer = self.get_serializer(page.object_list, many=True)
+            return Response({
+                'posts': serializer.data,
+                'next_cursor': page.next_cursor,
+                'previous_cursor': page.previous_cursor,
+                'page_size': page_size
+            })
         
-        # Get total count for pagination info
-        total_items = queryset.count()
-        total_pages = (total_items + page_size - 1) // page_size  # Ceiling division
+        # Totals are cached per tag/search filter; ?count=none skips them
+        filters = {
+            'tag': request.query_params.get('tag', ''),
+            'search': ' '.join(search_terms(request.query_params.get('search', ''))),
+        }
+        posts, pagination = counted_page(
+            queryset, 'blog_post_count', filters, max(page, 1), page_size, count_mode(request)
+        )
         
-        # Apply pagination
-        queryset = queryset[offset:offset + page_size]
-        
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_serializer(posts, many=True)
         
         return Response({
             'posts': serializer.data,
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'current_page': page,
-            'page_size': page_size
+            **pagination
         })
 
+@method_decorator(blog_conditional, name='get')
 class BlogPostDetailView(generics.RetrieveAPIView):
     serializer_class = BlogPostDetailSerializer
     permission_classes = [permissions.AllowAny]
@@ -133,9 +149,10 @@ class BlogPostPreviewView(APIView):
         return Response(serializer.data)
 
 # Tag API endpoints
+@method_decorator(blog_conditional, name='get')
 class TagListView(generics.ListAPIView):
     queryset = Tag.objects.all()
-    serializer_class = TagSerializer
+    serializer_class = TagListSerializer
     permission_classes = [permissions.AllowAny]
 
 class TagDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -0,0 +1,129 @@
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Least
+
+from .models import Cart, CartItem
+
+# Cookie holding an anonymous cart's key until its owner logs in
+CART_COOKIE = 'cart_key'
+CART_COOKIE_AGE = 60 * 60 * 24 * 30
+
+# Most of one product a cart line can hold, as CheckoutSerializer allows
+MAX_QUANTITY = 100
+
+# Product columns a cart line renders (see serializers.CartLineSerializer)
+PRODUCT_COLUMNS = ('id', 'name', 'slug', 'price', 'image', 'image_variants', 'stock', 'available')
+
+
+class CartSession:
+    """
+    The cart of one request: the user's when logged in, otherwise the one
+    keyed by the anonymous cart cookie. An anonymous cart still present once
+    its owner is logged in is merged into their cart on their next cart
+    request, whichever login endpoint they used.
+
+    Views call finish(response) last so the cookie is set or cleared.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user if request.user.is_authenticated else None
+        self.key = request.COOKIES.get(CART_COOKIE)
+        self._set_cookie = False
+        self._clear_cookie = False
+        if self.user is not None and self.key:
+            merge_anonymous_cart(self.key, self.user)
+            self.key = None
+            self._clear_cookie = True
+
+    def _owner(self, prefix=''):
+        if self.user is not None:
+            return {f'{prefix}user': self.user}
+        return {f'{prefix}session_key': self.key}
+
+    def lines(self):
+        """
+        The cart's items with their products' current price, stock and
+        availability: a single query joining cart, item and product.
+        """
+        if self.user is None and not self.key:
+            return []
+        return list(
+            CartItem.objects.filter(**self._owner('cart__'))
+            .select_related('product')
+            .only('id', 'quantity', 'product', *(f'product__{column}' for column in PRODUCT_COLUMNS))
+        )
+
+    def get_or_create(self):
+        if self.user is None and not self.key:
+            self.key = secrets.token_urlsafe(32)
+            self._set_cookie = True
+        cart, _ = Cart.objects.get_or_create(**self._owner())
+        return cart
+
+    def add(self, product, quantity):
+        cart = self.get_or_create()
+        item, created = CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': quantity})
+        if not created:
+            CartItem.objects.filter(pk=item.pk).update(quantity=Least(F('quantity') + quantity, MAX_QUANTITY))
+
+    def item(self, item_id):
+        """The cart's item item_id, or None."""
+        if self.user is None and not self.key:
+            return None
+        return CartItem.objects.filter(pk=item_id, **self._owner('cart__')).first()
+
+    def finish(self, response):
+        if self._set_cookie:
+            response.set_cookie(
+                CART_COOKIE, self.key, max_age=CART_COOKIE_AGE, httponly=True,
+                samesite=settings.SIMPLE_JWT['AUTH_COOKIE_SAMESITE'],
+                secure=settings.SIMPLE_JWT['AUTH_COOKIE_SECURE'],
+            )
+        elif self._clear_cookie:
+            response.delete_cookie(CART_COOKIE, samesite=settings.SIMPLE_JWT['AUTH_COOKIE_SAMESITE'])
+        return response
+
+
+def merge_anonymous_cart(key, user):
+    """Move the items of the anonymous cart `key` into user's cart."""
+    with transaction.atomic():
+        anonymous = Cart.objects.select_for_update().filter(session_key=key, user__isnull=True).first()
+        if anonymous is None:
+            return
+        cart, _ = Cart.objects.get_or_create(user=user)
+        existing = {item.product_id: item for item in cart.items.all()}
+        moved, combined = [], []
+        for item in anonymous.items.all():
+            if item.product_id in existing:
+                kept = existing[item.product_id]
+                kept.quantity = min(kept.quantity + item.quantity, MAX_QUANTITY)
+                combined.append(kept)
+            else:
+                item.cart = cart
+                moved.append(item)
+        CartItem.objects.bulk_update(moved, ['cart'])
+        CartItem.objects.bulk_update(combined, ['quantity'])
+        anonymous.delete()
+
+
+def cart_totals(lines):
+    """Item count and subtotal of the lines that can be ordered as they are."""
+    orderable = [line for line in lines if line_status(line) == 'ok']
+    return {
+        'total_items': sum(line.quantity for line in orderable),
+        'subtotal': sum((line.product.price * line.quantity for line in orderable), start=Decimal('0.00')),
+    }
+
+
+def line_status(line):
+    """'ok', 'unavailable' or 'insufficient_stock' for a hydrated cart line."""
+    if not line.product.available:
+        return 'unavailable'
+    if line.product.stock < line.quantity:
+        return 'insufficient_stock'
+    return 'ok'
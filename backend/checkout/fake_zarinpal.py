@@ -0,0 +1,155 @@
+import json
+import secrets
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeZarinPal:
+    """
+    A local stand-in for the ZarinPal v4 API, for tests and for running the
+    checkout against without the sandbox:
+
+        with FakeZarinPal() as gateway, override_settings(ZARINPAL_BASE_URL=gateway.url):
+            ...
+            gateway.pay(authority)          # the buyer completes the payment
+
+    Payment requests get a fresh authority; verify answers 100 once the
+    buyer paid, 101 after that, -50 for another amount, -51 before paying
+    and -54 for an unknown authority. fail_next() queues faults for the
+    next calls: an HTTP status, a gateway code, or a delay in seconds.
+
+    Connections are kept alive, and `connections` counts the ones opened.
+    """
+
+    def __init__(self):
+        self.payments = {}
+        self.calls = []
+        self.connections = 0
+        self._faults = deque()
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), _handler(self))
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def pay(self, authority):
+        with self._lock:
+            self.payments[authority]['paid'] = True
+
+    def fail_next(self, *faults):
+        """Queue faults: ('status', 503), ('code', -12) or ('delay', 0.5)."""
+        with self._lock:
+            self._faults.extend(faults)
+
+    def calls_to(self, operation):
+        return sum(path.endswith(f'/{operation}.json') for path, _ in self.calls)
+
+    def answer(self, path, body):
+        """(HTTP status, payload) for a call, after any queued fault."""
+        with self._lock:
+            self.calls.append((path, body))
+            fault = self._faults.popleft() if self._faults else None
+        if fault and fault[0] == 'delay':
+            time.sleep(fault[1])
+        elif fault and fault[0] == 'status':
+            return fault[1], {'message': 'Fake gateway failure'}
+        elif fault and fault[0] == 'code':
+            return 400, _failure(fault[1])
+
+        if path == '/pg/v4/payment/request.json':
+            return self._request(body)
+        if path == '/pg/v4/payment/verify.json':
+            return self._verify(body)
+        return 404, _failure(-9)
+
+    def _request(self, body):
+        if not body.get('merchant_id') or not isinstance(body.get('amount'), int) or not body.get('callback_url'):
+            return 400, _failure(-9)
+        authority = 'A' + secrets.token_hex(17).upper()
+        with self._lock:
+            self.payments[authority] = {'amount': body['amount'], 'paid': False, 'verified': False}
+        return 200, _success(100, authority=authority, fee_type='Merchant', fee=0)
+
+    def _verify(self, body):
+        with self._lock:
+            payment = self.payments.get(body.get('authority'))
+            if payment is None:
+                return 400, _failure(-54)
+            if body.get('amount') != payment['amount']:
+                return 400, _failure(-50)
+            if not payment['paid']:
+                return 400, _failure(-51)
+            code = 101 if payment['verified'] else 100
+            payment['verified'] = True
+            ref_id = payment.setdefault('ref_id', 200 + len(self.payments))
+        return 200, _success(
+            code, ref_id=ref_id, card_pan='502229******5995',
+            card_hash='1EBE3EBEBE35C7EC0F8D6EE4F2F859107A87822CA179BC9528767EA7B5489B69',
+            fee_type='Merchant', fee=0,
+        )
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out on a delayed answer are gone; that is expected
+        pass
+
+
+def _success(code, **data):
+    return {'data': {'code': code, 'message': 'Paid' if code == 100 else 'Verified', **data}, 'errors': []}
+
+
+def _failure(code):
+    return {'data': [], 'errors': {'code': code, 'message': f'Fake gateway error {code}', 'validations': []}}
+
+
+def _handler(gateway):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        timeout = 10
+
+        def setup(self):
+            super().setup()
+            with gateway._lock:
+                gateway.connections += 1
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                body = {}
+            status, payload = gateway.answer(self.path, body)
+            content = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
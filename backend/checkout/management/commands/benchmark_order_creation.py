@@ -0,0 +1,63 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from checkout.serializers import CheckoutSerializer
+from store.models import Product
+
+CUSTOMER = {
+    'first_name': 'Bench', 'last_name': 'Mark', 'email': 'bench@example.com',
+    'phone': '09120000000', 'address': 'Benchmark street',
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time CheckoutSerializer order creation for carts of 1 to 100 lines. The query count '
+        'stays the same at every size; the time still grows with the rows inserted. Runs in '
+        'a transaction that is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,25,50,100', help='Comma-separated cart sizes')
+        parser.add_argument('--repeat', type=int, default=20, help='Orders created per size')
+
+    def handle(self, *args, sizes, repeat, **options):
+        sizes = [int(size) for size in sizes.split(',')]
+        try:
+            with transaction.atomic():
+                self._run(sizes, repeat)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, sizes, repeat):
+        user = get_user_model().objects.create_user(email='order-benchmark@example.com', password=None)
+        products = Product.objects.bulk_create(
+            Product(name=f'Benchmark {i}', slug=f'order-benchmark-{i}', price=Decimal('1000.00'), stock=1000)
+            for i in range(max(sizes))
+        )
+        self.stdout.write(f"{'lines':>6}{'queries':>9}{'p50':>10}{'p95':>10}")
+        for size in sizes:
+            data = {**CUSTOMER, 'items': [{'product_id': product.pk, 'quantity': 2} for product in products[:size]]}
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    serializer = CheckoutSerializer(data=data)
+                    serializer.is_valid(raise_exception=True)
+                    serializer.save(user=user, status='pending')
+                    timings.append(time.perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                f'{size:>6}{len(queries):>9}'
+                f'{timings[len(timings) // 2] * 1000:>8.2f}ms{timings[int(len(timings) * 0.95)] * 1000:>8.2f}ms'
+            )
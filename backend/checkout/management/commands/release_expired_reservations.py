@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from checkout.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Cancel unpaid orders whose stock reservation has expired and return their stock (run from cron)'
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(f'Released {released} expired reservation(s)')
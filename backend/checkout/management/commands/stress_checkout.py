@@ -0,0 +1,126 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from checkout.models import Order, OrderItem
+from checkout.serializers import CheckoutSerializer
+from checkout.stock import InsufficientStock
+from store.models import Product
+
+CUSTOMER = {
+    'first_name': 'Stress', 'last_name': 'Test', 'email': 'stress@example.com',
+    'phone': '09120000000', 'address': 'Stress test street',
+}
+
+
+def _buy(product_id, user_id):
+    start = time.perf_counter()
+    try:
+        serializer = CheckoutSerializer(data={**CUSTOMER, 'items': [{'product_id': product_id, 'quantity': 1}]})
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user_id=user_id, status='pending')
+        outcome = 'ordered'
+    except InsufficientStock:
+        outcome = 'sold_out'
+    except Exception as error:
+        outcome = type(error).__name__
+    return outcome, time.perf_counter() - start
+
+
+def run_buyers(product_id, user_id, buyers, threads):
+    """
+    buyers checkouts of one unit of product_id from `threads` threads that
+    start together, each on its own database connection.
+    """
+    results = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def buyer(count):
+        barrier.wait()
+        outcomes = [_buy(product_id, user_id) for _ in range(count)]
+        connection.close()
+        with lock:
+            results.extend(outcomes)
+
+    shares = [buyers // threads + (index < buyers % threads) for index in range(threads)]
+    workers = [threading.Thread(target=buyer, args=(share,)) for share in shares]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        'Race concurrent buyers for the last units of one product through '
+        'CheckoutSerializer and check that stock was never oversold. Meant for '
+        'a local PostgreSQL database; the rows it creates are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=100, help='Units of the contested product')
+        parser.add_argument('--buyers', type=int, default=150, help='Checkouts attempted in total')
+        parser.add_argument('--threads', type=int, default=50, help='Concurrent buyers per process')
+        parser.add_argument('--processes', type=int, default=1, help='Processes, each running --threads buyers')
+        parser.add_argument(
+            '--any-database', action='store_true',
+            help='Run on a database other than PostgreSQL (no row locks, so not a real test)'
+        )
+
+    def handle(self, *args, stock, buyers, threads, processes, any_database, **options):
+        if connection.vendor != 'postgresql' and not any_database:
+            raise CommandError('The stress test needs PostgreSQL row locks; pass --any-database to run it anyway')
+
+        tag = uuid.uuid4().hex[:8]
+        user = get_user_model().objects.create_user(email=f'stress-{tag}@example.com', password=None)
+        product = Product.objects.create(name=f'Stress {tag}', slug=f'stress-{tag}', price=Decimal('1000.00'), stock=stock)
+        try:
+            results, elapsed = self._race(product.pk, user.pk, buyers, threads, processes)
+            self._report(product, stock, results, elapsed, threads * processes)
+        finally:
+            Order.objects.filter(user=user).delete()
+            product.delete()
+            user.delete()
+
+    def _race(self, product_id, user_id, buyers, threads, processes):
+        start = time.perf_counter()
+        if processes == 1:
+            results = run_buyers(product_id, user_id, buyers, threads)
+        else:
+            # Forked children must not share the parent's connection
+            connections.close_all()
+            shares = [buyers // processes + (index < buyers % processes) for index in range(processes)]
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                batches = pool.starmap(run_buyers, [(product_id, user_id, share, threads) for share in shares])
+            results = [result for batch in batches for result in batch]
+        return results, time.perf_counter() - start
+
+    def _report(self, product, stock, results, elapsed, concurrency):
+        outcomes = Counter(outcome for outcome, _ in results)
+        latencies = sorted(latency for _, latency in results)
+        product.refresh_from_db()
+        ordered_units = OrderItem.objects.filter(product=product).count()
+
+        self.stdout.write(f'{len(results)} checkouts from {concurrency} concurrent buyers in {elapsed:.2f}s')
+        self.stdout.write(f'  throughput: {len(results) / elapsed:.1f} checkouts/s')
+        self.stdout.write(
+            f'  latency p50/p95/max: {latencies[len(latencies) // 2] * 1000:.1f}/'
+            f'{latencies[int(len(latencies) * 0.95)] * 1000:.1f}/{latencies[-1] * 1000:.1f}ms'
+        )
+        self.stdout.write(f"  outcomes: {dict(outcomes)}")
+        self.stdout.write(f'  stock: {stock} -> {product.stock}, units ordered: {ordered_units}')
+
+        if product.stock < 0 or ordered_units > stock or product.stock != stock - ordered_units:
+            raise CommandError('Stock was oversold')
+        if outcomes['ordered'] != ordered_units:
+            raise CommandError('Reported orders do not match the order items written')
+        self.stdout.write(self.style.SUCCESS('No oversell'))
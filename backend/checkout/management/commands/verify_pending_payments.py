@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from checkout.payments import verify_stalled_payments
+
+
+class Command(BaseCommand):
+    help = 'Verify payments still waiting for gateway confirmation after their callback (run from cron)'
+
+    def handle(self, *args, **options):
+        settled = verify_stalled_payments()
+        self.stdout.write(f'Settled {settled} pending payment(s)')
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0005_cart'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reservation_status',
+            field=models.CharField(choices=[('none', 'None'), ('reserved', 'Reserved'), ('committed', 'Committed'), ('released', 'Released')], default='none', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='reserved_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['reservation_status', 'reserved_until'], name='checkout_order_reservation_idx'),
+        ),
+    ]
@@ -15,11 +15,20 @@ class Order(models.Model):
     
     PAYMENT_STATUS_CHOICES = (
         ('pending', 'Pending'),
+        # Back from the gateway, verification queued (checkout.payments)
+        ('verifying', 'Verifying'),
         ('paid', 'Paid'),
         ('failed', 'Failed'),
         ('refunded', 'Refunded'),
     )
     
+    RESERVATION_STATUS_CHOICES = (
+        ('none', 'None'),
+        ('reserved', 'Reserved'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+    )
+    
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='orders', on_delete=models.CASCADE)
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -36,11 +45,19 @@ class Order(models.Model):
     authority = models.CharField(max_length=255, blank=True, null=True)
     ref_id = models.CharField(max_length=255, blank=True, null=True)
     
+    # Stock taken off store.Product for this order, see checkout.stock
+    reservation_status = models.CharField(max_length=20, choices=RESERVATION_STATUS_CHOICES, default='none')
+    reserved_until = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ('-created_at',)
+        indexes = [
+            # Expired reservations, found by the release_expired_reservations sweeper
+            models.Index(fields=['reservation_status', 'reserved_until'], name='checkout_order_reservation_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.id} - {self.user.email}"
@@ -82,3 +99,41 @@ class Transaction(models.Model):
     
     def __str__(self):
         return f"Transaction {self.id} - Order {self.order.id}"
+
+class Cart(models.Model):
+    """
+    A shopper's cart, owned by a user or, before login, by the random key in
+    the anonymous cart cookie; see checkout.cart.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, related_name='cart', on_delete=models.CASCADE, null=True, blank=True
+    )
+    session_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(user__isnull=False) | models.Q(session_key__isnull=False),
+                name='checkout_cart_has_owner',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Cart {self.id} - {self.user_id or 'anonymous'}"
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='cart_items', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1)
+    added_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ('added_at', 'id')
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='checkout_cartitem_cart_product_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
@@ -0,0 +1,118 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Order, Transaction
+from .stock import commit_reservation, release_reservation
+from .zarinpal import GatewayError, GatewayUnavailable, get_client
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PAYMENT_VERIFICATION_WORKERS, thread_name_prefix='payment-verification'
+        )
+    return _executor
+
+
+def _run(order_id):
+    try:
+        verify_payment(order_id)
+    except Exception:
+        logger.exception('Verifying the payment of order %s failed', order_id)
+    finally:
+        close_old_connections()
+
+
+def enqueue_verification(order_id):
+    """
+    Verify an order's payment in the background. With
+    PAYMENT_VERIFICATION_WORKERS > 0 a thread pool does the gateway round
+    trip and this returns at once; with 0 it happens inline (tests).
+    """
+    if not settings.PAYMENT_VERIFICATION_WORKERS:
+        verify_payment(order_id)
+        return
+    _get_executor().submit(_run, order_id)
+
+
+def verify_payment(order_id):
+    """
+    Ask the gateway about an order in the 'verifying' payment status and
+    settle it: 'paid' and its reservation committed, or 'failed' and its
+    stock released, with the authority's transaction updated to match.
+
+    Verify calls are idempotent, so racing workers may both make one, but
+    the order row is locked and re-checked before anything is written: only
+    the first result is applied. Only a rejection of the payment itself
+    fails the order. Returns the new payment status, or None when the order
+    was settled already or the gateway could not settle it: unavailable, or
+    answering with a merchant / configuration error. The order then stays
+    'verifying' for verify_stalled_payments to retry.
+    """
+    order = Order.objects.filter(pk=order_id, payment_status='verifying').first()
+    if order is None:
+        return None
+    authority = order.authority
+    try:
+        # Convert to Rials (assuming the price is stored in Tomans)
+        data, failure = get_client().verify(amount=int(order.total_price * 10), authority=authority), None
+    except GatewayUnavailable as error:
+        logger.warning('Cannot verify the payment of order %s yet: %s', order_id, error.message)
+        return None
+    except GatewayError as error:
+        if not error.rejects_payment:
+            logger.error(
+                'Cannot verify the payment of order %s: gateway error %s - %s', order_id, error.code, error.description
+            )
+            return None
+        data, failure = None, error
+
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order_id)
+        if order.payment_status != 'verifying' or order.authority != authority:
+            return None
+        if failure is None:
+            order.ref_id = data.get('ref_id')
+            order.payment_status = 'paid'
+            order.status = 'processing'
+            order.save()
+            commit_reservation(order)
+            _settle_transaction(
+                order, authority, status='successful', status_code=data.get('code'),
+                ref_id=data.get('ref_id'), card_pan=data.get('card_pan'), card_hash=data.get('card_hash'),
+                fee_type=data.get('fee_type'), fee=data.get('fee', 0),
+            )
+        else:
+            logger.info('Payment of order %s failed verification: %s - %s', order_id, failure.code, failure.description)
+            order.payment_status = 'failed'
+            order.save()
+            release_reservation(order)
+            _settle_transaction(order, authority, status='failed', status_code=failure.code)
+    return order.payment_status
+
+
+def _settle_transaction(order, authority, **fields):
+    # The pending transaction written when the payment was requested
+    if not order.transactions.filter(authority=authority, status='pending').update(**fields):
+        Transaction.objects.create(order=order, amount=order.total_price, authority=authority, **fields)
+
+
+def verify_stalled_payments(older_than=timedelta(minutes=1)):
+    """
+    Verify orders left in 'verifying', because the gateway was unavailable
+    or the process restarted with the job queued; returns how many settled.
+    """
+    stalled = Order.objects.filter(
+        payment_status='verifying', updated_at__lt=timezone.now() - older_than
+    ).values_list('pk', flat=True)
+    return sum(verify_payment(order_id) is not None for order_id in list(stalled))
@@ -1,5 +1,10 @@
+from decimal import Decimal
+
+from django.db import transaction
 from rest_framework import serializers
-from .models import Order, OrderItem, Transaction
+from .cart import MAX_QUANTITY, line_status
+from .stock import reservation_deadline, take_stock
+from .models import CartItem, Order, OrderItem, Transaction
 from store.serializers import ProductSerializer
 from store.models import Product
 
@@ -36,12 +41,27 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['user', 'created_at', 'updated_at']
 
-class CartItemSerializer(serializers.Serializer):
-    product_id = serializers.IntegerField()
-    quantity = serializers.IntegerField(min_value=1, max_value=100)
+class CartLineSerializer(serializers.ModelSerializer):
+    """A cart item with its product's current price, stock and availability."""
+    product = ProductSerializer(read_only=True, fields=[
+        'id', 'name', 'slug', 'price', 'image', 'image_srcset', 'stock', 'available'
+    ])
+    line_total = serializers.SerializerMethodField()
+    status = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = CartItem
+        fields = ['id', 'product', 'quantity', 'line_total', 'status']
+    
+    def get_line_total(self, obj):
+        return obj.product.price * obj.quantity
+    
+    def get_status(self, obj):
+        return line_status(obj)
 
 class CheckoutSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, write_only=True)
+    # [{"product_id": ..., "quantity": ...}], checked in validate_items
+    items = serializers.ListField(write_only=True, allow_empty=False)
     
     class Meta:
         model = Order
@@ -50,18 +70,43 @@ class CheckoutSerializer(serializers.ModelSerializer):
             'address', 'items'
         ]
     
+    def validate_items(self, items):
+        # Lines are checked by hand against one price lookup rather than by a
+        # nested serializer, whose per-field work outweighed the rest of a
+        # large order; the prices are kept for create().
+        lines = []
+        for item in items:
+            try:
+                line = (int(str(item['product_id'])), int(str(item['quantity'])))
+            except (TypeError, KeyError, ValueError):
+                raise serializers.ValidationError('Every item needs an integer product_id and quantity.')
+            if not 1 <= line[1] <= MAX_QUANTITY:
+                raise serializers.ValidationError(f'Quantities must be between 1 and {MAX_QUANTITY}.')
+            lines.append(line)
+        product_ids = {product_id for product_id, _ in lines}
+        self.prices = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'price'))
+        missing = sorted(product_ids - set(self.prices))
+        if missing:
+            raise serializers.ValidationError(f"Unknown products: {', '.join(map(str, missing))}")
+        return lines
+    
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
+        lines = validated_data.pop('items')
+        # Prices come from the product rows, never from the client
+        validated_data.setdefault('total_price', sum(
+            (self.prices[product_id] * quantity for product_id, quantity in lines), start=Decimal('0.00')
+        ))
         
-        # Create order items with correct prices from the product model
-        for item_data in items_data:
-            product = Product.objects.get(id=item_data['product_id'])
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                price=product.price,
-                quantity=item_data['quantity']
+        with transaction.atomic():
+            # Reserve the stock first: an order that cannot be filled is never
+            # written, and the sweeper returns it if the order goes unpaid
+            take_stock(lines)
+            order = Order.objects.create(
+                **validated_data, reservation_status='reserved', reserved_until=reservation_deadline()
             )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=product_id, price=self.prices[product_id], quantity=quantity)
+                for product_id, quantity in lines
+            ])
         
-        return order 
\ No newline at end of file
+        return order
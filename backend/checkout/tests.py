@@ -1,3 +1,351 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from store.cache import current_generation
+from store.models import Product
+from .cart import CART_COOKIE
+from .fake_zarinpal import FakeZarinPal
+from .payments import verify_stalled_payments
+from .models import Cart, CartItem, Order
+from .stock import commit_reservation, release_expired_reservations
+from .zarinpal import (
+    VERIFY_ATTEMPTS, CircuitBreaker, GatewayError, GatewayRateLimited, GatewayUnavailable, RateLimiter,
+    ZarinPalClient, get_client,
+)
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='buyer@example.com', password='secret')
+        self.lamp = Product.objects.create(name='Lamp', slug='lamp', price=Decimal('12.50'), stock=5)
+        self.rug = Product.objects.create(name='Rug', slug='rug', price=Decimal('40.00'), stock=1)
+
+    def add(self, product, quantity=1):
+        return self.client.post(f'/api/checkout/cart/add/{product.pk}/', {'quantity': quantity}, format='json')
+
+    def test_anonymous_cart_is_kept_by_cookie(self):
+        response = self.add(self.lamp, 2)
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(CART_COOKIE, response.cookies)
+        self.add(self.lamp)
+
+        data = self.client.get('/api/checkout/cart/').data
+        self.assertEqual([(line['product']['slug'], line['quantity']) for line in data['items']], [('lamp', 3)])
+        self.assertEqual(data['subtotal'], Decimal('37.50'))
+
+    def test_read_hydrates_every_line_in_one_query(self):
+        self.client.force_authenticate(self.user)
+        self.add(self.lamp, 2)
+        self.add(self.rug)
+        Product.objects.filter(pk=self.rug.pk).update(price=Decimal('35.00'), stock=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/checkout/cart/').data
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([line['status'] for line in data['items']], ['ok', 'insufficient_stock'])
+        self.assertEqual(data['items'][1]['product']['price'], '35.00')
+        # Lines that cannot be ordered are left out of the totals
+        self.assertEqual((data['total_items'], data['subtotal']), (2, Decimal('25.00')))
+
+    def test_anonymous_cart_merges_on_login(self):
+        self.add(self.lamp, 2)
+        self.add(self.rug)
+
+        Cart.objects.create(user=self.user).items.create(product=self.lamp, quantity=1)
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/checkout/cart/')
+        self.assertEqual(response.cookies[CART_COOKIE].value, '')
+        self.assertEqual(
+            sorted((line['product']['slug'], line['quantity']) for line in response.data['items']),
+            [('lamp', 3), ('rug', 1)],
+        )
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_update_and_remove_only_own_items(self):
+        self.add(self.lamp)
+        item = CartItem.objects.get()
+
+        other = APIClient()
+        self.assertEqual(other.put(f'/api/checkout/cart/update/{item.pk}/', {'quantity': 3}, format='json').status_code, 404)
+
+        data = self.client.put(f'/api/checkout/cart/update/{item.pk}/', {'quantity': 4}, format='json').data
+        self.assertEqual(data['items'][0]['quantity'], 4)
+        self.assertEqual(self.client.put(f'/api/checkout/cart/update/{item.pk}/', {'quantity': 0}, format='json').status_code, 400)
+
+        data = self.client.delete(f'/api/checkout/cart/remove/{item.pk}/').data
+        self.assertEqual(data['items'], [])
+
+    def test_add_checks_stock(self):
+        response = self.add(self.rug, 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'Only 1 in stock')
+
+
+class CreateOrderTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        self.products = Product.objects.bulk_create(
+            Product(name=f'Product {i}', slug=f'product-{i}', price=Decimal('10.00') + i, stock=10)
+            for i in range(20)
+        )
+
+    def order(self, products, quantity=2):
+        return self.client.post('/api/checkout/create-order/', {
+            'first_name': 'Sara', 'last_name': 'Ahmadi', 'email': 'sara@example.com',
+            'phone': '09120000000', 'address': 'Tehran',
+            'items': [{'product_id': product.pk, 'quantity': quantity} for product in products],
+        }, format='json')
+
+    def test_query_count_does_not_grow_with_lines(self):
+        with CaptureQueriesContext(connection) as one_line:
+            self.assertEqual(self.order(self.products[:1]).status_code, 201)
+        with CaptureQueriesContext(connection) as twenty_lines:
+            response = self.order(self.products)
+        self.assertEqual(len(twenty_lines), len(one_line))
+
+        order = Order.objects.get(pk=response.data['order_id'])
+        self.assertEqual(order.total_price, sum(product.price * 2 for product in self.products))
+        self.assertEqual(response.data['total_price'], order.total_price)
+        self.assertEqual(order.items.count(), 20)
+
+    def test_unknown_product_creates_nothing(self):
+        response = self.order([self.products[0], Product(pk=999999)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.count(), 0)
+
+    def test_invalid_lines_are_rejected(self):
+        for quantity in (0, 101, 1.5, 'two'):
+            self.assertEqual(self.order(self.products[:1], quantity=quantity).status_code, 400)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='buyer@example.com', password='secret')
+        self.client.force_authenticate(self.user)
+        self.lamp = Product.objects.create(name='Lamp', slug='lamp', price=Decimal('10.00'), stock=3)
+        self.rug = Product.objects.create(name='Rug', slug='rug', price=Decimal('40.00'), stock=1)
+
+    def order(self, *lines):
+        return self.client.post('/api/checkout/create-order/', {
+            'first_name': 'Sara', 'last_name': 'Ahmadi', 'email': 'sara@example.com',
+            'phone': '09120000000', 'address': 'Tehran',
+            'items': [{'product_id': product.pk, 'quantity': quantity} for product, quantity in lines],
+        }, format='json')
+
+    def stock(self):
+        return dict(Product.objects.values_list('slug', 'stock'))
+
+    def test_orders_reserve_stock_all_or_nothing(self):
+        response = self.order((self.lamp, 2), (self.rug, 1))
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['order_id'])
+        self.assertEqual(order.reservation_status, 'reserved')
+        self.assertEqual(self.stock(), {'lamp': 1, 'rug': 0})
+
+        # The rug is gone, so nothing of this order is taken or written
+        response = self.order((self.lamp, 1), (self.rug, 1))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.stock(), {'lamp': 1, 'rug': 0})
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_orders_invalidate_only_stock_payloads_after_commit(self):
+        generations = lambda: {endpoint: current_generation(endpoint) for endpoint in ('store_home', 'category_list')}
+        before = generations()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.order((self.lamp, 1)).status_code, 201)
+        self.assertEqual(generations(), before)
+        for callback in callbacks:
+            callback()
+        after = generations()
+        self.assertNotEqual(after['store_home'], before['store_home'])
+        self.assertEqual(after['category_list'], before['category_list'])
+
+    def test_sweeper_releases_expired_unpaid_orders(self):
+        expired = Order.objects.get(pk=self.order((self.lamp, 2)).data['order_id'])
+        paid = Order.objects.get(pk=self.order((self.rug, 1)).data['order_id'])
+        Order.objects.update(reserved_until=timezone.now() - timedelta(minutes=1))
+        Order.objects.filter(pk=paid.pk).update(payment_status='paid')
+
+        self.assertEqual(release_expired_reservations(), 1)
+        expired.refresh_from_db()
+        self.assertEqual((expired.reservation_status, expired.status), ('released', 'cancelled'))
+        self.assertEqual(self.stock(), {'lamp': 3, 'rug': 0})
+
+        # Paid after all: the stock is taken again while it is still there
+        self.assertTrue(commit_reservation(expired))
+        self.assertEqual(self.stock(), {'lamp': 1, 'rug': 0})
+        self.assertEqual(Order.objects.get(pk=expired.pk).reservation_status, 'committed')
+
+    def test_cancelled_payment_releases_stock(self):
+        order = Order.objects.get(pk=self.order((self.lamp, 2)).data['order_id'])
+        Order.objects.filter(pk=order.pk).update(authority='A0001')
+        response = self.client.get('/api/checkout/zarinpal/callback/', {'Authority': 'A0001', 'Status': 'NOK'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stock()['lamp'], 3)
+
+
+class ZarinPalGatewayTests(TestCase):
+    def setUp(self):
+        self.gateway = FakeZarinPal().start()
+        self.addCleanup(self.gateway.stop)
+        self.enterContext(override_settings(ZARINPAL_BASE_URL=self.gateway.url))
+
+    def client_for(self, **options):
+        gateway = ZarinPalClient('merchant', self.gateway.url, **{'backoff': 0, **options})
+        self.addCleanup(gateway.close)
+        return gateway
+
+    def paid_authority(self, gateway, amount=1000):
+        authority = gateway.request_payment(amount, 'Order', 'http://testserver/callback/')
+        self.gateway.pay(authority)
+        return authority
+
+    def buy(self, client):
+        lamp = Product.objects.create(name='Lamp', slug='lamp', price=Decimal('10.00'), stock=3)
+        order_id = client.post('/api/checkout/create-order/', {
+            'first_name': 'Sara', 'last_name': 'Ahmadi', 'email': 'sara@example.com',
+            'phone': '09120000000', 'address': 'Tehran', 'items': [{'product_id': lamp.pk, 'quantity': 1}],
+        }, format='json').data['order_id']
+        response = client.post(f'/api/checkout/orders/{order_id}/pay/')
+        return order_id, response
+
+    def callback(self, client, authority):
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.get('/api/checkout/zarinpal/callback/', {'Authority': authority, 'Status': 'OK'})
+
+    @override_settings(PAYMENT_VERIFICATION_WORKERS=0)
+    def test_checkout_pays_over_one_kept_alive_connection(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(email='buyer@example.com', password='secret'))
+        order_id, response = self.buy(client)
+        authority = response.data['authority']
+        self.assertEqual(response.data['payment_url'], f'{self.gateway.url}/pg/StartPay/{authority}')
+        self.gateway.pay(authority)
+        response = self.callback(client, authority)
+        self.assertEqual(response['Location'], f'http://localhost:3000/checkout/confirming?order_id={order_id}')
+
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual((order.payment_status, order.reservation_status), ('paid', 'committed'))
+        self.assertEqual(order.transactions.get().status_code, 100)
+        self.assertEqual(self.gateway.connections, 1)
+
+        # A repeated callback neither verifies nor records the payment again
+        self.callback(client, authority)
+        self.assertEqual(self.gateway.calls_to('verify'), 1)
+        self.assertEqual(order.transactions.get().status, 'successful')
+        response = client.get(f'/api/checkout/orders/{order_id}/status/')
+        self.assertEqual(response.data['payment_status'], 'paid')
+        self.assertFalse(response.data['confirming'])
+
+    @override_settings(PAYMENT_VERIFICATION_WORKERS=0)
+    def test_verification_waits_out_an_unavailable_gateway(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(email='buyer@example.com', password='secret'))
+        order_id, response = self.buy(client)
+        self.gateway.pay(response.data['authority'])
+        self.gateway.fail_next(*[('status', 503)] * VERIFY_ATTEMPTS)
+        get_client().backoff = 0
+        self.callback(client, response.data['authority'])
+        self.assertTrue(client.get(f'/api/checkout/orders/{order_id}/status/').data['confirming'])
+        self.assertEqual(Order.objects.get(pk=order_id).reservation_status, 'reserved')
+
+        Order.objects.filter(pk=order_id).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(verify_stalled_payments(), 1)
+        self.assertEqual(Order.objects.get(pk=order_id).payment_status, 'paid')
+        self.assertEqual(self.gateway.calls_to('verify'), VERIFY_ATTEMPTS + 1)
+
+    @override_settings(PAYMENT_VERIFICATION_WORKERS=0)
+    def test_merchant_errors_leave_the_payment_verifying(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(email='buyer@example.com', password='secret'))
+        order_id, response = self.buy(client)
+        self.gateway.pay(response.data['authority'])
+        self.gateway.fail_next(('code', -10))
+        with self.assertLogs('checkout.payments', 'ERROR'):
+            self.callback(client, response.data['authority'])
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual((order.payment_status, order.reservation_status), ('verifying', 'reserved'))
+
+        Order.objects.filter(pk=order_id).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(verify_stalled_payments(), 1)
+        self.assertEqual(Order.objects.get(pk=order_id).payment_status, 'paid')
+
+    def test_verify_retries_while_gateway_is_unavailable(self):
+        gateway = self.client_for()
+        authority = self.paid_authority(gateway)
+        self.gateway.fail_next(('status', 503), ('status', 502))
+        self.assertEqual(gateway.verify(1000, authority)['code'], 100)
+        self.assertEqual(gateway.verify(1000, authority)['code'], 101)
+        self.assertEqual(self.gateway.calls_to('verify'), 4)
+        self.assertEqual(gateway.metrics.snapshot()['verify']['outcomes'], {'HTTP 503': 1, 'HTTP 502': 1, '100': 1, '101': 1})
+
+        with self.assertRaises(GatewayError) as raised:
+            gateway.verify(999, authority)
+        self.assertEqual(raised.exception.code, -50)
+
+    def test_slow_gateway_times_out(self):
+        gateway = self.client_for(timeout=(1, 0.1), verify_attempts=1)
+        authority = self.paid_authority(gateway)
+        self.gateway.fail_next(('delay', 0.5))
+        start = time.monotonic()
+        with self.assertRaises(GatewayUnavailable):
+            gateway.verify(1000, authority)
+        self.assertLess(time.monotonic() - start, 0.4)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        now = [0]
+        gateway = self.client_for(verify_attempts=1, breaker=CircuitBreaker(threshold=2, reset=30, clock=lambda: now[0]))
+        authority = self.paid_authority(gateway)
+        self.gateway.fail_next(('status', 500), ('status', 500))
+        for _ in range(3):
+            with self.assertRaises(GatewayUnavailable):
+                gateway.verify(1000, authority)
+        # The third call failed fast, without reaching the gateway
+        self.assertEqual(self.gateway.calls_to('verify'), 2)
+        self.assertEqual(gateway.breaker.state, 'open')
+
+        now[0] = 30
+        self.assertEqual(gateway.verify(1000, authority)['code'], 100)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_rate_limited_trial_keeps_the_circuit_recoverable(self):
+        now = [0]
+        gateway = self.client_for(
+            verify_attempts=1,
+            breaker=CircuitBreaker(threshold=1, reset=30, clock=lambda: now[0]),
+            limiter=RateLimiter(clock=lambda: now[0], sleep=lambda seconds: None),
+        )
+        authority = self.paid_authority(gateway)
+        self.gateway.fail_next(('status', 500))
+        with self.assertRaises(GatewayUnavailable):
+            gateway.verify(1000, authority)
+
+        # Refused by the limiter when the circuit is due its trial call
+        now[0] = 30
+        gateway.limiter.too_many_attempts()
+        with self.assertRaises(GatewayRateLimited):
+            gateway.verify(1000, authority)
+        now[0] = 1000
+        self.assertEqual(gateway.verify(1000, authority)['code'], 100)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_too_many_attempts_pauses_calls(self):
+        gateway = self.client_for()
+        self.gateway.fail_next(('code', -12))
+        for _ in range(2):
+            with self.assertRaises(GatewayRateLimited):
+                gateway.request_payment(1000, 'Order', 'http://testserver/callback/')
+        self.assertEqual(self.gateway.calls_to('request'), 1)
@@ -12,6 +12,7 @@ urlpatterns = [
     path('payment/', views.checkout_payment, name='checkout_payment'),
     path('orders/', views.order_list, name='order_list'),
     path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('orders/<int:order_id>/status/', views.order_status, name='order_status'),
     
     # create-order
     path('create-order/', views.create_order, name='create_order'),
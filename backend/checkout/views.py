@@ -5,36 +5,60 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 from rest_framework.views import APIView
-import requests
 import json
-from decimal import Decimal
+import logging
 from django.urls import reverse
+from django.db import transaction
 from django.http import HttpResponseRedirect
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
 
-from .models import Order, OrderItem, Transaction
+from .cart import MAX_QUANTITY, CartSession, cart_totals
+from .models import CartItem, Order, OrderItem, Transaction
+from .payments import enqueue_verification
+from .stock import release_reservation, renew_reservation
+from .zarinpal import GatewayError, GatewayUnavailable, get_client
 from store.models import Product
-from .serializers import OrderSerializer, CheckoutSerializer, TransactionSerializer
+from .serializers import CartLineSerializer, OrderSerializer, CheckoutSerializer, TransactionSerializer
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
-# Cart views (would be stored in session or database)
+# Cart views: a server-side cart per user, or per anonymous cart cookie
+# until login (see checkout.cart)
+def _cart_response(session, response_status=status.HTTP_200_OK):
+    lines = session.lines()
+    return session.finish(Response({
+        'items': CartLineSerializer(lines, many=True, context={'request': session.request}).data,
+        **cart_totals(lines),
+    }, status=response_status))
+
+def _quantity(request):
+    try:
+        quantity = int(request.data.get('quantity', 1))
+    except (TypeError, ValueError):
+        return None
+    return quantity if 1 <= quantity <= MAX_QUANTITY else None
+
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
 def cart(request):
-    # This is a placeholder for cart functionality
-    # In a real implementation, cart would be stored in session or database
-    return Response({'items': []})
+    return _cart_response(CartSession(request))
 
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
 def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id, available=True)
-    quantity = int(request.data.get('quantity', 1))
+    product = get_object_or_404(Product.objects.only('id', 'stock', 'available'), id=product_id, available=True)
+    quantity = _quantity(request)
+    if quantity is None:
+        return Response({'detail': f'Quantity must be between 1 and {MAX_QUANTITY}'}, status=status.HTTP_400_BAD_REQUEST)
+    if quantity > product.stock:
+        return Response({'detail': f'Only {product.stock} in stock'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Placeholder for adding to cart
-    return Response({
-        'message': f'{quantity} x {product.name} added to cart'
-    })
+    session = CartSession(request)
+    session.add(product, quantity)
+    return _cart_response(session, status.HTTP_201_CREATED)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -44,41 +68,43 @@ def create_order(request):
     """
     serializer = CheckoutSerializer(data=request.data)
     if serializer.is_valid():
-        # Calculate total price from items
-        total_price = Decimal('0.00')
-        for item_data in serializer.validated_data['items']:
-            product = get_object_or_404(Product, id=item_data['product_id'])
-            total_price += product.price * item_data['quantity']
-        
-        # Create order with total price
+        # The serializer prices the items from one bulk product lookup and
+        # writes the order and its items in one transaction
         order = serializer.save(
             user=request.user,
-            total_price=total_price,
             status='pending'
         )
         
         return Response({
             'order_id': order.id,
-            'total_price': total_price
+            'total_price': order.total_price
         }, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['PUT'])
-@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
 def update_cart(request, item_id):
-    # Placeholder for updating cart item
-    quantity = int(request.data.get('quantity', 1))
-    return Response({
-        'message': f'Cart item {item_id} updated to quantity {quantity}'
-    })
+    session = CartSession(request)
+    item = session.item(item_id)
+    if item is None:
+        return session.finish(Response({'detail': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND))
+    quantity = _quantity(request)
+    if quantity is None:
+        return session.finish(Response(
+            {'detail': f'Quantity must be between 1 and {MAX_QUANTITY}'}, status=status.HTTP_400_BAD_REQUEST
+        ))
+    CartItem.objects.filter(pk=item.pk).update(quantity=quantity)
+    return _cart_response(session)
 
 @api_view(['DELETE'])
-@permission_classes([IsAuthenticated])
+@permission_classes([AllowAny])
 def remove_from_cart(request, item_id):
-    # Placeholder for removing from cart
-    return Response({
-        'message': f'Item {item_id} removed from cart'
-    })
+    session = CartSession(request)
+    item = session.item(item_id)
+    if item is None:
+        return session.finish(Response({'detail': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND))
+    item.delete()
+    return _cart_response(session)
 
 # Checkout views
 @api_view(['POST'])
@@ -97,8 +123,6 @@ def checkout_payment(request):
         # Associate with current user
         order = serializer.save(
             user=request.user,
-            # Placeholder for total price calculation
-            total_price=100.00, 
             shipping_cost=10.00,
             status='pending'
         )
@@ -121,6 +145,27 @@ def order_detail(request, order_id):
     serializer = OrderSerializer(order)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def order_status(request, order_id):
+    """Payment progress of an order, polled by the checkout confirming page."""
+    order = (
+        Order.objects.filter(id=order_id, user=request.user)
+        .values('id', 'status', 'payment_status', 'ref_id')
+        .first()
+    )
+    if order is None:
+        return Response({'detail': 'Order not found.'}, status=status.HTTP_404_NOT_FOUND)
+    response = Response({
+        'order_id': order['id'],
+        'status': order['status'],
+        'payment_status': order['payment_status'],
+        'ref_id': order['ref_id'],
+        'confirming': order['payment_status'] == 'verifying',
+    })
+    add_never_cache_headers(response)
+    return response
+
 # Order views for user profile
 class UserOrderListView(APIView):
     permission_classes = [IsAuthenticated]
@@ -154,12 +199,18 @@ class ZarinPalPaymentView(APIView):
         """Generate payment URL for an order"""
         order = get_object_or_404(Order, id=order_id, user=request.user)
         
-        # Use sandbox for testing or production in real environment
-        is_sandbox = getattr(settings, 'ZARINPAL_SANDBOX', True)
-        merchant_id = getattr(settings, 'ZARINPAL_MERCHANT_ID', '1344b5d4-0048-11e8-94db-005056a205be')
+        if order.payment_status in ('paid', 'verifying'):
+            return Response({
+                'status': 'error',
+                'message': 'Order is already paid'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        base_url = "https://sandbox.zarinpal.com" if is_sandbox else "https://api.zarinpal.com"
-        request_url = f"{base_url}/pg/v4/payment/request.json"
+        # The order's stock must still be held while the buyer pays
+        if not renew_reservation(order):
+            return Response({
+                'status': 'error',
+                'message': 'Some items in this order are no longer in stock'
+            }, status=status.HTTP_409_CONFLICT)
         
         # Build the callback URL - make sure this is an absolute URL
         callback_url = request.build_absolute_uri('/api/checkout/zarinpal/callback/')
@@ -168,122 +219,52 @@ class ZarinPalPaymentView(APIView):
         print(f"Payment request: Order ID: {order_id}, Total Price: {order.total_price}")
         print(f"Callback URL: {callback_url}")
         
-        # Convert to Rials (assuming the price is stored in Tomans)
-        amount_rials = int(order.total_price * 10)
-        
-        data = {
-            "merchant_id": merchant_id,
-            "amount": amount_rials,
-            "description": f"Payment for order #{order.id}",
-            "callback_url": callback_url,
-            "metadata": {
-                "mobile": order.phone,
-                "email": order.email,
-                "order_id": str(order.id)
-            }
-        }
-        
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
-        
+        gateway = get_client()
         try:
-            response = requests.post(request_url, json=data, headers=headers)
-            print(f"ZarinPal API Response: {response.status_code} - {response.text}")
-            
-            response_data = response.json()
-            data = response_data.get("data", {})
-            
-            # Check for success code either in root or inside data object
-            success_code = response_data.get("code")
-            if success_code is None and isinstance(data, dict):
-                success_code = data.get("code")
-            
-            # Check if authority exists in data
-            authority = None
-            if isinstance(data, dict):
-                authority = data.get("authority")
-            
-            if (success_code == 100 or data.get("code") == 100) and authority:
-                # Update order with authority
-                order.authority = authority
-                order.save()
-                
-                # Create transaction record
-                transaction = Transaction.objects.create(
-                    order=order,
-                    amount=order.total_price,
-                    authority=authority,
-                    status='pending'
-                )
-                
-                # Generate payment URL
-                payment_url = f"{base_url}/pg/StartPay/{authority}"
-                
-                return Response({
-                    'payment_url': payment_url,
-                    'authority': authority,
-                    'status': 'success'
-                })
-            else:
-                # If we reach here, it means the payment initiation failed
-                errors = response_data.get('errors', [])
-                error_code = None
-                error_message = "Unknown error"
-                
-                # Try to extract error information from the response
-                # The error can be in different formats based on ZarinPal's API behavior
-                
-                # Case 1: When errors is a list
-                if isinstance(errors, list) and errors:
-                    if isinstance(errors[0], dict) and 'code' in errors[0]:
-                        error_code = errors[0].get('code')
-                        error_message = errors[0].get('message', 'Unknown error')
-                    else:
-                        error_message = str(errors)
-                
-                # Case 2: When errors is a dictionary
-                elif isinstance(errors, dict):
-                    error_code = errors.get('code')
-                    error_message = errors.get('message', 'Unknown error')
-                
-                # Case 3: When error code is directly in the response root
-                elif 'code' in response_data and response_data.get('code') != 100:
-                    error_code = response_data.get('code')
-                    error_message = response_data.get('message', 'Unknown error')
-                
-                # Map error codes to messages according to ZarinPal documentation
-                error_descriptions = {
-                    -9: "Validation error - Invalid input data",
-                    -10: "Invalid terminal - Incorrect merchant_id or IP",
-                    -11: "Inactive terminal - Contact support",
-                    -12: "Too many attempts - Try again later",
-                    -15: "Suspended terminal - Contact support",
-                    -50: "Session mismatch - Payment amount does not match",
-                    -51: "Failed payment - Payment unsuccessful",
-                    -54: "Invalid authority - Authority code is invalid"
+            authority = gateway.request_payment(
+                # Convert to Rials (assuming the price is stored in Tomans)
+                amount=int(order.total_price * 10),
+                description=f"Payment for order #{order.id}",
+                callback_url=callback_url,
+                metadata={
+                    "mobile": order.phone,
+                    "email": order.email,
+                    "order_id": str(order.id)
                 }
-                
-                if error_code in error_descriptions:
-                    error_detail = error_descriptions[error_code]
-                else:
-                    error_detail = error_message
-                
-                print(f"ZarinPal error: {error_code} - {error_message}")
-                
-                return Response({
-                    'status': 'error',
-                    'message': f"Payment initiation failed with code: {error_code}",
-                    'details': error_detail
-                }, status=status.HTTP_400_BAD_REQUEST)
-                
-        except Exception as e:
-            print(f"Exception in ZarinPal payment: {str(e)}")
+            )
+        except GatewayUnavailable as e:
+            logger.warning('ZarinPal unavailable for order %s: %s', order.id, e.message)
+            return Response({
+                'status': 'error',
+                'message': 'Payment gateway is not available',
+                'details': e.description
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except GatewayError as e:
+            logger.warning('ZarinPal refused the payment request of order %s: %s - %s', order.id, e.code, e.message)
             return Response({
                 'status': 'error',
-                'message': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'message': f"Payment initiation failed with code: {e.code}",
+                'details': e.description
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Update order with authority; a retried payment starts over
+        order.authority = authority
+        order.payment_status = 'pending'
+        order.save()
+        
+        # Create transaction record
+        Transaction.objects.create(
+            order=order,
+            amount=order.total_price,
+            authority=authority,
+            status='pending'
+        )
+        
+        return Response({
+            'payment_url': gateway.start_pay_url(authority),
+            'authority': authority,
+            'status': 'success'
+        })
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
@@ -306,8 +287,10 @@ def zarinpal_callback(request):
         
         if status_param != 'OK':
             # Payment failed or canceled
-            order.payment_status = 'failed'
-            order.save()
+            if order.payment_status == 'pending':
+                order.payment_status = 'failed'
+                order.save()
+                release_reservation(order)
             
             # Redirect to frontend with failure status
             frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
@@ -315,106 +298,19 @@ def zarinpal_callback(request):
             print(f"Payment failed, redirecting to: {redirect_url}")
             return HttpResponseRedirect(redirect_url)
         
-        # Verify the payment
-        is_sandbox = getattr(settings, 'ZARINPAL_SANDBOX', True)
-        merchant_id = getattr(settings, 'ZARINPAL_MERCHANT_ID', '1344b5d4-0048-11e8-94db-005056a205be')
-        
-        base_url = "https://sandbox.zarinpal.com" if is_sandbox else "https://api.zarinpal.com"
-        verify_url = f"{base_url}/pg/v4/payment/verify.json"
-        
-        # Convert to Rials (assuming the price is stored in Tomans)
-        amount_rials = int(order.total_price * 10)
-        
-        data = {
-            "merchant_id": merchant_id,
-            "amount": amount_rials,
-            "authority": authority
-        }
-        
-        headers = {
-            'accept': 'application/json',
-            'content-type': 'application/json'
-        }
-        
-        print(f"Verifying payment with data: {data}")
-        response = requests.post(verify_url, json=data, headers=headers)
-        print(f"Verification response: {response.status_code} - {response.text}")
-        
-        response_data = response.json()
-        data = response_data.get("data", {})
-        
-        # Properly check for success codes from ZarinPal documentation
-        # Code 100 = Success, 101 = Already verified
-        # The code can be in the response root or in the data object
-        root_code = response_data.get("code")
-        data_code = None
-        if isinstance(data, dict):
-            data_code = data.get("code")
-        
-        success_code = root_code if root_code is not None else data_code
-        print(f"Payment verification code: {success_code}")
+        # Hand verification to a background worker so this redirect does
+        # not wait on the gateway; only the first callback queues it
+        queued = Order.objects.filter(pk=order.pk, authority=authority, payment_status='pending').update(
+            payment_status='verifying', updated_at=timezone.now()
+        )
+        if queued:
+            transaction.on_commit(lambda: enqueue_verification(order.pk))
         
-        # According to ZarinPal docs, codes 100 and 101 are success states
-        if success_code in [100, 101]:
-            # Payment successful
-            order.ref_id = data.get('ref_id')
-            order.payment_status = 'paid'
-            order.status = 'processing'
-            order.save()
-            
-            # Create successful transaction record
-            Transaction.objects.create(
-                order=order,
-                amount=order.total_price,
-                authority=authority,
-                ref_id=data.get('ref_id') if isinstance(data, dict) else None,
-                card_pan=data.get('card_pan') if isinstance(data, dict) else None,
-                card_hash=data.get('card_hash') if isinstance(data, dict) else None,
-                fee_type=data.get('fee_type') if isinstance(data, dict) else None,
-                fee=data.get('fee', 0) if isinstance(data, dict) else 0,
-                status_code=success_code,
-                status='successful'
-            )
-            
-            # Redirect to success page
-            frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
-            redirect_url = f"{frontend_url}/checkout/success?order_id={order.id}"
-            print(f"Payment successful, redirecting to: {redirect_url}")
-            return HttpResponseRedirect(redirect_url)
-        else:
-            # Payment verification failed
-            order.payment_status = 'failed'
-            order.save()
-            
-            # Get error description based on code
-            error_descriptions = {
-                -9: "Validation error - Invalid input data",
-                -10: "Invalid terminal - Incorrect merchant_id or IP",
-                -11: "Inactive terminal - Contact support",
-                -12: "Too many attempts - Try again later",
-                -15: "Suspended terminal - Contact support",
-                -50: "Session mismatch - Payment amount does not match",
-                -51: "Failed payment - Payment unsuccessful",
-                -54: "Invalid authority - Authority code is invalid"
-            }
-            
-            error_detail = error_descriptions.get(success_code, "Unknown error")
-            print(f"Payment verification failed with code: {success_code} - {error_detail}")
-            
-            # Create failed transaction record
-            Transaction.objects.create(
-                order=order,
-                amount=order.total_price,
-                authority=authority,
-                status_code=success_code,
-                status='failed'
-            )
-            
-            # Redirect to failure page
-            frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
-            redirect_url = f"{frontend_url}/checkout/failed?order_id={order.id}"
-            print(f"Payment verification failed, redirecting to: {redirect_url}")
-            return HttpResponseRedirect(redirect_url)
+        # The confirming page follows the order's status endpoint
+        frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
+        redirect_url = f"{frontend_url}/checkout/confirming?order_id={order.id}"
+        logger.info('Payment of order %s is being verified, redirecting to %s', order.id, redirect_url)
+        return HttpResponseRedirect(redirect_url)
     
     except Order.DoesNotExist:
         print(f"Order not found for authority: {authority}")
@@ -465,7 +361,7 @@ def retry_payment(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     
     # Check if the order is eligible for retry
-    if order.payment_status == 'paid':
+    if order.payment_status in ('paid', 'verifying'):
         return Response({
             'status': 'error',
             'message': 'Order is already paid'
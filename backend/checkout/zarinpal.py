@@ -0,0 +1,397 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_URL = 'https://sandbox.zarinpal.com'
+PRODUCTION_URL = 'https://api.zarinpal.com'
+
+# Seconds to open a connection and to wait for a response once connected
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+
+# Kept-alive connections to the gateway, shared by a process's threads
+POOL_SIZE = 20
+
+# Verify is idempotent (a repeat answers 101), so it is tried this often,
+# with full-jitter backoff from RETRY_BACKOFF seconds
+VERIFY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+
+# Consecutive unavailable answers that open the circuit, and for how long
+BREAKER_THRESHOLD = 5
+BREAKER_RESET = 30
+
+# Calls per second a process makes before queueing, and the pause after
+# the gateway answers -12 (too many attempts), doubled while it keeps on
+RATE_LIMIT = 10
+RATE_LIMIT_WAIT = 2
+TOO_MANY_ATTEMPTS = -12
+TOO_MANY_ATTEMPTS_PAUSE = 5
+TOO_MANY_ATTEMPTS_MAX_PAUSE = 60
+
+SUCCESS = 100
+ALREADY_VERIFIED = 101
+
+ERROR_DESCRIPTIONS = {
+    -9: "Validation error - Invalid input data",
+    -10: "Invalid terminal - Incorrect merchant_id or IP",
+    -11: "Inactive terminal - Contact support",
+    -12: "Too many attempts - Try again later",
+    -15: "Suspended terminal - Contact support",
+    -50: "Session mismatch - Payment amount does not match",
+    -51: "Failed payment - Payment unsuccessful",
+    -54: "Invalid authority - Authority code is invalid",
+}
+
+# Verify answers that settle a payment as failed: the buyer did not pay,
+# paid another amount, or the authority is unknown. Other codes (merchant or
+# configuration errors, codes not listed here) say nothing about the payment.
+PAYMENT_REJECTIONS = frozenset({-50, -51, -54})
+
+
+class GatewayError(Exception):
+    """The gateway answered with an error code."""
+
+    def __init__(self, code, message='Unknown error'):
+        super().__init__(f'{code}: {message}')
+        self.code = code
+        self.message = message
+
+    @property
+    def description(self):
+        return ERROR_DESCRIPTIONS.get(self.code, self.message)
+
+    @property
+    def rejects_payment(self):
+        return self.code in PAYMENT_REJECTIONS
+
+
+class GatewayUnavailable(GatewayError):
+    """
+    No usable answer: the gateway timed out, failed, could not be reached,
+    or is not being called because the circuit is open or calls are paused.
+    """
+
+    def __init__(self, message, code=None):
+        super().__init__(code, message)
+
+    @property
+    def description(self):
+        return 'The payment gateway is not available right now - Try again later'
+
+
+class GatewayRateLimited(GatewayUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast once the gateway has been unavailable `threshold` times
+    in a row. After `reset` seconds one trial call is let through; its
+    success closes the circuit again, its failure keeps it open.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset=BREAKER_RESET, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset = reset
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if self.clock() - self.opened_at >= self.reset else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or self.clock() - self.opened_at < self.reset:
+                return False
+            self._trial = True
+            return True
+
+    def succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class RateLimiter:
+    """
+    Token bucket of `rate` calls per second for one process, plus a pause
+    the gateway imposes by answering -12. Callers wait up to `max_wait`
+    seconds for their turn and are refused after that.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, max_wait=RATE_LIMIT_WAIT, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(rate)
+        self.updated = clock()
+        self.paused_until = 0
+        self.pause = TOO_MANY_ATTEMPTS_PAUSE
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(self.paused_until - now, (1 - self.tokens) / self.rate if self.tokens < 1 else 0)
+            if wait > self.max_wait:
+                raise GatewayRateLimited(f'Gateway calls are paused for {wait:.1f}s', TOO_MANY_ATTEMPTS)
+            # The token is spent now, so callers queue behind each other
+            self.tokens -= 1
+        if wait > 0:
+            self.sleep(wait)
+
+    def too_many_attempts(self):
+        with self._lock:
+            self.paused_until = self.clock() + self.pause
+            self.pause = min(self.pause * 2, TOO_MANY_ATTEMPTS_MAX_PAUSE)
+
+    def accepted(self):
+        with self._lock:
+            self.pause = TOO_MANY_ATTEMPTS_PAUSE
+
+
+class GatewayMetrics:
+    """Latency of the last `keep` calls and outcome counts per operation."""
+
+    def __init__(self, keep=1000):
+        self.keep = keep
+        self._latencies = {}
+        self._outcomes = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds, outcome):
+        """Count a call; seconds=None for calls refused without a request."""
+        with self._lock:
+            latencies = self._latencies.setdefault(operation, deque(maxlen=self.keep))
+            if seconds is not None:
+                latencies.append(seconds)
+            self._outcomes.setdefault(operation, Counter())[outcome] += 1
+
+    def snapshot(self):
+        """{operation: {'calls', 'outcomes', 'p50_ms', 'p95_ms', 'max_ms'}}"""
+        with self._lock:
+            samples = {operation: sorted(latencies) for operation, latencies in self._latencies.items()}
+            outcomes = {operation: dict(counts) for operation, counts in self._outcomes.items()}
+        return {
+            operation: {
+                'calls': sum(outcomes[operation].values()),
+                'outcomes': outcomes[operation],
+                'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+            }
+            for operation, latencies in samples.items()
+        }
+
+
+def _error(payload):
+    """(code, message) of an error answer, whichever shape it came in."""
+    data = payload.get('data')
+    errors = payload.get('errors')
+    if isinstance(errors, list) and errors:
+        errors = errors[0] if isinstance(errors[0], dict) else {'message': str(errors)}
+    if isinstance(errors, dict) and errors:
+        return errors.get('code'), errors.get('message', 'Unknown error')
+    if isinstance(data, dict) and data.get('code') is not None:
+        return data.get('code'), data.get('message', 'Unknown error')
+    return payload.get('code'), payload.get('message', 'Unknown error')
+
+
+class ZarinPalClient:
+    """
+    ZarinPal v4 REST API over one pooled keep-alive session.
+
+    Every call is bounded by connect/read timeouts, passes the process's
+    rate limiter and circuit breaker, and has its latency recorded in
+    `metrics`. Verify calls are retried with jittered backoff when the
+    gateway is unavailable; payment requests are not, since one that
+    reached the gateway may have opened a payment already.
+    """
+
+    def __init__(self, merchant_id, base_url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 verify_attempts=VERIFY_ATTEMPTS, backoff=RETRY_BACKOFF, breaker=None, limiter=None):
+        self.merchant_id = merchant_id
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.verify_attempts = verify_attempts
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or RateLimiter()
+        self.metrics = GatewayMetrics()
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # A forked worker must not share the parent's sockets
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({'accept': 'application/json', 'content-type': 'application/json'})
+                self._session, self._pid = session, os.getpid()
+            return self._session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def start_pay_url(self, authority):
+        return f'{self.base_url}/pg/StartPay/{authority}'
+
+    def request_payment(self, amount, description, callback_url, metadata=None):
+        """Open a payment of amount rials; returns its authority."""
+        data = self._call('request', '/pg/v4/payment/request.json', {
+            'merchant_id': self.merchant_id,
+            'amount': amount,
+            'description': description,
+            'callback_url': callback_url,
+            'metadata': metadata or {},
+        })
+        if not data.get('authority'):
+            raise GatewayError(data.get('code'), 'No authority in the answer')
+        return data['authority']
+
+    def verify(self, amount, authority):
+        """
+        Confirm a payment; returns the answer's data (code 100, or 101 when
+        it was verified before) or raises GatewayError.
+        """
+        return self._call('verify', '/pg/v4/payment/verify.json', {
+            'merchant_id': self.merchant_id,
+            'amount': amount,
+            'authority': authority,
+        }, attempts=self.verify_attempts)
+
+    def _call(self, operation, path, body, attempts=1):
+        for attempt in range(1, attempts + 1):
+            try:
+                return self._send(operation, path, body)
+            except GatewayRateLimited:
+                raise
+            except GatewayUnavailable as error:
+                if attempt == attempts:
+                    raise
+                # Full jitter keeps retrying workers from hitting the gateway in step
+                delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                logger.info('Retrying ZarinPal %s in %.2fs after: %s', operation, delay, error.message)
+                time.sleep(delay)
+
+    def _send(self, operation, path, body):
+        # Queue for a token first: once the breaker hands out its half-open
+        # trial, the call must reach the gateway to report back
+        try:
+            self.limiter.acquire()
+        except GatewayRateLimited:
+            self.metrics.record(operation, None, 'rate_limited')
+            raise
+        if not self.breaker.allow():
+            self.metrics.record(operation, None, 'circuit_open')
+            raise GatewayUnavailable('The payment gateway circuit is open')
+
+        start = time.perf_counter()
+        try:
+            payload = self._post(path, body)
+        except GatewayUnavailable as error:
+            self.breaker.failed()
+            self._record(operation, start, error.message)
+            raise
+        self.breaker.succeeded()
+
+        data = payload.get('data')
+        if isinstance(data, dict) and data.get('code') in (SUCCESS, ALREADY_VERIFIED):
+            self.limiter.accepted()
+            self._record(operation, start, data['code'])
+            return data
+        code, message = _error(payload)
+        self._record(operation, start, code)
+        if code == TOO_MANY_ATTEMPTS:
+            self.limiter.too_many_attempts()
+            raise GatewayRateLimited(message, code)
+        raise GatewayError(code, message)
+
+    def _post(self, path, body):
+        try:
+            response = self.session.post(f'{self.base_url}{path}', json=body, timeout=self.timeout)
+        except requests.Timeout as error:
+            raise GatewayUnavailable('timeout') from error
+        except requests.ConnectionError as error:
+            raise GatewayUnavailable('connection error') from error
+        except requests.RequestException as error:
+            raise GatewayUnavailable(type(error).__name__) from error
+        if response.status_code >= 500:
+            raise GatewayUnavailable(f'HTTP {response.status_code}')
+        try:
+            return response.json()
+        except ValueError as error:
+            raise GatewayUnavailable('not JSON') from error
+
+    def _record(self, operation, start, outcome):
+        elapsed = time.perf_counter() - start
+        self.metrics.record(operation, elapsed, str(outcome))
+        logger.info('ZarinPal %s took %.0fms: %s', operation, elapsed * 1000, outcome)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process's ZarinPalClient for the ZARINPAL_* settings."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            base_url = getattr(settings, 'ZARINPAL_BASE_URL', None) or (
+                SANDBOX_URL if getattr(settings, 'ZARINPAL_SANDBOX', True) else PRODUCTION_URL
+            )
+            _client = ZarinPalClient(
+                getattr(settings, 'ZARINPAL_MERCHANT_ID', '1344b5d4-0048-11e8-94db-005056a205be'), base_url
+            )
+        return _client
+
+
+@receiver(setting_changed)
+def _reset_client(setting, **kwargs):
+    global _client
+    if setting.startswith('ZARINPAL_'):
+        with _client_lock:
+            if _client is not None:
+                _client.close()
+            _client = None
@@ -0,0 +1,50 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+
+def queryset_state(*querysets):
+    """
+    (etag, last_modified) for the rows a response is built from.
+
+    Each queryset contributes its row count and, when the model has one, its
+    latest updated_at: an edit moves the timestamp and a delete drops the
+    count. Both come from a single aggregate per queryset, which is far cheaper
+    than serializing the response.
+    """
+    parts = []
+    last_modified = None
+    for queryset in querysets:
+        aggregates = {'count': Count('pk')}
+        has_timestamp = any(field.name == 'updated_at' for field in queryset.model._meta.concrete_fields)
+        if has_timestamp:
+            aggregates['latest'] = Max('updated_at')
+        state = queryset.order_by().aggregate(**aggregates)
+        latest = state.get('latest')
+        if latest and (last_modified is None or latest > last_modified):
+            last_modified = latest
+        parts.append(f"{queryset.model._meta.label}:{state['count']}:{latest.isoformat() if latest else ''}")
+    return hashlib.md5('|'.join(parts).encode()).hexdigest(), last_modified
+
+
+def conditional_on(get_state):
+    """
+    Decorate a GET view so it answers If-None-Match / If-Modified-Since with
+    a 304 before the view body (and its serializers) ever runs.
+
+    get_state(request, *args, **kwargs) returns (etag, last_modified), usually
+    queryset_state() of the querysets the response is built from. The host is
+    folded into the ETag because serializers render absolute media URLs.
+    """
+    def state(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_state'):
+            etag, last_modified = get_state(request, *args, **kwargs)
+            etag = hashlib.md5(f'{etag}:{request.get_host()}'.encode()).hexdigest()
+            request._conditional_state = (etag, last_modified)
+        return request._conditional_state
+
+    return condition(
+        etag_func=lambda request, *args, **kwargs: state(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: state(request, *args, **kwargs)[1],
+    )
@@ -0,0 +1,25 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def refresh_counts(model, count_field, through, owner_field, pks=None):
+    """
+    Set model.<count_field> to the number of `through` rows pointing at each
+    row, for the rows in pks or, with pks=None, for every row.
+
+    Recounting rather than adding and subtracting keeps the column exact
+    however the links changed (m2m_changed reports ids passed to remove()
+    even if they were not linked). Either way it is one UPDATE with a grouped
+    correlated subquery, so repairing the whole table costs a single query.
+    """
+    if pks is not None and not pks:
+        return
+    counts = (
+        through.objects.filter(**{owner_field: OuterRef('pk')})
+        .order_by()
+        .values(owner_field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    rows = model._default_manager.all() if pks is None else model._default_manager.filter(pk__in=pks)
+    rows.update(**{count_field: Coalesce(Subquery(counts), 0)})
@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.db import connections
+
+from store.cache import cached_payload
+
+# ?count= values: `exact` always counts (through the cache), `none` skips the
+# count, and the default picks the planner estimate for large unfiltered
+# tables and the cached exact count otherwise.
+COUNT_MODES = ('auto', 'exact', 'none')
+
+
+def count_mode(request):
+    mode = request.query_params.get('count', 'auto')
+    return mode if mode in COUNT_MODES else 'auto'
+
+
+def planner_estimate(model, using='default'):
+    """
+    PostgreSQL's row estimate for model's table (pg_class.reltuples, kept
+    current by autovacuum/ANALYZE), or None where there is none.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 until the table has been analyzed once
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def total_count(queryset, endpoint, filter_params, mode='auto'):
+    """
+    (count, exact) for a listing's filtered queryset.
+
+    Exact counts are cached per endpoint and normalized filter signature,
+    and dropped with the endpoint's other cache entries on writes to its
+    models (see store.cache.ENDPOINT_DEPENDENCIES). In `auto` mode a queryset
+    with no WHERE clause at all on a table the planner believes holds more
+    than CATALOG_COUNT_ESTIMATE_THRESHOLD rows reports the estimate instead.
+    """
+    if mode == 'auto' and not queryset.query.where:
+        estimate = planner_estimate(queryset.model, queryset.db)
+        if estimate is not None and estimate >= settings.CATALOG_COUNT_ESTIMATE_THRESHOLD:
+            return estimate, False
+    return cached_payload(endpoint, filter_params, queryset.order_by().count), True
+
+
+def counted_page(queryset, endpoint, filter_params, page, page_size, mode='auto'):
+    """
+    (rows, pagination metadata) for page `page` of an ordered queryset.
+
+    With mode `none` no count runs: page_size + 1 rows are fetched and the
+    metadata only says whether there is a next page.
+    """
+    start = (page - 1) * page_size
+    if mode == 'none':
+        rows = list(queryset[start:start + page_size + 1])
+        return rows[:page_size], {
+            'has_next': len(rows) > page_size,
+            'current_page': page,
+            'page_size': page_size,
+        }
+
+    total_items, exact = total_count(queryset, endpoint, filter_params, mode)
+    meta = {
+        'total_items': total_items,
+        'total_pages': (total_items + page_size - 1) // page_size,  # Ceiling division
+        'current_page': page,
+        'page_size': page_size,
+    }
+    if not exact:
+        meta['total_is_estimate'] = True
+    return queryset[start:start + page_size], meta
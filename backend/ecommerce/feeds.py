@@ -0,0 +1,170 @@
+import csv
+import json
+from datetime import datetime, time
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status
+from rest_framework.response import Response
+
+# Rows fetched per round trip of the server-side cursor. Memory use depends
+# on this, not on the size of the catalog.
+FEED_CHUNK_SIZE = 2000
+
+# Feed column -> model attribute, in output order. Columns whose attribute a
+# model does not have are left out, so store.Product (no brand, sku, ...) and
+# products.Product share one definition.
+FEED_COLUMNS = (
+    ('id', 'id'),
+    ('title', 'name'),
+    ('description', 'description'),
+    ('link', 'slug'),
+    ('image_link', 'image'),
+    ('price', 'price'),
+    ('availability', None),
+    ('brand', 'brand'),
+    ('sku', 'sku'),
+    ('mpn', 'mpn'),
+    ('gtin', 'gtin'),
+    ('identifier_exists', None),
+    ('weight', 'weight'),
+    ('dimensions', 'dimensions'),
+    ('updated_at', 'updated_at'),
+)
+
+# Attribute holding the availability flag, by model
+AVAILABILITY_FIELDS = ('available', 'is_available')
+
+# Google Merchant wants a brand and a GTIN or MPN per product, or
+# identifier_exists=no when there are none (store.Product has no such fields).
+BRAND_FIELD = 'brand'
+IDENTIFIER_FIELDS = ('gtin', 'mpn')
+
+# Prices are stored in Tomans, which have no ISO 4217 code; the XML feed
+# quotes them in Rials, converted as for the payment gateway.
+FEED_CURRENCY = 'IRR'
+RIALS_PER_PRICE_UNIT = 10
+
+
+def parse_since(value):
+    """An aware datetime from an ISO date or datetime; ValueError if invalid."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid timestamp: {value}')
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class ProductFeed:
+    """
+    A product catalog as a stream of XML (Google Merchant RSS), CSV or NDJSON
+    text chunks, read through a server-side cursor so memory stays flat
+    however many products there are.
+    """
+    content_types = {
+        'xml': 'application/xml; charset=utf-8',
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def __init__(self, queryset, media_base_url='', product_url=None, since=None):
+        model = queryset.model
+        names = {field.name for field in model._meta.concrete_fields}
+        self.available_field = next(name for name in AVAILABILITY_FIELDS if name in names)
+        self.columns = [
+            (column, attribute) for column, attribute in FEED_COLUMNS
+            if attribute is None or attribute in names
+        ]
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+        attributes = [attribute for _, attribute in self.columns if attribute] + [self.available_field]
+        self.queryset = queryset.order_by('id').values(*attributes)
+        self.media_base_url = media_base_url
+        self.product_url = product_url or (lambda slug: f'{settings.FRONTEND_URL}/product/{slug}')
+
+    def rows(self):
+        for values in self.queryset.iterator(chunk_size=FEED_CHUNK_SIZE):
+            row = {}
+            for column, attribute in self.columns:
+                if column == 'availability':
+                    row[column] = 'in stock' if values[self.available_field] else 'out of stock'
+                elif column == 'identifier_exists':
+                    has_identifier = values.get(BRAND_FIELD) and any(values.get(name) for name in IDENTIFIER_FIELDS)
+                    row[column] = 'yes' if has_identifier else 'no'
+                elif column == 'link':
+                    row[column] = self.product_url(values[attribute])
+                elif column == 'image_link':
+                    image = values[attribute]
+                    row[column] = urljoin(self.media_base_url, default_storage.url(image)) if image else ''
+                else:
+                    row[column] = values[attribute]
+            yield row
+
+    def stream(self, feed_format):
+        return getattr(self, f'_{feed_format}')()
+
+    def _ndjson(self):
+        for row in self.rows():
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+    def _csv(self):
+        class Line:
+            # csv.writer wants a file; hand back each formatted line instead
+            def write(self, value):
+                return value
+
+        writer = csv.writer(Line())
+        yield writer.writerow([column for column, _ in self.columns])
+        for row in self.rows():
+            yield writer.writerow([
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row.values()
+            ])
+
+    def _xml(self):
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0"><channel>\n'
+        )
+        for row in self.rows():
+            parts = ['<item>']
+            for column, value in row.items():
+                if value in ('', None):
+                    continue
+                if isinstance(value, datetime):
+                    value = value.isoformat()
+                elif column == 'price':
+                    value = f'{int(value * RIALS_PER_PRICE_UNIT)} {FEED_CURRENCY}'
+                parts.append(f'<g:{column}>{escape(str(value))}</g:{column}>')
+            parts.append('</item>\n')
+            yield ''.join(parts)
+        yield '</channel></rss>\n'
+
+
+def feed_response(request, queryset, feed_format):
+    """
+    The feed of queryset in feed_format as a streaming response; ?since=
+    limits it to products changed after a date or datetime, for incremental
+    imports.
+    """
+    since = None
+    if request.query_params.get('since'):
+        try:
+            since = parse_since(request.query_params['since'])
+        except ValueError:
+            return Response({'detail': 'Invalid since timestamp'}, status=status.HTTP_400_BAD_REQUEST)
+
+    feed = ProductFeed(queryset, request.build_absolute_uri('/'), since=since)
+    response = StreamingHttpResponse(feed.stream(feed_format), content_type=ProductFeed.content_types[feed_format])
+    response['Content-Disposition'] = f'inline; filename="products.{feed_format}"'
+    return response
@@ -0,0 +1,218 @@
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Sent with (sender=model, pk=..., field=...) once a row's variants are stored,
+# so apps can invalidate whatever embeds the srcset.
+image_variants_ready = Signal()
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Upload formats whose metadata is stripped before the original is stored,
+# with the options they are re-encoded with.
+STRIPPED_FORMATS = {
+    'JPEG': {'quality': 95},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 95},
+}
+
+_executor = None
+
+# (model, image field, variants field) for every registered image
+registered_images = []
+
+
+def variant_widths():
+    return getattr(settings, 'IMAGE_VARIANT_WIDTHS', [320, 640, 1024, 1600])
+
+
+def variant_name(original, width, extension):
+    """variants/products/shoe.jpg -> variants/products/shoe/640.webp"""
+    stem, _ = os.path.splitext(original)
+    return f'variants/{stem}/{width}.{extension}'
+
+
+def strip_metadata(data):
+    """
+    The image in `data` re-encoded in its own format without EXIF, XMP or
+    text chunks (GPS, camera serials), its orientation applied to the pixels
+    and its colour profile kept. None for anything else, which is stored as
+    uploaded.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            image_format = source.format
+            if image_format not in STRIPPED_FORMATS or getattr(source, 'is_animated', False):
+                return None
+            image = ImageOps.exif_transpose(source)
+            buffer = io.BytesIO()
+            image.save(
+                buffer, image_format, icc_profile=source.info.get('icc_profile'), **STRIPPED_FORMATS[image_format]
+            )
+            return buffer.getvalue()
+    except (OSError, ValueError):
+        return None
+
+
+def _flatten(image):
+    # JPEG has no alpha channel; transparent areas become white
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def render_variants(data, widths):
+    """
+    Resize the image in `data` to each width narrower than the original and
+    encode it as WebP and JPEG. Re-encoding without the source's info drops
+    EXIF (GPS, camera serials); orientation is applied to the pixels first.
+    WebP keeps transparency; JPEG variants are flattened onto white.
+
+    Pure CPU work with no Django access, so it can run in a worker process.
+    Returns {(width, extension): bytes}.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'L', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        rendered = {}
+        for width in sorted(widths):
+            if width >= image.width:
+                break
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS)
+            for extension, (image_format, options) in VARIANT_FORMATS.items():
+                encoded = _flatten(resized) if image_format == 'JPEG' and resized.mode == 'RGBA' else resized
+                buffer = io.BytesIO()
+                encoded.save(buffer, image_format, **options)
+                rendered[(width, extension)] = buffer.getvalue()
+        return rendered
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+    return _executor
+
+
+def _store_variants(model, pk, field, variants_field, original, rendered):
+    widths = sorted({width for width, _ in rendered})
+    for (width, extension), content in rendered.items():
+        name = variant_name(original, width, extension)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+
+    updates = {variants_field: {'source': original, 'widths': widths}}
+    if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+        updates['updated_at'] = timezone.now()
+    # Only if the image was not replaced again while the variants rendered.
+    if model._default_manager.filter(pk=pk, **{field: original}).update(**updates):
+        image_variants_ready.send(sender=model, pk=pk, field=field)
+
+
+def generate_variants(model, pk, field, variants_field, original):
+    """
+    Render and store the variants of one image field. With
+    IMAGE_VARIANT_WORKERS > 0 resizing runs in a process pool and this returns
+    at once; with 0 it all happens inline (tests, management commands).
+    """
+    try:
+        with default_storage.open(original, 'rb') as handle:
+            data = handle.read()
+    except OSError:
+        logger.warning('Cannot read %s to build image variants', original)
+        return
+
+    if not settings.IMAGE_VARIANT_WORKERS:
+        _store_variants(model, pk, field, variants_field, original, render_variants(data, variant_widths()))
+        return
+
+    def done(future):
+        # Runs on the executor's callback thread, which has its own connection.
+        try:
+            _store_variants(model, pk, field, variants_field, original, future.result())
+        except Exception:
+            logger.exception('Building image variants for %s failed', original)
+        finally:
+            close_old_connections()
+
+    _get_executor().submit(render_variants, data, variant_widths()).add_done_callback(done)
+
+
+def register_variants(model, field, variants_field):
+    """
+    Build variants of model.<field> whenever a saved row's image differs from
+    the one its variants were made from. New uploads are stored without their
+    metadata (see strip_metadata).
+    """
+    def strip_upload(sender, instance, **kwargs):
+        image = getattr(instance, field)
+        # Only files not yet written to storage, i.e. just uploaded
+        if not image or image._committed:
+            return
+        image.file.seek(0)
+        stripped = strip_metadata(image.file.read())
+        image.file.seek(0)
+        if stripped is not None:
+            image.file = ContentFile(stripped, name=image.name)
+
+    def schedule(sender, instance, **kwargs):
+        original = getattr(instance, field).name or ''
+        variants = getattr(instance, variants_field) or {}
+        if original == variants.get('source', ''):
+            return
+        if not original:
+            model._default_manager.filter(pk=instance.pk).update(**{variants_field: {}})
+            return
+        transaction.on_commit(lambda: generate_variants(model, instance.pk, field, variants_field, original))
+
+    registered_images.append((model, field, variants_field))
+    pre_save.connect(strip_upload, sender=model, weak=False, dispatch_uid=f'image_strip:{model._meta.label}.{field}')
+    post_save.connect(schedule, sender=model, weak=False, dispatch_uid=f'image_variants:{model._meta.label}.{field}')
+
+
+class ImageSrcsetField(serializers.Field):
+    """
+    Read-only srcset strings for an image's variants, per format:
+    {"webp": "<url> 320w, <url> 640w", "jpg": "..."}. Empty until the
+    variants have been generated.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        if not variants or not variants.get('widths'):
+            return {}
+        request = self.context.get('request')
+        srcset = {}
+        for extension in VARIANT_FORMATS:
+            entries = []
+            for width in variants['widths']:
+                url = default_storage.url(variant_name(variants['source'], width, extension))
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                entries.append(f'{url} {width}w')
+            srcset[extension] = ', '.join(entries)
+        return srcset
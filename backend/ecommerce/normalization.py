@@ -0,0 +1,73 @@
+import re
+import unicodedata
+
+# Arabic code points typed on Arabic keyboards (or pasted from Arabic sites)
+# that Persian text writes differently, mapped to their Persian form; Persian
+# and Arabic-Indic digits become ASCII.
+_CHARACTER_MAP = str.maketrans({
+    'ي': 'ی',  # ARABIC LETTER YEH -> ARABIC LETTER FARSI YEH
+    'ى': 'ی',  # ARABIC LETTER ALEF MAKSURA -> FARSI YEH
+    'ك': 'ک',  # ARABIC LETTER KAF -> ARABIC LETTER KEHEH
+    'ة': 'ه',  # TEH MARBUTA -> HEH
+    'ۀ': 'ه',  # HEH WITH YEH ABOVE -> HEH
+    'أ': 'ا',  # ALEF WITH HAMZA ABOVE -> ALEF
+    'إ': 'ا',  # ALEF WITH HAMZA BELOW -> ALEF
+    'ٱ': 'ا',  # ALEF WASLA -> ALEF
+    'ؤ': 'و',  # WAW WITH HAMZA ABOVE -> WAW
+    'ئ': 'ی',  # YEH WITH HAMZA ABOVE -> FARSI YEH
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},  # Persian digits
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic-Indic digits
+    # Zero-width non-joiner separates the parts of one word ("می‌خواهم");
+    # searchers type it as a space or not at all, so it becomes a space.
+    '\u200c': ' ',
+})
+
+# Harakat and other marks (fathatan..sukun, superscript alef), tatweel and
+# the remaining zero-width characters carry no meaning for matching.
+_IGNORED_RE = re.compile('[\u064b-\u065f\u0670\u0640\u200b\u200d\u200e\u200f\ufeff]')
+
+
+def normalize_text(text):
+    """
+    Fold text for search: Persian letter forms, ASCII digits, no diacritics
+    or tatweel, ZWNJ as a space, casefolded, single spaces.
+
+    Stored search columns and incoming queries both go through this, so a
+    search matches whichever variant either side was typed in.
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text)
+    text = _IGNORED_RE.sub('', text.translate(_CHARACTER_MAP))
+    return ' '.join(text.casefold().split())
+
+
+def search_text(instance, fields):
+    """The normalized search text of fields on instance, one line per field."""
+    return '\n'.join(normalize_text(getattr(instance, field) or '') for field in fields)
+
+
+def refresh_search_text(instance, fields, save_kwargs):
+    """
+    Set instance.search_text from fields before save(); when save() was given
+    update_fields touching one of them, search_text is added to it.
+    """
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None:
+        if not set(fields).intersection(update_fields):
+            return
+        save_kwargs['update_fields'] = {*update_fields, 'search_text'}
+    instance.search_text = search_text(instance, fields)
+
+
+def fill_search_text(queryset, fields, batch_size=500):
+    """Recompute search_text for every row of queryset (backfills, repairs)."""
+    batch = []
+    for instance in queryset.only('pk', *fields).iterator(chunk_size=batch_size):
+        instance.search_text = search_text(instance, fields)
+        batch.append(instance)
+        if len(batch) >= batch_size:
+            queryset.model._default_manager.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        queryset.model._default_manager.bulk_update(batch, ['search_text'])
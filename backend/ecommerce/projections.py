@@ -0,0 +1,79 @@
+from django.db.models import Prefetch
+
+
+def requested_fields(request, serializer_class):
+    """
+    The serializer fields a request asked for, or None for all of them.
+
+    ?view=<name> picks a named field set from the serializer's
+    Meta.projections (e.g. "card"), ?fields=a,b keeps only the listed fields
+    and ?omit=a,b drops fields; they combine in that order. Unknown names are
+    ignored so that clients can ask for fields older servers do not have.
+    """
+    params = request.query_params
+    view, only, omit = params.get('view'), params.get('fields'), params.get('omit')
+    if not (view or only or omit):
+        return None
+
+    fields = list(serializer_class.Meta.fields)
+    projections = getattr(serializer_class.Meta, 'projections', {})
+    if view in projections:
+        fields = [name for name in fields if name in projections[view]]
+    if only:
+        wanted = set(only.split(','))
+        fields = [name for name in fields if name in wanted]
+    if omit:
+        unwanted = set(omit.split(','))
+        fields = [name for name in fields if name not in unwanted]
+    return fields
+
+
+class SparseFieldsetMixin:
+    """
+    ModelSerializer mixin taking a `fields=` keyword (usually the result of
+    requested_fields()) that restricts which fields are rendered.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def model_sources(serializer):
+    """
+    Model attributes, columns and relations alike, read by a serializer's
+    fields. Fields that are not a plain attribute (method fields, say) list
+    what they read in Meta.field_sources.
+    """
+    extra = getattr(serializer.Meta, 'field_sources', {})
+    sources = set()
+    for name, field in serializer.fields.items():
+        sources.update(extra.get(name) or (field.source.split('.')[0],))
+    return sources
+
+
+def project(queryset, serializer_class, fields, extra=()):
+    """
+    Restrict queryset to what serializer_class(fields=fields) renders: only()
+    the columns it reads, plus `extra` ones the caller needs, and drop joins
+    and prefetches of relations it does not show. With fields=None the
+    queryset is returned unchanged.
+    """
+    if fields is None:
+        return queryset
+
+    sources = model_sources(serializer_class(fields=fields)) | set(extra)
+    opts = queryset.model._meta
+    columns = [field.name for field in opts.concrete_fields if field.name in sources]
+    lookups = [
+        lookup for lookup in queryset._prefetch_related_lookups
+        if (lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup).split('__')[0] in sources
+    ]
+    queryset = queryset.only(*columns).prefetch_related(None).prefetch_related(*lookups)
+    joined = queryset.query.select_related
+    if isinstance(joined, dict):
+        # A deferred foreign key cannot be select_related()
+        queryset = queryset.select_related(None).select_related(*(name for name in joined if name in sources))
+    return queryset
@@ -0,0 +1,117 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, IntegerField, Q, Value
+from django.db.models.functions import Cast
+
+from .normalization import normalize_text
+
+_TERM_RE = re.compile(r'\w+')
+
+# 'simple' does no stemming or stop-word removal, which keeps matching
+# predictable for a catalog that mixes English and Persian names.
+SEARCH_CONFIG = 'simple'
+
+# Ranks are floats; they are scaled and cast to integers so that cursor
+# pagination can compare them exactly.
+RANK_SCALE = 1000000
+RELEVANCE_ORDERING = ('-rank', '-id')
+
+
+def search_terms(text):
+    """The words of text after normalize_text(), as stored in search_text."""
+    return _TERM_RE.findall(normalize_text(text))
+
+
+def normalized_match(terms):
+    """
+    Rows whose normalized search_text contains every term. On PostgreSQL each
+    LIKE is answered by the trigram index on search_text.
+    """
+    condition = Q()
+    for term in terms:
+        condition &= Q(search_text__contains=term)
+    return condition
+
+
+def supports_full_text(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def weighted_search_vector(weights):
+    """SearchVector over the (field, weight) pairs in weights."""
+    vectors = [SearchVector(field, weight=weight, config=SEARCH_CONFIG) for field, weight in weights]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector + other
+    return vector
+
+
+def update_search_vector(queryset, weights):
+    """Recompute the stored search_vector column for every row in queryset."""
+    if supports_full_text(queryset):
+        queryset.update(search_vector=weighted_search_vector(weights))
+
+
+def prefix_search_query(text):
+    """
+    Build a tsquery that matches every word of text as a prefix, so that
+    "blu sh" finds "Blue Shirt". Returns None when text has no words.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return None
+    return SearchQuery(' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG)
+
+
+def ranked_search(queryset, text):
+    """
+    Filter queryset to rows matching text and annotate an integer `rank`.
+
+    For models with the search_text and search_vector columns. Query and
+    stored text are both normalized (Persian/Arabic letter forms, digits,
+    diacritics, see ecommerce.normalization). On PostgreSQL rows match the
+    GIN-indexed search_vector or contain every term in the trigram-indexed
+    search_text, which also catches text stored with Arabic letter forms, and
+    are ranked with ts_rank. Other databases only use search_text, with a
+    constant rank.
+    """
+    query = prefix_search_query(text)
+    if query is None:
+        return queryset.none()
+    matches_text = normalized_match(search_terms(text))
+
+    if not supports_full_text(queryset):
+        return queryset.filter(matches_text).annotate(rank=Value(0, output_field=IntegerField()))
+
+    return queryset.filter(Q(search_vector=query) | matches_text).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query) * RANK_SCALE, IntegerField())
+    )
+
+
+def fuzzy_search(queryset, text):
+    """
+    Typo-tolerant fallback for ranked_search: rows whose search_text has a
+    word similar to text (pg_trgm's <% operator, answered by the trigram
+    index on search_text), ranked by that word similarity as an integer
+    `rank`. PostgreSQL only; elsewhere nothing matches.
+    """
+    normalized = ' '.join(search_terms(text))
+    if not normalized or not supports_full_text(queryset):
+        return queryset.none()
+    return queryset.filter(search_text__trigram_word_similar=normalized).annotate(
+        rank=Cast(TrigramWordSimilarity(normalized, 'search_text') * RANK_SCALE, IntegerField())
+    )
+
+
+def match_text(queryset, text):
+    """
+    Rows of queryset containing every word of text, unranked; through the
+    in-process index for the models store.textsearch covers.
+    """
+    # store.textsearch imports the models, which import this module
+    from store.textsearch import index_search, uses_text_index
+    if uses_text_index(queryset):
+        return index_search(queryset, text)
+    return queryset.filter(normalized_match(search_terms(text)))
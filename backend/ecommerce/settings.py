@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third-party apps
     'rest_framework',
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
     'admin_panel',
     'dashboard',
     'blog',  # Add our new blog app
+    'search',
 ]
 
 MIDDLEWARE = [
@@ -188,10 +190,48 @@ CSRF_COOKIE_DOMAIN = 'localhost'
 CSRF_USE_SESSIONS = False
 CSRF_COOKIE_AGE = 31449600  # 1 year in seconds
 
+# Cache used for catalog payloads (store.cache). Entries have no TTL and are
+# invalidated by catalog signals, so with several workers this should point
+# at a shared backend such as Redis or Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+CATALOG_CACHE_ALIAS = 'default'
+
+# Default price histogram edges (in Tomans) for catalog facets, see store.facets
+CATALOG_PRICE_BUCKETS = [0, 100000, 500000, 1000000, 5000000, 10000000]
+
+# Unfiltered listings over tables larger than this report PostgreSQL's row
+# estimate as their total instead of counting, see ecommerce.counting
+CATALOG_COUNT_ESTIMATE_THRESHOLD = 100000
+
+# Where the `search` parameter of the product and blog listings is answered:
+# 'database' (full text / trigram on PostgreSQL, LIKE elsewhere) or 'memory',
+# an in-process inverted index that needs no PostgreSQL extensions, see
+# store.textsearch
+CATALOG_SEARCH_BACKEND = 'database'
+
+# How long a new order holds its items' stock while awaiting payment; the
+# release_expired_reservations command returns it afterwards (checkout.stock)
+STOCK_RESERVATION_MINUTES = 15
+
+# Threads verifying payments after the gateway's callback, so the redirect
+# does not wait on ZarinPal; 0 verifies inline (checkout.payments). The
+# verify_pending_payments command retries any left unverified.
+PAYMENT_VERIFICATION_WORKERS = 4
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Responsive image variants (ecommerce.images): widths rendered as WebP and
+# JPEG after upload, and the size of the process pool doing the resizing.
+# 0 workers renders inline in the saving process.
+IMAGE_VARIANT_WIDTHS = [320, 640, 1024, 1600]
+IMAGE_VARIANT_WORKERS = 2
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -224,3 +264,16 @@ SIMPLE_JWT = {
 ZARINPAL_MERCHANT_ID = '1344b5d4-0048-11e8-94db-005056a205be'  # This is a test merchant ID
 ZARINPAL_SANDBOX = True  # Use sandbox for testing
 FRONTEND_URL = 'http://localhost:3000'  # Your frontend URL for redirects
+
+# Sharded sitemap files written by `manage.py update_sitemaps` (run it from
+# cron). They live under MEDIA_ROOT, so they are served as files by whatever
+# serves media (the web server; Django itself only with DEBUG), and the
+# frontend proxies them on its own host (rewrites in next.config.js) since a
+# sitemap may only list URLs of the host it is served from. Pages are listed
+# under SITEMAP_BASE_URL; SITEMAP_URL is where the shards are fetched.
+SITEMAP_ROOT = MEDIA_ROOT / 'sitemaps'
+SITEMAP_BASE_URL = FRONTEND_URL
+SITEMAP_URL = f'{FRONTEND_URL}/sitemaps'
+# Frontend pages listed besides products, categories and posts ("/" redirects
+# to /home, see next.config.js)
+SITEMAP_STATIC_PATHS = ['/home', '/products', '/blog']
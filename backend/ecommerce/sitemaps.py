@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max
+
+# The sitemap protocol's limit on URLs per file
+SHARD_SIZE = 50000
+
+MANIFEST_NAME = 'manifest.json'
+INDEX_NAME = 'sitemap.xml'
+# Frontend pages with no row behind them, listed in a shard of their own
+STATIC_NAME = 'pages.xml'
+
+
+def sitemap_sections():
+    """Section name -> (queryset of listed rows, frontend path template)."""
+    from blog.models import BlogPost
+    from store.models import Category, Product
+
+    return {
+        'products': (Product.objects.filter(available=True), '/product/{slug}'),
+        'categories': (Category.objects.all(), '/category/{slug}'),
+        'posts': (BlogPost.objects.filter(is_published=True), '/blog/{slug}'),
+    }
+
+
+def shard_states(queryset):
+    """
+    {shard: (row count, latest updated_at)} in one grouped query. Shards are
+    fixed id ranges, so an edit only ever changes the state of its own shard;
+    a removal shows up as a lower count.
+    """
+    shard = ExpressionWrapper(F('id') / SHARD_SIZE, output_field=IntegerField())
+    rows = (
+        queryset.order_by()
+        .annotate(shard=shard)
+        .values('shard')
+        .annotate(count=Count('id'), latest=Max('updated_at'))
+    )
+    return {row['shard']: (row['count'], row['latest'].isoformat()) for row in rows}
+
+
+def _write_atomic(path, chunks):
+    # Crawlers may be reading the old file; swap the new one in whole.
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(handle, 'w', encoding='utf-8') as output:
+        output.writelines(chunks)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+
+
+def _static_xml(paths, base_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for path in paths:
+        yield f'<url><loc>{escape(base_url + path)}</loc></url>\n'
+    yield '</urlset>\n'
+
+
+def _shard_xml(queryset, shard, path_template, base_url):
+    rows = (
+        queryset.filter(id__gte=shard * SHARD_SIZE, id__lt=(shard + 1) * SHARD_SIZE)
+        .order_by('id')
+        .values_list('slug', 'updated_at')
+    )
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for slug, updated_at in rows.iterator(chunk_size=2000):
+        location = escape(base_url + path_template.format(slug=slug))
+        yield f'<url><loc>{location}</loc><lastmod>{updated_at.isoformat()}</lastmod></url>\n'
+    yield '</urlset>\n'
+
+
+def shard_name(section, shard):
+    return f'{section}-{shard}.xml'
+
+
+def update_sitemaps(root=None, base_url=None, sitemap_url=None):
+    """
+    Bring the sitemap files under root up to date and return the names of the
+    shards that were (re)written.
+
+    Only shards whose row count or latest updated_at differ from the manifest
+    of the previous run are regenerated; the index is rewritten whenever any
+    shard changed. Meant to run periodically (cron) rather than per request.
+    """
+    root = str(root or settings.SITEMAP_ROOT)
+    base_url = (base_url or settings.SITEMAP_BASE_URL).rstrip('/')
+    sitemap_url = (sitemap_url or settings.SITEMAP_URL).rstrip('/')
+    os.makedirs(root, exist_ok=True)
+
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            previous = json.load(manifest_file)
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest = {}
+    written = []
+    static_paths = list(settings.SITEMAP_STATIC_PATHS)
+    if previous.get('static') != static_paths or not os.path.exists(os.path.join(root, STATIC_NAME)):
+        _write_atomic(os.path.join(root, STATIC_NAME), _static_xml(static_paths, base_url))
+        written.append(STATIC_NAME)
+    for section, (queryset, path_template) in sitemap_sections().items():
+        states = shard_states(queryset)
+        manifest[section] = {}
+        for shard, (count, latest) in sorted(states.items()):
+            name = shard_name(section, shard)
+            manifest[section][str(shard)] = [count, latest]
+            if previous.get(section, {}).get(str(shard)) != [count, latest] or not os.path.exists(os.path.join(root, name)):
+                _write_atomic(os.path.join(root, name), _shard_xml(queryset, shard, path_template, base_url))
+                written.append(name)
+        # Shards left without any rows
+        for shard in set(previous.get(section, {})) - set(manifest[section]):
+            written.append(shard_name(section, shard))
+            try:
+                os.remove(os.path.join(root, shard_name(section, shard)))
+            except FileNotFoundError:
+                pass
+
+    if written or not os.path.exists(os.path.join(root, INDEX_NAME)):
+        def index():
+            yield '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+            yield f'<sitemap><loc>{escape(f"{sitemap_url}/{STATIC_NAME}")}</loc></sitemap>\n'
+            for section, shards in manifest.items():
+                for shard, (_, latest) in sorted(shards.items(), key=lambda item: int(item[0])):
+                    location = escape(f'{sitemap_url}/{shard_name(section, shard)}')
+                    yield f'<sitemap><loc>{location}</loc><lastmod>{latest}</lastmod></sitemap>\n'
+            yield '</sitemapindex>\n'
+
+        _write_atomic(os.path.join(root, INDEX_NAME), index())
+    _write_atomic(manifest_path, [json.dumps({**manifest, 'static': static_paths})])
+    return written
@@ -0,0 +1,137 @@
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left
+
+from .normalization import normalize_text
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Query words joining alternatives: "shirt OR blouse", "shirt | blouse"
+_OR_RE = re.compile(r'\s+(?:OR|\|)\s+|\s*\|\s*')
+
+
+def tokenize(text):
+    """The words of text after normalize_text()."""
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+def parse_query(text):
+    """
+    Alternatives of a query, each a list of words that must all match:
+    "red shirt OR blue" -> [['red', 'shirt'], ['blue']].
+    """
+    groups = (tokenize(part) for part in _OR_RE.split(text or ''))
+    return [group for group in groups if group]
+
+
+class InvertedIndex:
+    """
+    Word -> postings index over weighted document text, kept in memory.
+
+    Each word's postings are two parallel arrays, the sorted ids of the
+    documents containing it and the word's (log-scaled, weighted) term
+    frequency in each, so a
+    million postings take ~12MB rather than a million Python objects. A
+    sorted list of the words answers prefix lookups by binary search.
+
+    Documents are added, replaced and removed one at a time; queries are
+    alternatives (OR) of word lists (AND) where every word matches as a
+    prefix, ranked by tf-idf. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._weights = {}
+        self._words = []
+        # Document id -> its words, to find its postings again on removal
+        self._documents = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def words(self):
+        """Every indexed word, sorted."""
+        with self._lock:
+            return list(self._words)
+
+    def add(self, doc_id, fields):
+        """Index (or re-index) doc_id from (text, weight) pairs."""
+        frequencies = {}
+        for text, weight in fields:
+            for word in tokenize(text):
+                frequencies[word] = frequencies.get(word, 0) + weight
+        with self._lock:
+            self.remove(doc_id)
+            for word, frequency in frequencies.items():
+                ids = self._ids.get(word)
+                frequency = 1 + math.log(frequency)
+                if ids is None:
+                    self._ids[word] = array('q', [doc_id])
+                    self._weights[word] = array('f', [frequency])
+                    self._words.insert(bisect_left(self._words, word), word)
+                    continue
+                # New rows get the highest ids, so this is usually an append
+                position = len(ids) if doc_id > ids[-1] else bisect_left(ids, doc_id)
+                ids.insert(position, doc_id)
+                self._weights[word].insert(position, frequency)
+            self._documents[doc_id] = tuple(frequencies)
+
+    def remove(self, doc_id):
+        with self._lock:
+            for word in self._documents.pop(doc_id, ()):
+                ids = self._ids[word]
+                position = bisect_left(ids, doc_id)
+                del ids[position]
+                del self._weights[word][position]
+                if not ids:
+                    del self._ids[word], self._weights[word]
+                    del self._words[bisect_left(self._words, word)]
+
+    def _expand(self, prefix):
+        start = bisect_left(self._words, prefix)
+        for position in range(start, len(self._words)):
+            word = self._words[position]
+            if not word.startswith(prefix):
+                break
+            yield word
+
+    def _matches(self, prefix):
+        """{doc_id: score} of documents with a word starting with prefix."""
+        total = len(self._documents)
+        scores = None
+        for word in self._expand(prefix):
+            ids = self._ids[word]
+            word_scores = zip(ids, map(math.log(1 + total / len(ids)).__mul__, self._weights[word]))
+            if scores is None:
+                scores = dict(word_scores)
+            else:
+                for doc_id, score in word_scores:
+                    scores[doc_id] = scores.get(doc_id, 0) + score
+        return scores or {}
+
+    def search(self, query, limit=None):
+        """
+        [(doc_id, score)] best first for a query string (see parse_query),
+        at most limit of them.
+        """
+        results = None
+        with self._lock:
+            for group in parse_query(query):
+                # Intersect starting from the rarest word
+                matches = sorted((self._matches(prefix) for prefix in group), key=len)
+                combined = matches[0]
+                for other in matches[1:]:
+                    combined = {doc_id: score + other[doc_id] for doc_id, score in combined.items() if doc_id in other}
+                    if not combined:
+                        break
+                if results is None:
+                    results = combined
+                else:
+                    for doc_id, score in combined.items():
+                        results[doc_id] = max(results.get(doc_id, 0), score)
+        results = results or {}
+        ranked = sorted(results.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return ranked if limit is None else ranked[:limit]
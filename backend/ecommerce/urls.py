@@ -30,6 +30,7 @@ urlpatterns = [
     path('api/admin-panel/', include('admin_panel.urls')),
     path('api/dashboard/', include('dashboard.urls')),
     path('api/blog/', include('blog.urls')),
+    path('api/search/', include('search.urls')),
     
     # Authentication endpoints
     path('api/auth/', include('users.auth_urls')),
@@ -1,5 +1,9 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.text import slugify
+from ecommerce.normalization import refresh_search_text
+from ecommerce.search import update_search_vector
+from store.search import PRODUCT_SEARCH_WEIGHTS
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -53,6 +57,13 @@ class Product(models.Model):
     mpn = models.CharField(max_length=100, blank=True, help_text="Manufacturer Part Number")
     gtin = models.CharField(max_length=100, blank=True, help_text="Global Trade Item Number (GTIN/UPC/EAN)")
 
+    # Weighted name/description tsvector kept current by save(), see store.search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # normalize_text() of SEARCH_TEXT_FIELDS, see ecommerce.search
+    search_text = models.TextField(blank=True, default='', editable=False)
+
+    SEARCH_TEXT_FIELDS = ('name', 'description')
+
     class Meta:
         app_label = 'products'
 
@@ -65,7 +76,9 @@ class Product(models.Model):
             self.meta_title = self.meta_title[:70]
         if not self.meta_description and self.description:
             self.meta_description = self.description[:157] + '...' if len(self.description) > 160 else self.description
+        refresh_search_text(self, self.SEARCH_TEXT_FIELDS, kwargs)
         super().save(*args, **kwargs)
+        update_search_vector(Product.objects.filter(pk=self.pk), PRODUCT_SEARCH_WEIGHTS)
 
     def __str__(self):
         return self.name
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from ecommerce.projections import SparseFieldsetMixin
 from .models import Product, Category
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -9,7 +10,7 @@ class CategorySerializer(serializers.ModelSerializer):
             'meta_title', 'meta_description', 'schema_type', 'canonical_url'
         ]
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     
     class Meta:
@@ -20,4 +21,8 @@ class ProductSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'meta_title', 'meta_description',
             'schema_type', 'canonical_url', 'brand', 'sku', 
             'weight', 'dimensions', 'mpn', 'gtin'
-        ] 
\ No newline at end of file
+        ]
+        # Named field sets for ?view=; "card" is what a product grid tile shows
+        projections = {
+            'card': ['id', 'name', 'slug', 'price', 'image', 'is_available'],
+        } 
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.cache import invalidate_model
+
+from .models import Product
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_counts(sender, instance, **kwargs):
+    invalidate_model('products.Product')
@@ -1,90 +1,82 @@
 from django.shortcuts import render, get_object_or_404
 from rest_framework import viewsets, filters
-from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Case, When, IntegerField
 from django.core.paginator import Paginator
+from django.utils.decorators import method_decorator
+from ecommerce.conditional import conditional_on, queryset_state
+from store.catalog import CatalogQuery
+from ecommerce.counting import count_mode, counted_page
+from store.facets import facet_counts, price_edges
 from .models import Product, Category
 from .serializers import ProductSerializer, CategorySerializer
 
 # Create your views here.
 
+class ProductCatalogQuery(CatalogQuery):
+    # products.Product has a single category, rendered nested in every row
+    category_lookup = 'category__slug'
+    select_related = ('category',)
+    default_page_size = 8
+    page_sizes = (4, 8, 16, 32)
+
+def _product_listing(request, products, count_endpoint, count_scope=None, **extra):
+    """
+    Page (or, with ?cursor / ?pagination=cursor, keyset) of products plus
+    `extra` top-level keys, as returned by both viewsets. Page mode totals
+    are cached under count_endpoint per filter set within count_scope, and
+    ?count=none skips them, see ecommerce.counting.
+    """
+    query = ProductCatalogQuery(request, ProductSerializer)
+    queryset = query.build(products)
+
+    if query.cursor_mode:
+        page = query.paginate(queryset)
+        data = {
+            **extra,
+            'products': ProductSerializer(page.object_list, many=True, fields=query.fields).data,
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+            'page_size': query.page_size
+        }
+    else:
+        rows, meta = counted_page(
+            queryset, count_endpoint, {**query.filter_params(), **(count_scope or {})},
+            query.page, query.page_size, count_mode(request)
+        )
+        data = {
+            **extra,
+            'products': ProductSerializer(rows, many=True, fields=query.fields).data,
+            **meta
+        }
+
+    if query.facets:
+        categories = list(Category.objects.values('id', 'name', 'slug'))
+        data['facets'] = facet_counts(
+            query.filter(products), categories, price_edges(request),
+            category_field='category', available_field='is_available'
+        )
+    return Response(data)
+
+def catalog_state(request, *args, **kwargs):
+    return queryset_state(Category.objects.all(), Product.objects.all())
+
+catalog_conditional = conditional_on(catalog_state)
+
+@method_decorator(catalog_conditional, name='retrieve')
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
     
     def retrieve(self, request, slug=None):
-        # Get query parameters
-        search = request.query_params.get('search', '')
-        sort_by = request.query_params.get('sort_by', 'relevance')
-        min_price = request.query_params.get('min_price')
-        max_price = request.query_params.get('max_price')
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 8))
-        
-        # Validate page_size (allowed values: 4, 8, 16, 32)
-        if page_size not in [4, 8, 16, 32]:
-            page_size = 8
-            
-        # Get category
         category = get_object_or_404(Category, slug=slug)
-        
-        # Get products in this category
-        queryset = Product.objects.filter(category=category)
-        
-        # Apply search filter
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search)
-            )
-
-        # Apply price range filter
-        if min_price:
-            queryset = queryset.filter(price__gte=float(min_price))
-        if max_price:
-            queryset = queryset.filter(price__lte=float(max_price))
-
-        # Apply sorting
-        if sort_by == 'price_low_high':
-            queryset = queryset.order_by('price')
-        elif sort_by == 'price_high_low':
-            queryset = queryset.order_by('-price')
-        elif sort_by == 'newest':
-            queryset = queryset.order_by('-created_at')
-        elif sort_by == 'relevance' and search:
-            # For relevance sorting, prioritize name matches over description matches
-            queryset = queryset.annotate(
-                name_match=Case(
-                    When(name__icontains=search, then=1),
-                    default=0,
-                    output_field=IntegerField(),
-                )
-            ).order_by('-name_match', '-created_at')
-            
-        # Get total count before pagination for metadata
-        total_items = queryset.count()
-        total_pages = (total_items + page_size - 1) // page_size  # Ceiling division
-
-        # Apply pagination directly with slicing for better performance
-        start = (page - 1) * page_size
-        end = start + page_size
-        queryset_page = queryset[start:end]
-        
-        # Serialize products and category
-        product_serializer = ProductSerializer(queryset_page, many=True)
-        category_serializer = self.get_serializer(category)
-        
-        return Response({
-            'category': category_serializer.data,
-            'products': product_serializer.data,
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'current_page': page,
-            'page_size': page_size
-        })
+        return _product_listing(
+            request, Product.objects.filter(category=category),
+            'products_product_count', {'in_category': category.pk},
+            category=self.get_serializer(category).data
+        )
 
+@method_decorator(catalog_conditional, name='list')
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
@@ -92,66 +84,4 @@ class ProductViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
 
     def list(self, request):
-        # Get query parameters
-        search = request.query_params.get('search', '')
-        sort_by = request.query_params.get('sort_by', 'relevance')
-        min_price = request.query_params.get('min_price')
-        max_price = request.query_params.get('max_price')
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 8))
-        
-        # Validate page_size (allowed values: 4, 8, 16, 32)
-        if page_size not in [4, 8, 16, 32]:
-            page_size = 8
-
-        # Base queryset
-        queryset = self.get_queryset()
-
-        # Apply search filter
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search)
-            )
-
-        # Apply price range filter
-        if min_price:
-            queryset = queryset.filter(price__gte=float(min_price))
-        if max_price:
-            queryset = queryset.filter(price__lte=float(max_price))
-
-        # Apply sorting
-        if sort_by == 'price_low_high':
-            queryset = queryset.order_by('price')
-        elif sort_by == 'price_high_low':
-            queryset = queryset.order_by('-price')
-        elif sort_by == 'newest':
-            queryset = queryset.order_by('-created_at')
-        elif sort_by == 'relevance' and search:
-            # For relevance sorting, prioritize name matches over description matches
-            queryset = queryset.annotate(
-                name_match=Case(
-                    When(name__icontains=search, then=1),
-                    default=0,
-                    output_field=IntegerField(),
-                )
-            ).order_by('-name_match', '-created_at')
-
-        # Get total count before pagination for metadata
-        total_items = queryset.count()
-        total_pages = (total_items + page_size - 1) // page_size  # Ceiling division
-
-        # Apply pagination directly with slicing for better performance
-        start = (page - 1) * page_size
-        end = start + page_size
-        queryset_page = queryset[start:end]
-
-        serializer = self.get_serializer(queryset_page, many=True)
-
-        return Response({
-            'products': serializer.data,
-            'total_items': total_items,
-            'total_pages': total_pages,
-            'current_page': page,
-            'page_size': page_size
-        })
+        return _product_listing(request, self.get_queryset(), 'products_product_count')
@@ -0,0 +1,131 @@
+from django.apps import apps
+from django.db import transaction
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from ecommerce.normalization import normalize_text
+from ecommerce.search import update_search_vector
+
+from .models import SearchDocument
+
+# Title matches outrank body matches, see ecommerce.search.weighted_search_vector
+DOCUMENT_SEARCH_WEIGHTS = (('search_title', 'A'), ('search_text', 'B'))
+
+SUMMARY_WORDS = 30
+
+
+def _summary(text):
+    return Truncator(' '.join(strip_tags(text or '').split())).words(SUMMARY_WORDS)[:300]
+
+
+def product_document(product):
+    if not product.available:
+        return None
+    return {
+        'title': product.name,
+        'slug': product.slug,
+        'body': product.description,
+        'summary': _summary(product.description),
+        'image': product.image.name if product.image else '',
+    }
+
+
+def category_document(category):
+    return {
+        'title': category.name,
+        'slug': category.slug,
+        'body': category.description,
+        'summary': _summary(category.description),
+        'image': category.image.name if category.image else '',
+    }
+
+
+def post_document(post):
+    if not post.is_published:
+        return None
+    return {
+        'title': post.title,
+        'slug': post.slug,
+        'body': f'{post.excerpt}\n{strip_tags(post.content)}',
+        'summary': _summary(post.excerpt or post.content),
+        'image': post.cover_image.name if post.cover_image else '',
+    }
+
+
+def tag_document(tag):
+    return {'title': tag.name, 'slug': tag.slug, 'body': '', 'summary': '', 'image': ''}
+
+
+# Document kind -> (source model, rows to index, row -> document fields or
+# None when the row is not publicly visible). Frontend paths are added by
+# search.views.
+SOURCES = {
+    'product': ('store.Product', lambda model: model.objects.filter(available=True), product_document),
+    'category': ('store.Category', lambda model: model.objects.all(), category_document),
+    'post': ('blog.BlogPost', lambda model: model.objects.filter(is_published=True), post_document),
+    'tag': ('blog.Tag', lambda model: model.objects.all(), tag_document),
+}
+
+
+def source_kind(model):
+    """The document kind indexing rows of model, or None."""
+    for kind, (label, _, _) in SOURCES.items():
+        if model._meta.label == label:
+            return kind
+    return None
+
+
+def _build(kind, instance):
+    fields = SOURCES[kind][2](instance)
+    if fields is None:
+        return None
+    body = fields.pop('body') or ''
+    return SearchDocument(
+        kind=kind,
+        object_id=instance.pk,
+        search_title=normalize_text(fields['title'])[:255],
+        search_text=normalize_text(f"{fields['title']}\n{body}"),
+        **fields,
+    )
+
+
+def index_instance(instance):
+    """Add, refresh or (when no longer visible) remove instance's document."""
+    kind = source_kind(type(instance))
+    document = _build(kind, instance)
+    if document is None:
+        remove_instance(type(instance), instance.pk)
+        return
+    with transaction.atomic():
+        document, _ = SearchDocument.objects.update_or_create(
+            kind=kind,
+            object_id=instance.pk,
+            defaults={
+                field: getattr(document, field)
+                for field in ('title', 'slug', 'summary', 'image', 'search_title', 'search_text')
+            },
+        )
+        update_search_vector(SearchDocument.objects.filter(pk=document.pk), DOCUMENT_SEARCH_WEIGHTS)
+
+
+def remove_instance(model, pk):
+    SearchDocument.objects.filter(kind=source_kind(model), object_id=pk).delete()
+
+
+def rebuild_index(kinds=None, batch_size=500):
+    """Replace the documents of kinds (default: all) from their source tables."""
+    for kind in kinds or SOURCES:
+        label, rows, _ = SOURCES[kind]
+        model = apps.get_model(label)
+        with transaction.atomic():
+            SearchDocument.objects.filter(kind=kind).delete()
+            batch = []
+            for instance in rows(model).iterator(chunk_size=batch_size):
+                document = _build(kind, instance)
+                if document is not None:
+                    batch.append(document)
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.bulk_create(batch)
+                    batch = []
+            SearchDocument.objects.bulk_create(batch)
+            update_search_vector(SearchDocument.objects.filter(kind=kind), DOCUMENT_SEARCH_WEIGHTS)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from search.index import SOURCES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the site search index from products, categories, blog posts and tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', help=f"Document kinds to rebuild: {', '.join(SOURCES)} (default: all)")
+
+    def handle(self, *args, **options):
+        unknown = set(options['kinds']) - set(SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown document kinds: {', '.join(sorted(unknown))}")
+        rebuild_index(options['kinds'] or None)
+        self.stdout.write('Search index rebuilt')
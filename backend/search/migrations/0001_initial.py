@@ -0,0 +1,62 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:21
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# GIN indexes for the tsvector and for the LIKE '%term%' matches on
+# search_text (ecommerce.search.ranked_search); PostgreSQL only. The index is
+# filled by `manage.py rebuild_search_index` and kept current by signals.
+CREATE_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS search_document_vector_idx ON search_searchdocument USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS search_document_text_trgm_idx ON search_searchdocument USING gin (search_text gin_trgm_ops)',
+]
+DROP_INDEXES = [
+    'DROP INDEX IF EXISTS search_document_vector_idx',
+    'DROP INDEX IF EXISTS search_document_text_trgm_idx',
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in CREATE_INDEXES:
+            schema_editor.execute(statement)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in DROP_INDEXES:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('category', 'Category'), ('post', 'Blog post'), ('tag', 'Tag')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('slug', models.CharField(max_length=255)),
+                ('summary', models.CharField(blank=True, max_length=300)),
+                ('image', models.CharField(blank=True, max_length=255)),
+                ('search_title', models.CharField(blank=True, default='', max_length=255)),
+                ('search_text', models.TextField(blank=True, default='')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_kind_object_uniq'),
+        ),
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,38 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """
+    One searchable row of the site search index: a product, category, blog
+    post or tag, denormalized from its source table by search.index so that
+    site search is a single indexed query instead of one per model.
+    """
+    KIND_CHOICES = [
+        ('product', 'Product'),
+        ('category', 'Category'),
+        ('post', 'Blog post'),
+        ('tag', 'Tag'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    slug = models.CharField(max_length=255)
+    summary = models.CharField(max_length=300, blank=True)
+    # Image file name relative to MEDIA_ROOT, if the source has one
+    image = models.CharField(max_length=255, blank=True)
+    # normalize_text() of the title alone and of title plus body; the
+    # tsvector weights them A and B. GIN-indexed on PostgreSQL (migration 0001).
+    search_title = models.CharField(max_length=255, blank=True, default='')
+    search_text = models.TextField(blank=True, default='')
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_kind_object_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}: {self.title}'
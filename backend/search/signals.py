@@ -0,0 +1,21 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .index import SOURCES, index_instance, remove_instance
+
+
+def index_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: index_instance(instance))
+
+
+def remove_on_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: remove_instance(sender, pk))
+
+
+for label, _, _ in SOURCES.values():
+    model = apps.get_model(label)
+    post_save.connect(index_on_save, sender=model, dispatch_uid=f'search_index_{label}')
+    post_delete.connect(remove_on_delete, sender=model, dispatch_uid=f'search_remove_{label}')
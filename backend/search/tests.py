@@ -0,0 +1,68 @@
+import io
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog.models import BlogPost, Tag
+from store.models import Category, Product
+from .models import SearchDocument
+
+
+class SiteSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Garden Tools', slug='garden-tools')
+            self.product = Product.objects.create(
+                name='Garden Hose', slug='hose', description='Twenty metres', price=Decimal('9.00'), stock=3
+            )
+            self.post = BlogPost.objects.create(
+                title='Watering your garden', slug='watering', content='<p>Mornings are best</p>', is_published=True
+            )
+            Tag.objects.create(name='Garden', slug='garden')
+            BlogPost.objects.create(title='Garden drafts', slug='draft', content='...', is_published=False)
+
+    def search(self, **params):
+        return self.client.get('/api/search/', params).data
+
+    def test_one_request_returns_every_kind(self):
+        data = self.search(q='garden')
+        self.assertEqual(
+            sorted((result['type'], result['slug']) for result in data['results']),
+            [('category', 'garden-tools'), ('post', 'watering'), ('product', 'hose'), ('tag', 'garden')],
+        )
+        self.assertEqual(data['counts'], {'category': 1, 'post': 1, 'product': 1, 'tag': 1})
+        paths = {result['type']: result['path'] for result in data['results']}
+        self.assertEqual(paths['product'], '/product/hose')
+        self.assertEqual(paths['tag'], '/blog?tag=garden')
+
+    def test_type_filter_and_cursor(self):
+        data = self.search(q='garden', type='product,post', page_size=1)
+        self.assertEqual(len(data['results']), 1)
+        second = self.search(q='garden', type='product,post', page_size=1, cursor=data['next_cursor'])
+        self.assertEqual(
+            {data['results'][0]['type'], second['results'][0]['type']}, {'product', 'post'}
+        )
+        self.assertIsNone(second['next_cursor'])
+        # Counts still cover every kind, for result tabs
+        self.assertEqual(len(second['counts']), 4)
+
+    def test_index_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Rubber Hose'
+            self.product.save()
+        self.assertEqual(self.search(q='rubber')['results'][0]['title'], 'Rubber Hose')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.is_published = False
+            self.post.save()
+            self.category.delete()
+        # The renamed product no longer mentions gardens either
+        self.assertEqual(self.search(q='garden')['counts'], {'tag': 1})
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 4)
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.db.models import Count
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+from ecommerce.pagination import KeysetPaginator
+from ecommerce.search import RELEVANCE_ORDERING, ranked_search
+
+from .index import SOURCES
+from .models import SearchDocument
+
+# Frontend path of each document kind, as in ecommerce.sitemaps
+DOCUMENT_PATHS = {
+    'product': '/product/{slug}',
+    'category': '/category/{slug}',
+    'post': '/blog/{slug}',
+    'tag': '/blog?tag={slug}',
+}
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+
+def serialize_document(request, document):
+    return {
+        'type': document.kind,
+        'id': document.object_id,
+        'title': document.title,
+        'slug': document.slug,
+        'summary': document.summary,
+        'image': request.build_absolute_uri(settings.MEDIA_URL + document.image) if document.image else None,
+        'path': DOCUMENT_PATHS[document.kind].format(slug=document.slug),
+    }
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def site_search(request):
+    """
+    Products, categories, blog posts and tags matching ?q=, best first, from
+    the one search index table: ?type=product,post narrows the kinds,
+    ?cursor= pages, and `counts` gives the matches of every kind for tabs.
+    """
+    text = ' '.join(request.query_params.get('q', '').split())
+    kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind in SOURCES]
+    try:
+        page_size = min(max(int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+
+    if not text:
+        return Response({'results': [], 'counts': {}, 'next_cursor': None, 'previous_cursor': None, 'page_size': page_size})
+
+    matches = ranked_search(SearchDocument.objects.defer('search_title', 'search_text', 'search_vector'), text)
+    results = matches.filter(kind__in=kinds) if kinds else matches
+    page = KeysetPaginator(RELEVANCE_ORDERING, page_size).paginate(results, request.query_params.get('cursor'))
+    counts = dict(matches.order_by().values_list('kind').annotate(count=Count('id')))
+
+    return Response({
+        'results': [serialize_document(request, document) for document in page.object_list],
+        'counts': counts,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'page_size': page_size,
+    })
@@ -0,0 +1,102 @@
+import heapq
+import threading
+from bisect import bisect_left
+
+from blog.models import BlogPost
+from ecommerce.normalization import normalize_text
+
+from .cache import shared_generation
+from .models import Category, Product
+
+# Suggestions returned per type unless ?limit= asks for fewer
+AUTOCOMPLETE_LIMIT = 5
+
+# Prefixes up to this long match a large part of the catalog; their
+# suggestions are kept with the index, so the whole run is ranked only once.
+MEMOIZED_PREFIX_LENGTH = 2
+
+SUGGESTION_TYPES = ('products', 'categories', 'posts')
+
+_lock = threading.Lock()
+_index = (None, None)
+
+
+def suggestion_rows():
+    """(type, label, slug) for everything the search box can suggest."""
+    yield from (('products', name, slug) for name, slug in Product.objects.filter(available=True).values_list('name', 'slug'))
+    yield from (('categories', name, slug) for name, slug in Category.objects.values_list('name', 'slug'))
+    yield from (('posts', title, slug) for title, slug in BlogPost.objects.filter(is_published=True).values_list('title', 'slug'))
+
+
+class PrefixIndex:
+    """
+    Sorted list of every word-suffix of every label ("red running shoes",
+    "running shoes", "shoes"), so the labels with a word starting with a
+    prefix sit in one contiguous run found by binary search.
+    """
+
+    def __init__(self, rows):
+        entries = []
+        for kind, label, slug in rows:
+            words = normalize_text(label).split(' ')
+            for position in range(len(words)):
+                entries.append((' '.join(words[position:]), position, kind, label, slug))
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+        # (prefix, limit) -> suggestions, for short prefixes found in the index
+        self.memo = {}
+
+    def search(self, prefix, limit):
+        prefix = normalize_text(prefix)
+        if len(prefix) > MEMOIZED_PREFIX_LENGTH:
+            return self._search(prefix, limit)
+        suggestions = self.memo.get((prefix, limit))
+        if suggestions is None:
+            suggestions = self._search(prefix, limit)
+            # Only prefixes that match something, so the memo is bounded by
+            # the index rather than by what clients send
+            if any(suggestions.values()):
+                self.memo[prefix, limit] = suggestions
+        return suggestions
+
+    def _search(self, prefix, limit):
+        candidates = {kind: {} for kind in SUGGESTION_TYPES}
+        for index in range(bisect_left(self.keys, prefix), len(self.keys)):
+            key, position, kind, label, slug = self.entries[index]
+            if not key.startswith(prefix):
+                break
+            found = candidates[kind]
+            rank = (position > 0, len(label), label)
+            if slug not in found or rank < found[slug]:
+                found[slug] = rank
+
+        # Labels starting with the prefix first, then shorter (closer) labels
+        return {
+            kind: [
+                {'name': label, 'slug': slug}
+                for slug, (_, _, label) in heapq.nsmallest(limit, found.items(), key=lambda item: item[1])
+            ]
+            for kind, found in candidates.items()
+        }
+
+
+def get_index():
+    """
+    The process's PrefixIndex, rebuilt when a catalog or blog write in any
+    process has bumped the shared autocomplete generation since it was built.
+    """
+    global _index
+    version = shared_generation('autocomplete')
+    built_for, index = _index
+    if built_for != version:
+        with _lock:
+            built_for, index = _index
+            if built_for != version:
+                index = PrefixIndex(suggestion_rows())
+                _index = (version, index)
+    return index
+
+
+def suggest(prefix, limit=AUTOCOMPLETE_LIMIT):
+    return get_index().search(prefix, limit)
@@ -0,0 +1,131 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+# Models each cached endpoint's payload is built from. A write to any of them
+# invalidates that endpoint, and only that endpoint (see store.signals).
+ENDPOINT_DEPENDENCIES = {
+    'store_home': ('store.Category', 'store.Product'),
+    'category_list': ('store.Category',),
+    # ETag / Last-Modified validators for the storefront, see store.views
+    'catalog_state': ('store.Category', 'store.Product'),
+    # In-process prefix index behind the search box, see store.autocomplete
+    'autocomplete': ('store.Category', 'store.Product', 'blog.BlogPost'),
+    # Cached listing totals, see ecommerce.counting
+    'products_product_count': ('products.Product',),
+    'blog_post_count': ('blog.BlogPost',),
+}
+
+# Endpoints that are per-process indexes rather than cached payloads. Their
+# generation is kept in the database (see shared_generation), since the
+# catalog cache may be local to each process.
+SHARED_ENDPOINTS = ('autocomplete',)
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(endpoint):
+    return f'catalog:{endpoint}:generation'
+
+
+def _new_generation():
+    # Seeded from the clock rather than 1 so that if the counter is ever
+    # evicted, entries cached under an older generation cannot come back.
+    return time.time_ns()
+
+
+def _generation(endpoint):
+    return get_cache().get_or_set(_generation_key(endpoint), _new_generation, timeout=None)
+
+
+def cache_key(endpoint, params=None):
+    """
+    Cache key for an endpoint and its normalized parameters.
+
+    Keys embed the endpoint's generation number; invalidating an endpoint bumps
+    the generation so every cached variant of it is skipped at once, without
+    having to know which parameter combinations were cached.
+    """
+    params = urlencode(sorted((params or {}).items()))
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f'catalog:{endpoint}:{_generation(endpoint)}:{digest}'
+
+
+def cached_payload(endpoint, params, build):
+    """Return the cached payload for endpoint/params, building it on a miss."""
+    cache = get_cache()
+    key = cache_key(endpoint, params)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        # No TTL: entries live until a catalog write invalidates them.
+        cache.set(key, payload, timeout=None)
+    return payload
+
+
+def current_generation(endpoint):
+    return _generation(endpoint)
+
+
+def invalidate_endpoint(endpoint):
+    """Bump endpoint's generation; returns the new one."""
+    cache = get_cache()
+    key = _generation_key(endpoint)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _new_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def shared_generation(name):
+    """Generation of a per-process index, shared by every process."""
+    from .models import IndexGeneration
+
+    rows = IndexGeneration.objects.filter(name=name).values_list('generation', flat=True)
+    generation = rows.first()
+    if generation is None:
+        # Clock-seeded like the cached generations, so a counter row that is
+        # lost (or rolled back) does not repeat numbers indexes were built for
+        IndexGeneration.objects.bulk_create(
+            [IndexGeneration(name=name, generation=_new_generation())], ignore_conflicts=True
+        )
+        generation = rows.first()
+    return generation
+
+
+def bump_shared_generation(name):
+    """Count a write to a per-process index; returns the new generation."""
+    from .models import IndexGeneration
+
+    shared_generation(name)
+    IndexGeneration.objects.filter(name=name).update(generation=F('generation') + 1)
+    return shared_generation(name)
+
+
+def invalidate_on_commit(endpoints):
+    """Invalidate endpoints once the current transaction commits."""
+    def invalidate():
+        for endpoint in endpoints:
+            if endpoint in SHARED_ENDPOINTS:
+                bump_shared_generation(endpoint)
+            else:
+                invalidate_endpoint(endpoint)
+
+    # Bump after commit, otherwise a concurrent request could rebuild the entry
+    # from pre-commit rows under the new generation.
+    if endpoints:
+        transaction.on_commit(invalidate)
+
+
+def invalidate_model(label):
+    """Invalidate every endpoint built from the model `app_label.ModelName`."""
+    invalidate_on_commit([endpoint for endpoint, models in ENDPOINT_DEPENDENCIES.items() if label in models])
@@ -0,0 +1,131 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+
+from ecommerce.pagination import PRODUCT_ORDERINGS, KeysetPaginator, wants_cursor
+from ecommerce.projections import project, requested_fields
+from ecommerce.search import RELEVANCE_ORDERING
+
+from .facets import wants_facets
+from .search import fuzzy_search_products, search_products
+
+
+class CatalogQuery:
+    """
+    The parameters of a product listing, parsed and validated once.
+
+    Every catalog endpoint builds one of these from its request and gets the
+    filtered, joined and projected queryset, the ordering, the page size and
+    the normalized filters its cached totals are keyed on (filter_params),
+    instead of reading query params itself.
+
+    Invalid prices raise a 400; an unknown sort or page size falls back to the
+    default like the endpoints always did.
+    """
+    # Lookup used by ?category=<slug>
+    category_lookup = 'categories__slug'
+    # Forward relations the serializers render, joined up front
+    select_related = ()
+    orderings = PRODUCT_ORDERINGS
+    default_page_size = 32
+    max_page_size = 100
+    # Allowed page sizes, or None for any size up to max_page_size
+    page_sizes = None
+
+    def __init__(self, request, serializer_class=None):
+        params = request.query_params
+        self.search = ' '.join(params.get('search', '').split())
+        # Typo-tolerant matching; product_listing falls back to it when the
+        # exact search finds nothing and clients pass it on for later pages
+        self.fuzzy = bool(self.search) and params.get('fuzzy') in ('1', 'true')
+        self.category = params.get('category') or None
+        self.min_price = self._price(params, 'min_price')
+        self.max_price = self._price(params, 'max_price')
+
+        sort_by = params.get('sort_by')
+        if sort_by == 'relevance' and self.search or sort_by in self.orderings:
+            self.sort_by = sort_by
+        else:
+            # Best matches first when searching, alphabetical otherwise
+            self.sort_by = 'relevance' if self.search else 'name'
+
+        self.page_size = self._page_size(params.get('page_size', params.get('limit')))
+        self.cursor_mode = wants_cursor(request)
+        self.cursor = params.get('cursor')
+        try:
+            self.page = max(int(params.get('page', 1)), 1)
+        except ValueError:
+            self.page = 1
+
+        self.serializer_class = serializer_class
+        self.fields = requested_fields(request, serializer_class) if serializer_class else None
+        self.facets = wants_facets(request)
+
+    @staticmethod
+    def _price(params, name):
+        value = params.get(name)
+        if not value:
+            return None
+        try:
+            price = Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({name: 'Must be a number'})
+        if not price.is_finite():
+            raise ValidationError({name: 'Must be a number'})
+        return price
+
+    def _page_size(self, value):
+        try:
+            page_size = int(value)
+        except (TypeError, ValueError):
+            return self.default_page_size
+        if self.page_sizes is not None:
+            return page_size if page_size in self.page_sizes else self.default_page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    @property
+    def ordering(self):
+        if self.sort_by == 'relevance':
+            return RELEVANCE_ORDERING
+        return self.orderings[self.sort_by]
+
+    def filter(self, queryset):
+        """queryset narrowed by category, price and search; no ordering."""
+        if self.category:
+            queryset = queryset.filter(**{self.category_lookup: self.category})
+        if self.min_price is not None:
+            queryset = queryset.filter(price__gte=self.min_price)
+        if self.max_price is not None:
+            queryset = queryset.filter(price__lte=self.max_price)
+        if self.search:
+            # Last, so a search through the in-process index (store.textsearch)
+            # picks its best matches among rows the other filters let through
+            search = fuzzy_search_products if self.fuzzy else search_products
+            queryset = search(queryset, self.search)
+        return queryset
+
+    def build(self, queryset):
+        """
+        The filtered queryset, ordered, with the joins the serializer needs
+        and only the columns the requested fields read.
+        """
+        queryset = self.filter(queryset)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.serializer_class is not None:
+            queryset = project(queryset, self.serializer_class, self.fields)
+        return queryset.order_by(*self.ordering)
+
+    def paginate(self, queryset):
+        """Keyset page of the built queryset at the request's cursor."""
+        return KeysetPaginator(self.ordering, self.page_size).paginate(queryset, self.cursor)
+
+    def filter_params(self):
+        """Normalized filters: requests selecting the same rows compare equal."""
+        return {
+            'search': self.search.casefold(),
+            'fuzzy': int(self.fuzzy),
+            'category': self.category or '',
+            'min_price': '' if self.min_price is None else format(self.min_price.normalize(), 'f'),
+            'max_price': '' if self.max_price is None else format(self.max_price.normalize(), 'f'),
+        }
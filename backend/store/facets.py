@@ -0,0 +1,92 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+# Upper bound on requested histogram edges, to keep the aggregate small.
+MAX_PRICE_BUCKETS = 20
+
+
+def wants_facets(request):
+    return request.query_params.get('facets') in ('1', 'true')
+
+
+def price_edges(request):
+    """
+    Histogram bucket edges from ?price_buckets=0,100,500 or the
+    CATALOG_PRICE_BUCKETS setting. Invalid input falls back to the setting.
+    """
+    default = [Decimal(str(edge)) for edge in settings.CATALOG_PRICE_BUCKETS]
+    raw = request.query_params.get('price_buckets')
+    if not raw:
+        return default
+    try:
+        edges = [Decimal(edge) for edge in raw.split(',')]
+    except InvalidOperation:
+        return default
+    # NaN and Infinity parse, but cannot be ordered or bound a bucket
+    if not all(edge.is_finite() for edge in edges):
+        return default
+    if not edges or len(edges) > MAX_PRICE_BUCKETS or edges != sorted(set(edges)):
+        return default
+    return edges
+
+
+def facet_counts(queryset, categories, edges, category_field='categories', available_field='available'):
+    """
+    Category, availability and price-bucket counts for queryset.
+
+    Everything is computed by a single aggregate query of conditional
+    COUNT(DISTINCT id)s over the filtered rows; the distinct keeps products
+    in several categories from being counted once per category.
+    `categories` is a list of dicts with at least id, name and slug, e.g. the
+    cached category_list payload. With available_field=None there is no
+    availability facet, for listings of available products only.
+    """
+    # Counted over a fresh join: a ?category= filter on queryset has joined
+    # the categories already, and reusing that join would count only the
+    # filtered category.
+    products = queryset.model._default_manager.filter(pk__in=queryset.order_by().values('pk'))
+
+    aggregates = {}
+    if available_field is not None:
+        aggregates['facet_available'] = Count('id', distinct=True, filter=Q(**{available_field: True}))
+        aggregates['facet_unavailable'] = Count('id', distinct=True, filter=Q(**{available_field: False}))
+    for index, low in enumerate(edges):
+        condition = Q(price__gte=low)
+        if index + 1 < len(edges):
+            condition &= Q(price__lt=edges[index + 1])
+        aggregates[f'facet_price_{index}'] = Count('id', distinct=True, filter=condition)
+    for category in categories:
+        aggregates[f'facet_category_{category["id"]}'] = Count(
+            'id', distinct=True, filter=Q(**{category_field: category['id']})
+        )
+
+    counts = products.aggregate(**aggregates)
+
+    facets = {
+        'categories': [
+            {
+                'id': category['id'],
+                'name': category['name'],
+                'slug': category['slug'],
+                'count': counts[f'facet_category_{category["id"]}'],
+            }
+            for category in categories
+            if counts[f'facet_category_{category["id"]}']
+        ],
+        'price_histogram': [
+            {
+                'min': str(low),
+                'max': str(edges[index + 1]) if index + 1 < len(edges) else None,
+                'count': counts[f'facet_price_{index}'],
+            }
+            for index, low in enumerate(edges)
+        ],
+    }
+    if available_field is not None:
+        facets['availability'] = {
+            'available': counts['facet_available'],
+            'unavailable': counts['facet_unavailable'],
+        }
+    return facets
@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from ecommerce.textindex import InvertedIndex
+from store.models import Product
+from store.textsearch import INDEXED_FIELDS, MAX_HITS
+
+
+def _timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return result, timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare product search through the in-process inverted index '
+        '(store.textsearch) with the ORM icontains filter, over the current rows'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help='Search queries (default: words sampled from the catalog)')
+        parser.add_argument('--samples', type=int, default=20, help='Queries to sample when none are given')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query and path')
+
+    def handle(self, *args, queries, samples, repeat, **options):
+        fields = INDEXED_FIELDS['store.Product']
+        rows = list(Product.objects.values_list('pk', *(field for field, _ in fields)))
+        if not rows:
+            raise CommandError('There are no products to search')
+
+        start = time.perf_counter()
+        index = InvertedIndex()
+        for row in rows:
+            index.add(row[0], zip(row[1:], (weight for _, weight in fields)))
+        self.stdout.write(f'Indexed {len(rows)} products in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+        if not queries:
+            words = index.words()
+            queries = random.Random(0).sample(words, min(samples, len(words)))
+
+        # Listings only ever take the best MAX_HITS index matches, see store.textsearch
+        self.stdout.write(
+            f"{'query':<24}{'hits':>8}{'icontains p50/p95':>22}{'index p50/p95':>20}{f'top {MAX_HITS} p50':>16}"
+        )
+        for query in queries:
+            words = query.split()
+            condition = Q()
+            for word in words:
+                condition &= Q(name__icontains=word) | Q(description__icontains=word)
+            orm_hits, orm_p50, orm_p95 = _timed(
+                lambda: list(Product.objects.filter(condition).values_list('pk', flat=True)), repeat
+            )
+            index_hits, index_p50, index_p95 = _timed(lambda: index.search(query), repeat)
+            _, ranked_p50, _ = _timed(lambda: index.search(query, MAX_HITS), repeat)
+            self.stdout.write(
+                f'{query[:23]:<24}{len(index_hits):>8}'
+                f'{orm_p50 * 1e6:>10.0f}/{orm_p95 * 1e6:.0f}us'
+                f'{index_p50 * 1e6:>10.0f}/{index_p95 * 1e6:.0f}us'
+                f'{ranked_p50 * 1e6:>12.0f}us'
+                + ('' if len(orm_hits) == len(index_hits) else f'  (icontains: {len(orm_hits)} hits)')
+            )
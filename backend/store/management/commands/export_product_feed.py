@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.feeds import ProductFeed, parse_since
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Write the product feed (XML, CSV or NDJSON) to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='feed_format', choices=sorted(ProductFeed.content_types), default='xml')
+        parser.add_argument('--since', help='Only products changed since this ISO date or datetime')
+        parser.add_argument('--output', help='File to write; defaults to stdout')
+        parser.add_argument('--media-base-url', default='', help='Prefix for image links, e.g. https://api.example.com')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = parse_since(options['since'])
+            except ValueError as error:
+                raise CommandError(error)
+
+        feed = ProductFeed(Product.objects.all(), options['media_base_url'], since=since)
+        chunks = feed.stream(options['feed_format'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(chunks)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.images import generate_variants, registered_images
+
+
+class Command(BaseCommand):
+    help = 'Build missing or stale responsive variants for every registered image field'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that are already up to date')
+
+    def handle(self, *args, **options):
+        for model, field, variants_field in registered_images:
+            built = 0
+            rows = model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for pk, original, variants in rows.values_list('pk', field, variants_field).iterator():
+                if not options['force'] and (variants or {}).get('source') == original:
+                    continue
+                generate_variants(model, pk, field, variants_field, original)
+                built += 1
+            self.stdout.write(f'{model._meta.label}.{field}: {built} image(s) queued')
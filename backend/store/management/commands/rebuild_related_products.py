@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.related import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed related products of every product (or of the given ids).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        product_ids = options['product_ids'] or list(Product.objects.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(product_ids), batch_size):
+            rebuild_related_products(product_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt related products for {len(product_ids)} products'))
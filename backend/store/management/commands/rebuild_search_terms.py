@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Category, Product
+from store.spelling import rebuild_vocabulary
+
+
+class Command(BaseCommand):
+    help = 'Recount the "did you mean" search vocabulary from product and category text'
+
+    def handle(self, *args, **options):
+        rebuild_vocabulary([Product.objects.all(), Category.objects.all()])
+        self.stdout.write('Search vocabulary rebuilt')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import BlogPost, Tag
+from ecommerce.counters import refresh_counts
+from store.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute the Category.product_count and Tag.post_count counter caches'
+
+    def handle(self, *args, **options):
+        refresh_counts(Category, 'product_count', Product.categories.through, 'category')
+        refresh_counts(Tag, 'post_count', BlogPost.tags.through, 'tag')
+        self.stdout.write('Counters recomputed')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.sitemaps import update_sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Regenerate the sitemap shards whose products, categories or posts changed'
+
+    def handle(self, *args, **options):
+        written = update_sitemaps()
+        self.stdout.write(f'{len(written)} sitemap shard(s) updated')
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.2 on 2026-10-17 05:59
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# The GIN index and backfill only apply on PostgreSQL; other databases keep
+# the (unused) column and search falls back to icontains, see store.search.
+CREATE_INDEX = 'CREATE INDEX IF NOT EXISTS store_product_search_vector_idx ON store_product USING gin (search_vector)'
+DROP_INDEX = 'DROP INDEX IF EXISTS store_product_search_vector_idx'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # store.search.weighted_search_vector() as of this migration
+    Product = apps.get_model('store', 'Product')
+    Product.objects.update(
+        search_vector=SearchVector('name', weight='A', config='simple')
+        + SearchVector('description', weight='B', config='simple')
+    )
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_product_store_product_name_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
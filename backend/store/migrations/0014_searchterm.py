@@ -0,0 +1,57 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:19
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+
+# Trigram index answering the `%` similarity lookups of store.spelling
+CREATE_INDEX = 'CREATE INDEX IF NOT EXISTS store_searchterm_term_trgm_idx ON store_searchterm USING gin (term gin_trgm_ops)'
+DROP_INDEX = 'DROP INDEX IF EXISTS store_searchterm_term_trgm_idx'
+
+# store.spelling.document_terms as of this migration. search_text is stored
+# normalized already, so splitting it into words is all that is left.
+TERM_RE = re.compile(r'\w+')
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = 100
+
+
+def document_terms(text):
+    return {term for term in TERM_RE.findall(text or '') if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH}
+
+
+def fill_and_index(apps, schema_editor):
+    SearchTerm = apps.get_model('store', 'SearchTerm')
+    frequencies = Counter()
+    for model in ('Category', 'Product'):
+        for text in apps.get_model('store', model).objects.values_list('search_text', flat=True).iterator():
+            frequencies.update(document_terms(text))
+    SearchTerm.objects.bulk_create(
+        (SearchTerm(term=term, frequency=count) for term, count in frequencies.items()), batch_size=1000
+    )
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_category_search_text_product_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, unique=True)),
+                ('frequency', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_and_index, drop_index),
+    ]
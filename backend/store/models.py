@@ -1,16 +1,30 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.text import slugify
 from django.urls import reverse
 import uuid
 
+from ecommerce.normalization import refresh_search_text
+from ecommerce.search import update_search_vector
+
+from .search import PRODUCT_SEARCH_WEIGHTS
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories', blank=True, null=True)
+    # Resized copies of image, filled in by ecommerce.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Number of products in the category, kept exact by store.signals
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    # normalize_text() of SEARCH_TEXT_FIELDS, trigram-indexed on PostgreSQL
+    search_text = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    SEARCH_TEXT_FIELDS = ('name', 'description')
+
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ('name',)
@@ -21,11 +35,23 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        refresh_search_text(self, self.SEARCH_TEXT_FIELDS, kwargs)
         super().save(*args, **kwargs)
     
     def get_absolute_url(self):
         return reverse('category_detail', args=[self.slug])
 
+class ProductQuerySet(models.QuerySet):
+    def with_categories(self):
+        # Serializers read product.categories for every row, so fetch them
+        # for the whole page in one extra query instead of one per product.
+        return self.prefetch_related('categories')
+
+    def catalog(self):
+        """Available products, ready to be serialized for storefront listings."""
+        # The search columns are only ever read by the database; don't ship them back.
+        return self.filter(available=True).with_categories().defer('search_vector', 'search_text')
+
 class Product(models.Model):
     # ManyToManyField for multiple categories
     categories = models.ManyToManyField(Category, related_name='products', blank=True)
@@ -35,17 +61,41 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='products', blank=True, null=True)
+    # Resized copies of image, filled in by ecommerce.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     stock = models.PositiveIntegerField(default=0)
     available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted name/description tsvector kept current by save(); GIN-indexed
+    # on PostgreSQL (see migration 0009). Queried through store.search.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # normalize_text() of SEARCH_TEXT_FIELDS, trigram-indexed on PostgreSQL
+    search_text = models.TextField(blank=True, default='', editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    SEARCH_TEXT_FIELDS = ('name', 'description')
 
     class Meta:
         ordering = ('name',)
+        indexes = [
+            # Cursor pagination seeks on (sort column, id), see ecommerce.pagination
+            models.Index(fields=['name', 'id'], name='store_product_name_id_idx'),
+            models.Index(fields=['price', 'id'], name='store_product_price_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='store_product_created_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored availability so signals can tell when it changes
+        instance._loaded_available = instance.__dict__.get('available')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug and self.name:  # If slug is empty but name exists
             self.slug = slugify(self.name)
@@ -55,10 +105,64 @@ class Product(models.Model):
             # Generate a random string or use the product ID
             self.slug = str(uuid.uuid4())[:8]
         
+        refresh_search_text(self, self.SEARCH_TEXT_FIELDS, kwargs)
         super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        searchable = {field for field, _ in PRODUCT_SEARCH_WEIGHTS}
+        if update_fields is None or searchable.intersection(update_fields):
+            update_search_vector(Product.objects.filter(pk=self.pk), PRODUCT_SEARCH_WEIGHTS)
     
     def get_absolute_url(self):
         primary_category = self.categories.first()
         if primary_category:
             return reverse('product_detail', args=[primary_category.slug, self.slug])
         return reverse('product_detail_no_category', args=[self.slug])
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed "related products" for a product page, maintained by
+    store.related so that reading them is one indexed lookup.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_from')
+    # Shared category count plus a recency bonus below 1, see store.related
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ('-score',)
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='store_relatedproduct_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-score'], name='store_related_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} -> {self.related}"
+
+class SearchTerm(models.Model):
+    """
+    Vocabulary of the normalized words in product and category search text,
+    with how many of them contain each word. Kept current by store.signals
+    and used for "did you mean" suggestions, see store.spelling.
+    """
+    term = models.CharField(max_length=100, unique=True)
+    frequency = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.term
+
+
+class IndexGeneration(models.Model):
+    """
+    Write counter of a search index each process builds in memory (see
+    store.textsearch, store.autocomplete). It lives in the database, not the
+    catalog cache, so a write handled by one worker reaches every other
+    worker's copy whatever cache backend is configured.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    generation = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.generation}'
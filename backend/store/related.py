@@ -0,0 +1,159 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product, RelatedProduct
+
+# How many related products are kept per product; product pages show four.
+RELATED_PRODUCTS_LIMIT = 8
+
+# Age in days at which the recency bonus has halved.
+RECENCY_HALF_LIFE_DAYS = 30
+
+
+def recency_bonus(created_at, now):
+    """
+    A bonus in (0, 1] that favours newer products. Being below 1 it only
+    breaks ties between candidates sharing the same number of categories,
+    and since it decreases with age the relative order it gives never changes.
+    """
+    age_days = max((now - created_at).total_seconds(), 0) / 86400
+    return 1 / (1 + age_days / RECENCY_HALF_LIFE_DAYS)
+
+
+def products_in_categories(category_ids):
+    if not category_ids:
+        return set()
+    return set(
+        Product.categories.through.objects
+        .filter(category_id__in=category_ids)
+        .values_list('product_id', flat=True)
+    )
+
+
+def rebuild_related_products(product_ids):
+    """
+    Recompute the RelatedProduct rows of product_ids.
+
+    Runs a fixed number of queries however many products are rebuilt: one for
+    their category memberships, one for the available products in those
+    categories, then a delete and a bulk insert.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    Membership = Product.categories.through
+    categories_of = defaultdict(set)
+    for product_id, category_id in Membership.objects.filter(
+        product_id__in=product_ids
+    ).values_list('product_id', 'category_id'):
+        categories_of[product_id].add(category_id)
+
+    all_categories = set().union(*categories_of.values()) if categories_of else set()
+    members_of = defaultdict(list)
+    created = {}
+    for product_id, category_id, created_at in Membership.objects.filter(
+        category_id__in=all_categories, product__available=True
+    ).values_list('product_id', 'category_id', 'product__created_at'):
+        members_of[category_id].append(product_id)
+        created[product_id] = created_at
+
+    now = timezone.now()
+    rows = []
+    for product_id in product_ids:
+        overlap = Counter(
+            candidate
+            for category_id in categories_of.get(product_id, ())
+            for candidate in members_of[category_id]
+            if candidate != product_id
+        )
+        scored = sorted(
+            ((shared + recency_bonus(created[candidate], now), candidate) for candidate, shared in overlap.items()),
+            reverse=True,
+        )
+        rows += [
+            RelatedProduct(product_id=product_id, related_id=candidate, score=score)
+            for score, candidate in scored[:RELATED_PRODUCTS_LIMIT]
+        ]
+
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+        RelatedProduct.objects.bulk_create(rows)
+
+
+def refresh_related_products(product_ids):
+    """
+    Update the related lists after the categories or availability of
+    product_ids changed, without rebuilding every list of their categories:
+    each changed product's own list is recomputed and its entry in the lists
+    of its neighbours inserted, rescored or removed (see _refresh).
+    """
+    for product_id in set(product_ids):
+        _refresh(product_id)
+
+
+def _refresh(product_id):
+    product = Product.objects.filter(pk=product_id).values('available', 'created_at').first()
+    if product is None:
+        return
+
+    Membership = Product.categories.through
+    category_ids = Membership.objects.filter(product_id=product_id).values('category_id')
+    # Neighbour -> categories it shares with the product
+    shared = Counter(
+        Membership.objects.filter(category_id__in=category_ids)
+        .exclude(product_id=product_id)
+        .values_list('product_id', flat=True)
+    )
+    # Lists still holding the product after it left their categories
+    neighbours = set(shared) | set(
+        RelatedProduct.objects.filter(related_id=product_id).values_list('product_id', flat=True)
+    )
+    lists = defaultdict(dict)
+    for row_id, owner, related, score in RelatedProduct.objects.filter(
+        product_id__in=neighbours
+    ).values_list('id', 'product_id', 'related_id', 'score'):
+        lists[owner][related] = (score, row_id)
+
+    bonus = recency_bonus(product['created_at'], timezone.now())
+    stale, added, rebuild = [], [], {product_id}
+    for neighbour in neighbours:
+        entries = lists[neighbour]
+        score = shared[neighbour] + bonus if product['available'] and shared[neighbour] else None
+        current = entries.pop(product_id, None)
+        if current is not None:
+            if (score is None or score < current[0]) and len(entries) + 1 >= RELATED_PRODUCTS_LIMIT:
+                # A full list losing ground may let in a product it does not
+                # hold, which only a rebuild of that one list can find
+                rebuild.add(neighbour)
+                continue
+            stale.append(current[1])
+        if score is None:
+            continue
+        if len(entries) >= RELATED_PRODUCTS_LIMIT:
+            lowest_score, lowest_id = min(entries.values())
+            if score <= lowest_score:
+                continue
+            stale.append(lowest_id)
+        added.append(RelatedProduct(product_id=neighbour, related_id=product_id, score=score))
+
+    with transaction.atomic():
+        RelatedProduct.objects.filter(id__in=stale).delete()
+        RelatedProduct.objects.bulk_create(added)
+        rebuild_related_products(rebuild)
+
+
+def schedule_refresh(product_ids):
+    """Refresh related products for product_ids once the transaction commits."""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: refresh_related_products(product_ids))
+
+
+def schedule_rebuild(product_ids):
+    """Rebuild related products for product_ids once the transaction commits."""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: rebuild_related_products(product_ids))
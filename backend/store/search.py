@@ -0,0 +1,34 @@
+from ecommerce.search import fuzzy_search, ranked_search
+
+# Field weights for the stored product search vector: name matches outrank
+# description matches.
+PRODUCT_SEARCH_WEIGHTS = (('name', 'A'), ('description', 'B'))
+
+
+def _uses_text_index(queryset):
+    # store.textsearch imports this module (and the models) itself
+    from .textsearch import uses_text_index
+    return uses_text_index(queryset)
+
+
+def _index_search(queryset, text):
+    from .textsearch import index_search
+    return index_search(queryset, text)
+
+
+def search_products(queryset, text):
+    """
+    Filter a product queryset to rows matching text and annotate an integer
+    `rank`, see ecommerce.search.ranked_search.
+
+    With CATALOG_SEARCH_BACKEND = 'memory' the models store.textsearch
+    indexes are searched in-process instead.
+    """
+    if _uses_text_index(queryset):
+        return _index_search(queryset, text)
+    return ranked_search(queryset, text)
+
+
+def fuzzy_search_products(queryset, text):
+    """Typo-tolerant fallback for search_products, see ecommerce.search.fuzzy_search."""
+    return fuzzy_search(queryset, text)
@@ -1,25 +1,59 @@
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
+from ecommerce.images import ImageSrcsetField
+from ecommerce.projections import SparseFieldsetMixin, model_sources
 from .models import Category, Product
 
 class CategorySerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image_variants')
+    
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'description', 'image']
+        fields = ['id', 'name', 'slug', 'description', 'image', 'image_srcset']
+
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Fetch categories for the whole page at once; this is a no-op when the
+        # queryset already came from Product.objects.catalog()/with_categories().
+        products = list(data.all() if hasattr(data, 'all') else data)
+        if 'categories' in model_sources(self.child):
+            prefetch_related_objects(products, 'categories')
+        return super().to_representation(products)
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category_names = serializers.SerializerMethodField()
     category_slugs = serializers.SerializerMethodField()
+    image_srcset = ImageSrcsetField(source='image_variants')
     
     class Meta:
         model = Product
+        list_serializer_class = ProductListSerializer
         fields = [
-            'id', 'name', 'slug', 'description', 'price', 'image', 
+            'id', 'name', 'slug', 'description', 'price', 'image', 'image_srcset',
             'stock', 'available', 'categories', 'category_names', 'category_slugs',
             'created_at', 'updated_at'
         ]
+        field_sources = {
+            'category_names': ('categories',),
+            'category_slugs': ('categories',),
+        }
+        # Named field sets for ?view=; "card" is what a product grid tile shows
+        projections = {
+            'card': [
+                'id', 'name', 'slug', 'price', 'image', 'image_srcset',
+                'available', 'category_slugs'
+            ],
+        }
+    
+    def to_representation(self, instance):
+        # categories, category_names and category_slugs all read the same
+        # prefetched rows instead of issuing a query each.
+        if 'categories' in model_sources(self):
+            prefetch_related_objects([instance], 'categories')
+        return super().to_representation(instance)
     
     def get_category_names(self, obj):
         return [category.name for category in obj.categories.all()]
     
     def get_category_slugs(self, obj):
-        return [category.slug for category in obj.categories.all()] 
\ No newline at end of file
+        return [category.slug for category in obj.categories.all()] 
@@ -0,0 +1,154 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from ecommerce.counters import refresh_counts
+from ecommerce.images import image_variants_ready, register_variants
+
+from .cache import invalidate_model
+from .models import Category, Product, RelatedProduct
+from .related import products_in_categories, schedule_rebuild, schedule_refresh
+from .spelling import apply_term_changes, document_terms
+from .textsearch import connect_signals as connect_text_index_signals
+
+register_variants(Category, 'image', 'image_variants')
+register_variants(Product, 'image', 'image_variants')
+
+@receiver(image_variants_ready, sender=Category)
+@receiver(image_variants_ready, sender=Product)
+def invalidate_image_variant_payloads(sender, **kwargs):
+    # Variants are stored with a queryset update, which sends no post_save.
+    invalidate_model(sender._meta.label)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_payloads(sender, instance, **kwargs):
+    invalidate_model('store.Category')
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_payloads(sender, instance, **kwargs):
+    invalidate_model('store.Product')
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def invalidate_product_categories(sender, instance, action, **kwargs):
+    # Product payloads embed category names and slugs.
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_model('store.Product')
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def touch_products_on_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Membership is part of a product's payload; move updated_at so that its
+    # ETag / Last-Modified change with it.
+    if action in ('post_add', 'post_remove'):
+        product_ids = pk_set if reverse else {instance.pk}
+    elif action == 'pre_clear':
+        product_ids = products_in_categories({instance.pk}) if reverse else {instance.pk}
+    else:
+        return
+    Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+
+# Related products: refresh the changed products' lists and their entries in
+# their neighbours' lists (see store.related.refresh_related_products).
+
+@receiver(post_save, sender=Product)
+def refresh_related_on_availability(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_available', None)
+    if not created and loaded is not None and loaded != instance.available:
+        schedule_refresh({instance.pk})
+    instance._loaded_available = instance.available
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def refresh_related_on_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        # With reverse, instance is a Category and pk_set the products
+        schedule_refresh(pk_set if reverse else {instance.pk})
+    elif action == 'pre_clear':
+        # The memberships are gone by post_clear
+        instance._cleared_related_ids = products_in_categories({instance.pk}) if reverse else {instance.pk}
+    elif action == 'post_clear':
+        schedule_refresh(instance.__dict__.pop('_cleared_related_ids', set()))
+
+@receiver(pre_delete, sender=Product)
+def rebuild_related_on_product_delete(sender, instance, **kwargs):
+    # Its rows cascade away; the lists that held it have a free place
+    schedule_rebuild(RelatedProduct.objects.filter(related=instance).values_list('product_id', flat=True))
+
+@receiver(pre_delete, sender=Category)
+def rebuild_related_on_category_delete(sender, instance, **kwargs):
+    schedule_rebuild(products_in_categories({instance.pk}))
+
+# Category.product_count counter cache
+
+def refresh_product_counts(category_ids):
+    refresh_counts(Category, 'product_count', Product.categories.through, 'category', category_ids)
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def count_products_on_category_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        refresh_product_counts({instance.pk} if reverse else pk_set)
+    elif action == 'pre_clear':
+        # The memberships are gone by post_clear
+        instance._cleared_category_ids = {instance.pk} if reverse else set(
+            instance.categories.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        refresh_product_counts(instance.__dict__.pop('_cleared_category_ids', set()))
+
+@receiver(pre_delete, sender=Product)
+def remember_deleted_product_categories(sender, instance, **kwargs):
+    # Deleting a product removes its memberships without an m2m_changed
+    instance._deleted_category_ids = set(instance.categories.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Product)
+def count_products_on_delete(sender, instance, **kwargs):
+    refresh_product_counts(instance.__dict__.pop('_deleted_category_ids', set()))
+
+# Search vocabulary (store.spelling): count the words each saved or deleted
+# row adds to or removes from the catalog text.
+
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=Product)
+def remember_stored_search_text(sender, instance, **kwargs):
+    # save() refreshes search_text before pre_save, so keep the value the row
+    # was loaded with (absent when the field was deferred)
+    instance._stored_search_text = instance.__dict__.get('search_text')
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Product)
+def remember_search_terms(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'search_text' not in update_fields:
+        return
+    if instance._state.adding and instance.pk is None:
+        old = ''
+    elif not instance._state.adding and instance._stored_search_text is not None:
+        old = instance._stored_search_text
+    else:
+        # Deferred search_text, or a new instance given an existing pk
+        old = sender._default_manager.filter(pk=instance.pk).values_list('search_text', flat=True).first()
+    instance._old_search_terms = document_terms(old)
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+def count_search_terms_on_save(sender, instance, **kwargs):
+    old = instance.__dict__.pop('_old_search_terms', None)
+    if old is not None:
+        new = document_terms(instance.search_text)
+        apply_term_changes(new - old, old - new)
+        instance._stored_search_text = instance.search_text
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Product)
+def remember_deleted_search_terms(sender, instance, **kwargs):
+    # Listings defer search_text; reading it would be one query either way
+    instance._deleted_search_terms = document_terms(instance.search_text)
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def count_search_terms_on_delete(sender, instance, **kwargs):
+    apply_term_changes((), instance.__dict__.pop('_deleted_search_terms', set()))
+
+# In-process inverted index (store.textsearch) of store, products and blog
+# text, kept current when it is the search backend
+
+connect_text_index_signals()
@@ -0,0 +1,85 @@
+from collections import Counter
+from difflib import get_close_matches
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections, transaction
+from django.db.models import F
+
+from .models import SearchTerm
+from ecommerce.search import search_terms
+
+# Words shorter than this are neither stored nor corrected
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+# difflib similarity needed for a suggestion where pg_trgm is unavailable
+FALLBACK_CUTOFF = 0.75
+
+
+def document_terms(text):
+    """The distinct vocabulary words of a row's search_text."""
+    return {term for term in search_terms(text or '') if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH}
+
+
+def apply_term_changes(added, removed):
+    """Count rows gaining `added` and losing `removed` words, after commit."""
+    added, removed = set(added), set(removed)
+    if not added and not removed:
+        return
+
+    def apply():
+        if added:
+            SearchTerm.objects.bulk_create([SearchTerm(term=term) for term in added], ignore_conflicts=True)
+            SearchTerm.objects.filter(term__in=added).update(frequency=F('frequency') + 1)
+        if removed:
+            SearchTerm.objects.filter(term__in=removed, frequency__gt=0).update(frequency=F('frequency') - 1)
+
+    transaction.on_commit(apply)
+
+
+def rebuild_vocabulary(querysets, batch_size=1000):
+    """Recount the whole vocabulary from the search_text of querysets."""
+    frequencies = Counter()
+    for queryset in querysets:
+        for text in queryset.values_list('search_text', flat=True).iterator(chunk_size=batch_size):
+            frequencies.update(document_terms(text))
+
+    with transaction.atomic():
+        SearchTerm.objects.all().delete()
+        SearchTerm.objects.bulk_create(
+            (SearchTerm(term=term, frequency=count) for term, count in frequencies.items()),
+            batch_size=batch_size,
+        )
+
+
+def closest_term(term):
+    """The known word most similar to term, or None."""
+    known = SearchTerm.objects.filter(frequency__gt=0)
+    if connections[known.db].vendor == 'postgresql':
+        # `%` is answered by the trigram index on term (migration 0014)
+        return (
+            known.filter(term__trigram_similar=term)
+            .annotate(similarity=TrigramSimilarity('term', term))
+            .order_by('-similarity', '-frequency')
+            .values_list('term', flat=True)
+            .first()
+        )
+    candidates = known.filter(term__startswith=term[0]).values_list('term', flat=True)
+    matches = get_close_matches(term, list(candidates), n=1, cutoff=FALLBACK_CUTOFF)
+    return matches[0] if matches else None
+
+
+def did_you_mean(text):
+    """
+    text with each unknown word replaced by the closest known one, or None
+    when every word is known or nothing close enough exists.
+    """
+    terms = search_terms(text)
+    known = set(SearchTerm.objects.filter(term__in=terms, frequency__gt=0).values_list('term', flat=True))
+    corrected = []
+    for term in terms:
+        if term in known or len(term) < MIN_TERM_LENGTH:
+            corrected.append(term)
+        else:
+            corrected.append(closest_term(term) or term)
+    return ' '.join(corrected) if corrected != terms else None
@@ -1,3 +1,855 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from blog.models import BlogPost, Tag
+from ecommerce.images import render_variants
+from ecommerce.normalization import normalize_text
+from ecommerce.sitemaps import update_sitemaps
+from ecommerce.textindex import InvertedIndex
+from .cache import bump_shared_generation, get_cache
+from .catalog import CatalogQuery
+from .models import Category, Product, SearchTerm
+from .related import rebuild_related_products
+from .serializers import ProductSerializer
+from .views import cached_categories, catalog_state
+
+
+class CatalogQueryCountTests(TestCase):
+    """Listing a page of products must not cost extra queries per product."""
+
+    page_size = 32
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [
+            Category.objects.create(name=f'Category {i}', slug=f'category-{i}')
+            for i in range(4)
+        ]
+        for i in range(cls.page_size):
+            product = Product.objects.create(
+                name=f'Product {i:02d}',
+                slug=f'product-{i:02d}',
+                price=Decimal('10.00') + i,
+                stock=5,
+            )
+            product.categories.set(categories[i % 4:i % 4 + 2])
+        cls.category = categories[1]
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        # Warm the ETag state so only the listing itself is counted.
+        catalog_state(None)
+
+    def test_catalog_queryset_serializes_page_in_two_queries(self):
+        # One query for the products, one for all of their categories.
+        with self.assertNumQueries(2):
+            data = ProductSerializer(Product.objects.catalog(), many=True).data
+        self.assertEqual(len(data), self.page_size)
+        self.assertEqual(len(data[0]['category_names']), 2)
+
+    def test_serializer_batches_categories_without_prefetch(self):
+        with self.assertNumQueries(2):
+            data = ProductSerializer(Product.objects.all(), many=True).data
+        self.assertEqual(len(data), self.page_size)
+
+    def test_single_product_reads_categories_once(self):
+        product = Product.objects.get(slug='product-00')
+        with self.assertNumQueries(1):
+            data = ProductSerializer(product).data
+        self.assertEqual(data['category_slugs'], ['category-0', 'category-1'])
+
+    def test_product_list_view_query_count(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/store/products/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_detail_view_query_count(self):
+        # Category lookup, its products, and their categories.
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/store/categories/{self.category.slug}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['products']), 16)
+
+    def test_store_home_query_count(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/store/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['featured_products']), 8)
+
+
+class ProductCursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated prices force the id tie-breaker to keep pages disjoint.
+        for i in range(10):
+            Product.objects.create(
+                name=f'Product {i}', slug=f'product-{i}', price=Decimal(10 + i % 3)
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def walk(self, sort_by):
+        slugs, pages, cursor = [], [], None
+        while True:
+            params = {'sort_by': sort_by, 'page_size': 3}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/store/products/', params)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            slugs += [product['slug'] for product in response.data['products']]
+            cursor = response.data['next_cursor']
+            if not cursor:
+                return slugs, pages
+
+    def test_walks_every_product_once_in_each_ordering(self):
+        for sort_by, ordering in [
+            ('name', ('name', 'id')),
+            ('price_low_high', ('price', 'id')),
+            ('price_high_low', ('-price', '-id')),
+            ('newest', ('-created_at', '-id')),
+        ]:
+            slugs, pages = self.walk(sort_by)
+            expected = list(Product.objects.order_by(*ordering).values_list('slug', flat=True))
+            self.assertEqual(slugs, expected, sort_by)
+            self.assertEqual(len(pages), 4)
+            self.assertIsNone(pages[0]['previous_cursor'])
+
+    def test_previous_cursor_returns_previous_page(self):
+        _, pages = self.walk('price_low_high')
+        response = self.client.get('/api/store/products/', {
+            'sort_by': 'price_low_high', 'page_size': 3, 'cursor': pages[2]['previous_cursor'],
+        })
+        self.assertEqual(response.data['products'], pages[1]['products'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/store/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        self.category = Category.objects.create(name='Shoes', slug='shoes')
+        self.product = Product.objects.create(name='Boot', slug='boot', price=Decimal('50.00'))
+
+    def test_store_home_is_served_from_cache(self):
+        first = self.client.get('/api/store/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/store/')
+        self.assertEqual(first.data, second.data)
+
+    def test_product_write_invalidates_store_home_only(self):
+        self.client.get('/api/store/')
+        self.client.get('/api/store/categories/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Winter Boot'
+            self.product.save()
+        # Only the ETag state is recomputed; the category payload stays cached.
+        with self.assertNumQueries(2):
+            self.client.get('/api/store/categories/')
+        response = self.client.get('/api/store/')
+        self.assertEqual(response.data['featured_products'][0]['name'], 'Winter Boot')
+
+    def test_category_changes_invalidate_dependent_payloads(self):
+        self.client.get('/api/store/')
+        self.client.get('/api/store/categories/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.categories.add(self.category)
+        response = self.client.get('/api/store/')
+        self.assertEqual(response.data['featured_products'][0]['category_slugs'], ['shoes'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        response = self.client.get('/api/store/categories/')
+        self.assertEqual(response.data, [])
+
+
+class RelatedProductTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.shoes = Category.objects.create(name='Shoes', slug='shoes')
+        self.winter = Category.objects.create(name='Winter', slug='winter')
+        self.products = {}
+        with self.captureOnCommitCallbacks(execute=True):
+            for slug, categories in [
+                ('boot', [self.shoes, self.winter]),
+                ('snow-boot', [self.shoes, self.winter]),
+                ('sandal', [self.shoes]),
+                ('scarf', [self.winter]),
+                ('hat', []),
+            ]:
+                product = Product.objects.create(name=slug, slug=slug, price=Decimal('10.00'))
+                product.categories.set(categories)
+                self.products[slug] = product
+
+    def related_slugs(self, slug):
+        product = Product.objects.get(slug=slug)
+        return list(
+            Product.objects.filter(related_from__product=product)
+            .order_by('-related_from__score').values_list('slug', flat=True)
+        )
+
+    def test_ranked_by_category_overlap(self):
+        self.assertEqual(self.related_slugs('boot')[0], 'snow-boot')
+        self.assertEqual(set(self.related_slugs('boot')), {'snow-boot', 'sandal', 'scarf'})
+        self.assertEqual(self.related_slugs('hat'), [])
+
+    def test_unavailable_products_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sandal = Product.objects.get(slug='sandal')
+            sandal.available = False
+            sandal.save()
+        self.assertNotIn('sandal', self.related_slugs('boot'))
+        self.assertNotIn('sandal', self.related_slugs('snow-boot'))
+
+    def test_category_changes_update_both_sides(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products['hat'].categories.add(self.winter)
+        self.assertIn('hat', self.related_slugs('scarf'))
+        self.assertEqual(set(self.related_slugs('hat')), {'boot', 'snow-boot', 'scarf'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.winter.products.clear()
+        self.assertEqual(self.related_slugs('scarf'), [])
+        # Equal overlap now, so the newer product ranks first
+        self.assertEqual(self.related_slugs('boot'), ['sandal', 'snow-boot'])
+
+    def test_category_changes_rebuild_only_the_changed_list(self):
+        with mock.patch('store.related.rebuild_related_products', wraps=rebuild_related_products) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.products['hat'].categories.add(self.shoes)
+        rebuild.assert_called_once_with({self.products['hat'].pk})
+        self.assertIn('hat', self.related_slugs('sandal'))
+
+    def test_refreshed_lists_match_a_full_rebuild(self):
+        # Days apart, so the recency bonus orders ties the same in both
+        for days, product in enumerate(self.products.values()):
+            Product.objects.filter(pk=product.pk).update(created_at=timezone.now() - timedelta(days=days))
+
+        def lists():
+            return {slug: self.related_slugs(slug) for slug in self.products}
+
+        # Short lists, so that some are full and have to drop entries
+        with mock.patch('store.related.RELATED_PRODUCTS_LIMIT', 2):
+            rebuild_related_products([product.pk for product in self.products.values()])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.products['scarf'].categories.add(self.shoes)
+                self.products['boot'].categories.remove(self.winter)
+                self.products['snow-boot'].available = False
+                self.products['snow-boot'].save()
+            refreshed = lists()
+            rebuild_related_products([product.pk for product in self.products.values()])
+            self.assertEqual(refreshed, lists())
+
+
+class ProductFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        shoes = Category.objects.create(name='Shoes', slug='shoes')
+        winter = Category.objects.create(name='Winter', slug='winter')
+        Category.objects.create(name='Empty', slug='empty')
+        for slug, price, categories in [
+            ('boot', '120', [shoes, winter]),
+            ('sandal', '40', [shoes]),
+            ('scarf', '15', [winter]),
+            ('hat', '600', []),
+        ]:
+            product = Product.objects.create(name=slug, slug=slug, price=Decimal(price))
+            product.categories.set(categories)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_facets_in_one_aggregate_query(self):
+        client = APIClient()
+        # Warm the cached validators and the category list facets label from
+        catalog_state(None)
+        cached_categories()
+        # Page, page categories, then a single aggregate for all facets.
+        with self.assertNumQueries(3):
+            response = client.get('/api/store/products/', {
+                'facets': '1', 'price_buckets': '0,50,500',
+            })
+        facets = response.data['facets']
+        self.assertEqual(
+            [(c['slug'], c['count']) for c in facets['categories']],
+            [('shoes', 2), ('winter', 2)],
+        )
+        self.assertNotIn('availability', facets)
+        self.assertEqual(
+            [(bucket['min'], bucket['max'], bucket['count']) for bucket in facets['price_histogram']],
+            [('0', '50', 2), ('50', '500', 1), ('500', None, 1)],
+        )
+
+    def test_category_filter_keeps_the_other_categories_counts(self):
+        sale = Category.objects.create(name='Sale', slug='sale')
+        for product in Product.objects.filter(slug__in=['boot', 'sandal']):
+            product.categories.add(sale)
+        response = APIClient().get('/api/store/products/', {'category': 'shoes', 'facets': '1'})
+        self.assertEqual(
+            [(c['slug'], c['count']) for c in response.data['facets']['categories']],
+            [('sale', 2), ('shoes', 2), ('winter', 1)],
+        )
+
+    def test_non_finite_price_edges_fall_back_to_the_default(self):
+        for edges in ('0,NaN', 'Infinity', '-inf,0'):
+            response = APIClient().get('/api/store/products/', {'facets': '1', 'price_buckets': edges})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['facets']['price_histogram']), len(settings.CATALOG_PRICE_BUCKETS))
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        self.product = Product.objects.create(name='Boot', slug='boot', price=Decimal('50.00'))
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        response = self.client.get('/api/store/products/by-slug/boot/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/store/products/by-slug/boot/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_changes_change_the_etag(self):
+        etag = self.client.get('/api/store/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.categories.add(Category.objects.create(name='Shoes', slug='shoes'))
+        response = self.client.get('/api/store/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def jpeg(self, width, height):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def test_variants_are_downscaled_and_stripped(self):
+        rendered = render_variants(self.jpeg(800, 400), [320, 640, 1024])
+
+        self.assertEqual(sorted(rendered), [(320, 'jpg'), (320, 'webp'), (640, 'jpg'), (640, 'webp')])
+        with Image.open(io.BytesIO(rendered[(320, 'jpg')])) as image:
+            self.assertEqual(image.size, (320, 160))
+            self.assertFalse(image.getexif())
+
+    def test_transparency_is_kept_in_webp_only(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (800, 400), (255, 0, 0, 0)).save(buffer, 'PNG')
+        rendered = render_variants(buffer.getvalue(), [320])
+
+        with Image.open(io.BytesIO(rendered[(320, 'webp')])) as image:
+            self.assertEqual(image.mode, 'RGBA')
+            self.assertEqual(image.getpixel((0, 0))[3], 0)
+        with Image.open(io.BytesIO(rendered[(320, 'jpg')])) as image:
+            self.assertEqual(image.mode, 'RGB')
+            self.assertTrue(all(channel > 245 for channel in image.getpixel((0, 0))))
+
+    def test_upload_builds_srcset(self):
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_VARIANT_WORKERS=0, IMAGE_VARIANT_WIDTHS=[320, 640]):
+            with self.captureOnCommitCallbacks(execute=True):
+                product = Product.objects.create(
+                    name='Lamp', slug='lamp', price=Decimal('10.00'), stock=1,
+                    image=SimpleUploadedFile('lamp.jpg', self.jpeg(800, 400), content_type='image/jpeg'),
+                )
+            product.refresh_from_db()
+            srcset = ProductSerializer(product).data['image_srcset']
+
+        self.assertEqual(product.image_variants, {'source': product.image.name, 'widths': [320, 640]})
+        with Image.open(os.path.join(self.media_root, product.image.name)) as original:
+            self.assertEqual(original.size, (800, 400))
+            self.assertFalse(original.getexif())
+        self.assertEqual(
+            srcset['webp'],
+            '/media/variants/products/lamp/320.webp 320w, /media/variants/products/lamp/640.webp 640w',
+        )
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Lamps', slug='lamps')
+        for i in range(3):
+            product = Product.objects.create(
+                name=f'Lamp {i}', slug=f'lamp-{i}', description='x' * 1000,
+                price=Decimal('10.00') + i, stock=1,
+            )
+            product.categories.add(category)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_card_view_selects_only_card_columns(self):
+        catalog_state(None)
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get('/api/store/products/', {'view': 'card', 'sort_by': 'newest', 'page_size': 2})
+
+        products = response.data['products']
+        self.assertEqual(
+            list(products[0]),
+            ['id', 'name', 'slug', 'price', 'image', 'image_srcset', 'available', 'category_slugs'],
+        )
+        self.assertEqual(products[0]['category_slugs'], ['lamps'])
+        self.assertIsNotNone(response.data['next_cursor'])
+        product_query = next(query['sql'] for query in queries.captured_queries if 'FROM "store_product"' in query['sql'])
+        self.assertNotIn('"description"', product_query)
+
+    def test_fields_and_omit(self):
+        response = self.client.get('/api/store/products/', {'fields': 'id,slug,updated_at,bogus'})
+        self.assertEqual(list(response.data['products'][0]), ['id', 'slug', 'updated_at'])
+
+        response = self.client.get('/api/store/products/', {'omit': 'description,categories,category_names,category_slugs'})
+        product = response.data['products'][0]
+        self.assertNotIn('description', product)
+        self.assertNotIn('category_slugs', product)
+        self.assertIn('price', product)
+
+
+class ProductLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f'Cup {i}', slug=f'cup-{i}', price=Decimal('5.00'), stock=1)
+            for i in range(3)
+        ]
+        cls.products[2].available = False
+        cls.products[2].save()
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_lookup_by_id_keeps_request_order(self):
+        first, second, unavailable = self.products
+        ids = [second.id, 999999, first.id, unavailable.id]
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/store/products/lookup/', {'ids': ids}, format='json')
+
+        results = response.data['products']
+        self.assertEqual([result.get('slug') for result in results], ['cup-1', None, 'cup-0', 'cup-2'])
+        self.assertEqual(results[1], {'id': 999999, 'not_found': True})
+        self.assertFalse(results[3]['available'])
+        self.assertNotIn('description', results[0])
+
+    def test_lookup_by_slug(self):
+        response = self.client.get('/api/store/products/lookup/', {'slugs': 'cup-2,nope', 'fields': 'id,price'})
+        self.assertEqual(response.data['products'], [
+            {'id': self.products[2].id, 'price': '5.00'},
+            {'slug': 'nope', 'not_found': True},
+        ])
+
+    def test_rejects_bad_input(self):
+        self.assertEqual(self.client.get('/api/store/products/lookup/', {'ids': 'a,b'}).status_code, 400)
+        response = self.client.post('/api/store/products/lookup/', {'ids': list(range(300))}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(name='Running', slug='running')
+        for name in ['Trail Running Shoes', 'Running Shoes', 'Rugby Ball', 'Tennis Racket']:
+            Product.objects.create(name=name, slug=name.lower().replace(' ', '-'), price=Decimal('1.00'), stock=1)
+        BlogPost.objects.create(title='How to start running', slug='start-running', content='...', is_published=True)
+        BlogPost.objects.create(title='Running drafts', slug='running-drafts', content='...')
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_suggests_word_prefixes_by_type(self):
+        response = self.client.get('/api/store/autocomplete/', {'q': 'Run'})
+        self.assertEqual(
+            [product['slug'] for product in response.data['products']],
+            ['running-shoes', 'trail-running-shoes'],
+        )
+        self.assertEqual(response.data['categories'], [{'name': 'Running', 'slug': 'running'}])
+        self.assertEqual(response.data['posts'], [{'name': 'How to start running', 'slug': 'start-running'}])
+
+    def test_index_is_reused_until_catalog_changes(self):
+        self.client.get('/api/store/autocomplete/', {'q': 'ru'})
+        # Only the shared generation is read
+        with self.assertNumQueries(1):
+            self.client.get('/api/store/autocomplete/', {'q': 'rug'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Rugby Boots', slug='rugby-boots', price=Decimal('1.00'), stock=1)
+        response = self.client.get('/api/store/autocomplete/', {'q': 'rug', 'limit': 1})
+        self.assertEqual(response.data['products'], [{'name': 'Rugby Ball', 'slug': 'rugby-ball'}])
+        response = self.client.get('/api/store/autocomplete/', {'q': 'rugby b'})
+        self.assertEqual(len(response.data['products']), 2)
+
+        # Another worker renamed it: no signal here, only the shared counter
+        Product.objects.filter(slug='rugby-boots').update(name='Hiking Boots')
+        bump_shared_generation('autocomplete')
+        response = self.client.get('/api/store/autocomplete/', {'q': 'rugby b'})
+        self.assertEqual(len(response.data['products']), 1)
+
+    def test_short_prefixes_get_the_best_ranked_suggestions(self):
+        # Many labels sort before "r" ones alphabetically and match "r" only
+        # past their first word; every label starting with "r" still wins
+        Product.objects.bulk_create(
+            Product(name=f'Blue Rain Jacket {number}', slug=f'jacket-{number}', price=Decimal('1.00'), stock=1)
+            for number in range(60)
+        )
+        response = self.client.get('/api/store/autocomplete/', {'q': 'r', 'limit': 2})
+        self.assertEqual(
+            [product['slug'] for product in response.data['products']], ['rugby-ball', 'running-shoes']
+        )
+        self.assertEqual(
+            self.client.get('/api/store/autocomplete/', {'q': 'r', 'limit': 2}).data, response.data
+        )
+
+
+class ProductFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(name='Kettle & Pot', slug='kettle', price=Decimal('12.50'), stock=1)
+        Product.objects.create(name='Old Mug', slug='old-mug', price=Decimal('3.00'), stock=0, available=False)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_formats(self):
+        lines = self.read(self.client.get('/api/store/feed.ndjson')).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[1])['availability'], 'out of stock')
+        self.assertTrue(json.loads(lines[0])['link'].endswith('/product/kettle'))
+        # store.Product has no brand, GTIN or MPN to report
+        self.assertEqual(json.loads(lines[0])['identifier_exists'], 'no')
+
+        rows = list(csv.reader(io.StringIO(self.read(self.client.get('/api/store/feed.csv')))))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'description'])
+        self.assertEqual(rows[1][1], 'Kettle & Pot')
+
+        xml = self.read(self.client.get('/api/store/feed.xml'))
+        self.assertIn('<g:title>Kettle &amp; Pot</g:title>', xml)
+        self.assertIn('<g:price>125 IRR</g:price>', xml)
+        self.assertIn('<g:identifier_exists>no</g:identifier_exists>', xml)
+
+    def test_since_limits_to_changed_products(self):
+        Product.objects.filter(slug='old-mug').update(updated_at=timezone.now() - timedelta(days=10))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        lines = self.read(self.client.get('/api/store/feed.ndjson', {'since': since})).splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['Kettle & Pot'])
+        self.assertEqual(self.client.get('/api/store/feed.ndjson', {'since': 'yesterday'}).status_code, 400)
+
+
+class SitemapTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.category = Category.objects.create(name='Desks', slug='desks')
+        Product.objects.create(name='Desk', slug='desk', price=Decimal('1.00'), stock=1)
+
+    def update(self):
+        return update_sitemaps(self.root, 'https://shop.test', 'https://shop.test/sitemaps')
+
+    def test_only_changed_shards_are_rewritten(self):
+        self.assertEqual(sorted(self.update()), ['categories-0.xml', 'pages.xml', 'products-0.xml'])
+        with open(os.path.join(self.root, 'products-0.xml')) as shard:
+            self.assertIn('<loc>https://shop.test/product/desk</loc>', shard.read())
+        with open(os.path.join(self.root, 'pages.xml')) as shard:
+            self.assertIn('<loc>https://shop.test/products</loc>', shard.read())
+        with open(os.path.join(self.root, 'sitemap.xml')) as index:
+            index = index.read()
+        self.assertIn('<loc>https://shop.test/sitemaps/categories-0.xml</loc>', index)
+        self.assertIn('<loc>https://shop.test/sitemaps/pages.xml</loc>', index)
+
+        self.assertEqual(self.update(), [])
+
+        self.category.name = 'Standing desks'
+        self.category.save()
+        self.assertEqual(self.update(), ['categories-0.xml'])
+
+        Product.objects.filter(slug='desk').update(available=False)
+        self.assertEqual(self.update(), ['products-0.xml'])
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'products-0.xml')))
+
+
+class CounterCacheTests(TestCase):
+    def counts(self):
+        return dict(Category.objects.values_list('slug', 'product_count'))
+
+    def test_product_count_follows_memberships(self):
+        shoes = Category.objects.create(name='Shoes', slug='shoes')
+        sale = Category.objects.create(name='Sale', slug='sale')
+        boot = Product.objects.create(name='Boot', slug='boot', price=Decimal('1.00'), stock=1)
+        sandal = Product.objects.create(name='Sandal', slug='sandal', price=Decimal('1.00'), stock=1)
+
+        boot.categories.add(shoes, sale)
+        sale.products.add(sandal)
+        self.assertEqual(self.counts(), {'shoes': 1, 'sale': 2})
+
+        boot.categories.remove(sale, sale)
+        sandal.categories.remove(shoes)
+        self.assertEqual(self.counts(), {'shoes': 1, 'sale': 1})
+
+        sale.products.clear()
+        boot.categories.set([sale])
+        self.assertEqual(self.counts(), {'shoes': 0, 'sale': 1})
+
+        boot.delete()
+        self.assertEqual(self.counts(), {'shoes': 0, 'sale': 0})
+
+    def test_repair_command(self):
+        category = Category.objects.create(name='Hats', slug='hats')
+        Product.objects.create(name='Cap', slug='cap', price=Decimal('1.00'), stock=1).categories.add(category)
+        tag = Tag.objects.create(name='News')
+        BlogPost.objects.create(title='Hello', slug='hello', content='...').tags.add(tag)
+        Category.objects.update(product_count=7)
+        Tag.objects.update(post_count=7)
+
+        call_command('repair_counters', stdout=io.StringIO())
+
+        self.assertEqual(self.counts(), {'hats': 1})
+        self.assertEqual(Tag.objects.get().post_count, 1)
+
+
+class CatalogQueryTests(TestCase):
+    def query(self, **params):
+        return CatalogQuery(Request(APIRequestFactory().get('/', params)), ProductSerializer)
+
+    def test_equivalent_requests_share_filter_params(self):
+        # Listing totals are cached under these (ecommerce.counting)
+        first = self.query(search='  Red   Shoes', min_price='100', sort_by='bogus')
+        second = self.query(search='red shoes', min_price='100.00', sort_by='relevance')
+        self.assertEqual(first.sort_by, 'relevance')
+        self.assertEqual(first.filter_params(), second.filter_params())
+        self.assertNotEqual(first.filter_params(), self.query(search='red shoes').filter_params())
+
+    def test_price_filters_and_validation(self):
+        Product.objects.create(name='Cheap', slug='cheap', price=Decimal('5.00'), stock=1)
+        Product.objects.create(name='Dear', slug='dear', price=Decimal('50.00'), stock=1)
+        query = self.query(min_price='10', view='card')
+        self.assertEqual([product.slug for product in query.build(Product.objects.catalog())], ['dear'])
+
+        response = APIClient().get('/api/store/products/', {'max_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('max_price', response.data)
+
+
+class ListingCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            BlogPost.objects.create(title=f'Post {i}', slug=f'post-{i}', content='...', is_published=True)
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/blog/', params)
+        return response, [query['sql'] for query in queries.captured_queries if '__count' in query['sql']]
+
+    def test_exact_counts_are_cached_until_posts_change(self):
+        response, counts = self.count_queries({'page_size': 4})
+        self.assertEqual((response.data['total_items'], response.data['total_pages']), (5, 2))
+        self.assertEqual(len(counts), 1)
+
+        response, counts = self.count_queries({'page_size': 4, 'page': 2})
+        self.assertEqual(len(response.data['posts']), 1)
+        self.assertEqual(counts, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlogPost.objects.create(title='Post 5', slug='post-5', content='...', is_published=True)
+        response, counts = self.count_queries({'page_size': 4})
+        self.assertEqual(response.data['total_items'], 6)
+        self.assertEqual(len(counts), 1)
+
+    def test_countless_mode(self):
+        response, counts = self.count_queries({'page_size': 4, 'count': 'none'})
+        self.assertEqual(counts, [])
+        self.assertTrue(response.data['has_next'])
+        self.assertNotIn('total_items', response.data)
+        self.assertEqual(len(response.data['posts']), 4)
+
+        response, _ = self.count_queries({'page_size': 4, 'page': 2, 'count': 'none'})
+        self.assertFalse(response.data['has_next'])
+
+
+class PersianSearchTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_normalize_text(self):
+        # Arabic yeh/kaf, ZWNJ, diacritics, tatweel and Persian digits
+        self.assertEqual(normalize_text('كتاب‌هاي  مُـفيد ۱۲'), 'کتاب های مفید 12')
+
+    def test_search_matches_across_letter_forms(self):
+        # Stored with Arabic letter forms, searched with Persian ones
+        Product.objects.create(name='كيف چرمي', slug='bag', price=Decimal('1.00'), stock=1)
+        Product.objects.create(name='کفش', slug='shoe', price=Decimal('1.00'), stock=1)
+        self.assertEqual(Product.objects.get(slug='bag').search_text, 'کیف چرمی\n')
+
+        response = self.client.get('/api/store/products/', {'search': 'کیف'})
+        self.assertEqual([product['slug'] for product in response.data['products']], ['bag'])
+
+    def test_save_with_update_fields_refreshes_search_text(self):
+        product = Product.objects.create(name='Lamp', slug='lamp', price=Decimal('1.00'), stock=1)
+        product.name = 'چراغ ۲'
+        product.save(update_fields=['name'])
+        self.assertEqual(Product.objects.get(pk=product.pk).search_text, 'چراغ 2\n')
+
+    def test_blog_search(self):
+        BlogPost.objects.create(title='راهنماي خريد', slug='guide', content='...', is_published=True)
+        response = self.client.get('/api/blog/', {'search': 'راهنمای'})
+        self.assertEqual([post['slug'] for post in response.data['posts']], ['guide'])
+
+
+class DidYouMeanTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def frequencies(self):
+        return dict(SearchTerm.objects.filter(frequency__gt=0).values_list('term', 'frequency'))
+
+    def test_vocabulary_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lamp = Product.objects.create(name='Desk Lamp', slug='lamp', price=Decimal('1.00'), stock=1)
+            Category.objects.create(name='Lamps', slug='lamps')
+        self.assertEqual(self.frequencies(), {'desk': 1, 'lamp': 1, 'lamps': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lamp.name = 'Floor Lamp'
+            lamp.save()
+        self.assertEqual(self.frequencies(), {'floor': 1, 'lamp': 1, 'lamps': 1})
+
+        # The words a loaded row had come from the values it was loaded with
+        loaded = Product.objects.get(pk=lamp.pk)
+        loaded.name = 'Floor Lamp Shade'
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            loaded.save()
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+        self.assertEqual(self.frequencies(), {'floor': 1, 'lamp': 1, 'lamps': 1, 'shade': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.catalog().get(pk=lamp.pk).delete()
+        self.assertEqual(self.frequencies(), {'lamps': 1})
+
+    def test_empty_search_suggests_known_spelling(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Leather Wallet', slug='wallet', price=Decimal('1.00'), stock=1)
+            Product.objects.create(name='Leather Belt', slug='belt', price=Decimal('1.00'), stock=1)
+
+        response = self.client.get('/api/store/products/', {'search': 'lether walet'})
+        self.assertEqual(response.data['did_you_mean'], 'leather wallet')
+        self.assertEqual([product['slug'] for product in response.data['products']], ['wallet'])
+
+        # Matching searches carry no suggestion
+        response = self.client.get('/api/store/products/', {'search': 'leather'})
+        self.assertNotIn('did_you_mean', response.data)
+        self.assertEqual(len(response.data['products']), 2)
+
+
+class InvertedIndexTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_and_or_prefix_queries(self):
+        index = InvertedIndex()
+        index.add(1, [('Red Shirt', 3), ('cotton', 1)])
+        index.add(2, [('Blue Shirt', 3), ('Red buttons', 1)])
+        index.add(3, [('Blue Jeans', 3), ('', 1)])
+
+        self.assertEqual([doc for doc, _ in index.search('red shirt')], [1, 2])  # name outranks description
+        self.assertEqual({doc for doc, _ in index.search('jeans OR cotton')}, {1, 3})
+        self.assertEqual({doc for doc, _ in index.search('shi')}, {1, 2})
+        self.assertEqual(index.search('green'), [])
+
+        index.add(1, [('Green Shirt', 3)])
+        index.remove(3)
+        self.assertEqual([doc for doc, _ in index.search('red')], [2])
+        self.assertEqual(index.search('jeans'), [])
+        self.assertNotIn('cotton', index.words())
+
+    @override_settings(CATALOG_SEARCH_BACKEND='memory')
+    def test_listings_search_through_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Wool Scarf', slug='scarf', price=Decimal('1.00'), stock=1)
+            BlogPost.objects.create(title='Caring for wool', slug='wool', content='...', is_published=True)
+        response = self.client.get('/api/store/products/', {'search': 'woo'})
+        self.assertEqual([product['slug'] for product in response.data['products']], ['scarf'])
+        response = self.client.get('/api/blog/', {'search': 'wool'})
+        self.assertEqual([post['slug'] for post in response.data['posts']], ['wool'])
+
+        # Writes in this process update the built index in place
+        with self.captureOnCommitCallbacks(execute=True):
+            hat = Product.objects.create(name='Wool Hat', slug='hat', price=Decimal('1.00'), stock=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/store/products/', {'search': 'wool OR silk'})
+        self.assertEqual({product['slug'] for product in response.data['products']}, {'scarf', 'hat'})
+        self.assertFalse([query for query in queries if 'description' in query['sql'] and 'LIKE' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hat.delete()
+        response = self.client.get('/api/store/products/', {'search': 'wool'})
+        self.assertEqual([product['slug'] for product in response.data['products']], ['scarf'])
+
+    @override_settings(CATALOG_SEARCH_BACKEND='memory')
+    def test_filters_apply_before_the_best_hits_are_cut(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            # Equal scores rank newer rows first, so this one comes last
+            Product.objects.create(name='Shirt', slug='dear', price=Decimal('900.00'), stock=1)
+            for number in range(3):
+                Product.objects.create(name='Shirt', slug=f'cheap-{number}', price=Decimal('1.00'), stock=1)
+        with mock.patch('store.textsearch.MAX_HITS', 2):
+            response = self.client.get('/api/store/products/', {'search': 'shirt', 'min_price': '500'})
+        self.assertEqual([product['slug'] for product in response.data['products']], ['dear'])
+
+    @override_settings(CATALOG_SEARCH_BACKEND='memory')
+    def test_writes_in_other_processes_rebuild_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            scarf = Product.objects.create(name='Wool Scarf', slug='scarf', price=Decimal('1.00'), stock=1)
+        self.assertEqual(len(self.client.get('/api/store/products/', {'search': 'wool'}).data['products']), 1)
+
+        # Another worker renamed it: no signal here, only the shared counter
+        Product.objects.filter(pk=scarf.pk).update(name='Silk Scarf')
+        bump_shared_generation('text_index_store.Product')
+        self.assertEqual(self.client.get('/api/store/products/', {'search': 'wool'}).data['products'], [])
@@ -0,0 +1,132 @@
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.signals import post_delete, post_save
+
+from ecommerce.search import RANK_SCALE
+from ecommerce.textindex import InvertedIndex
+
+from .cache import bump_shared_generation, shared_generation
+
+# Text indexed per model, as (field, weight): a word in a name counts three
+# times as much as one in the description.
+INDEXED_FIELDS = {
+    'store.Product': (('name', 3), ('description', 1)),
+    'products.Product': (('name', 3), ('description', 1)),
+    'blog.BlogPost': (('title', 3), ('excerpt', 2), ('content', 1)),
+}
+
+# Best matches a search passes on to the database as `pk IN (...)` with a
+# rank, among those the searched queryset's filters let through; anything
+# ranked lower is not returned.
+MAX_HITS = 1000
+
+_lock = threading.Lock()
+# Model label -> (generation, InvertedIndex) built in this process
+_indexes = {}
+
+
+def enabled():
+    return getattr(settings, 'CATALOG_SEARCH_BACKEND', 'database') == 'memory'
+
+
+def uses_text_index(queryset):
+    """Whether searches of queryset go through the in-process index."""
+    return enabled() and queryset.model._meta.label in INDEXED_FIELDS
+
+
+def _endpoint(label):
+    return f'text_index_{label}'
+
+
+def _document(instance, label):
+    return [(getattr(instance, field) or '', weight) for field, weight in INDEXED_FIELDS[label]]
+
+
+def get_index(model):
+    """
+    The process's index of model, rebuilt when another process has written
+    to the model since it was built; writes in this process are applied to
+    it incrementally (see index_on_save). The generation counting writes is
+    kept in the database (store.models.IndexGeneration), since the catalog
+    cache may be local to each process.
+    """
+    label = model._meta.label
+    generation = shared_generation(_endpoint(label))
+    built_for, index = _indexes.get(label, (None, None))
+    if built_for != generation:
+        with _lock:
+            built_for, index = _indexes.get(label, (None, None))
+            if built_for != generation:
+                index = InvertedIndex()
+                fields = [field for field, _ in INDEXED_FIELDS[label]]
+                for row in model._default_manager.values_list('pk', *fields).iterator(chunk_size=2000):
+                    index.add(row[0], zip(row[1:], (weight for _, weight in INDEXED_FIELDS[label])))
+                _indexes[label] = (generation, index)
+    return index
+
+
+def _apply(label, change):
+    """Run change on this process's index after commit, then tell the others."""
+    def apply():
+        built_for, index = _indexes.get(label, (None, None))
+        if index is not None:
+            change(index)
+        generation = bump_shared_generation(_endpoint(label))
+        # Still current if no other process wrote in between
+        if index is not None and generation == built_for + 1:
+            _indexes[label] = (generation, index)
+
+    transaction.on_commit(apply)
+
+
+def index_on_save(sender, instance, raw=False, **kwargs):
+    label = sender._meta.label
+    if not raw and enabled():
+        document = _document(instance, label)
+        _apply(label, lambda index: index.add(instance.pk, document))
+
+
+def remove_on_delete(sender, instance, **kwargs):
+    label = sender._meta.label
+    if enabled():
+        pk = instance.pk
+        _apply(label, lambda index: index.remove(pk))
+
+
+def connect_signals():
+    for label in INDEXED_FIELDS:
+        app_label, _ = label.split('.')
+        if not apps.is_installed(app_label):
+            continue
+        model = apps.get_model(label)
+        post_save.connect(index_on_save, sender=model, dispatch_uid=f'text_index_save_{label}')
+        post_delete.connect(remove_on_delete, sender=model, dispatch_uid=f'text_index_delete_{label}')
+
+
+def index_search(queryset, text):
+    """
+    Rows of queryset among the best MAX_HITS index matches for text (AND of
+    prefix words, OR between "a OR b" alternatives), with an integer `rank`.
+
+    The index knows nothing of the queryset's filters, so when there are
+    more matches than that, they are first narrowed to the rows the
+    queryset selects; otherwise a filter could drop every one of the best
+    MAX_HITS while lower ranked rows match it.
+    """
+    hits = get_index(queryset.model).search(text)
+    if len(hits) > MAX_HITS:
+        selected = set(queryset.order_by().values_list('pk', flat=True))
+        hits = [hit for hit in hits if hit[0] in selected][:MAX_HITS]
+    if not hits:
+        return queryset.none().annotate(rank=Value(0, output_field=IntegerField()))
+    # Integer ranks, as cursor pagination needs (see ecommerce.search)
+    return queryset.filter(pk__in=[doc_id for doc_id, _ in hits]).annotate(
+        rank=Case(
+            *(When(pk=doc_id, then=Value(int(score * RANK_SCALE))) for doc_id, score in hits),
+            output_field=IntegerField(),
+        )
+    )
@@ -1,13 +1,16 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 app_name = 'store'
 
 urlpatterns = [
     path('', views.store_home, name='store_home'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
+    re_path(r'^feed\.(?P<feed_format>xml|csv|ndjson)$', views.product_feed, name='product-feed'),
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
     path('categories/<slug:slug>/', views.CategoryDetailView.as_view(), name='category-detail'),
     path('products/', views.ProductListView.as_view(), name='product-list'),
+    path('products/lookup/', views.ProductLookupView.as_view(), name='product-lookup'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     path('products/by-slug/<slug:slug>/', views.ProductBySlugView.as_view(), name='product-by-slug'),
 ] 
\ No newline at end of file
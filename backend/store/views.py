@@ -6,93 +6,175 @@ from .models import Category, Product
 from .serializers import CategorySerializer, ProductSerializer
 from rest_framework import generics, status
 from rest_framework.views import APIView
+from django.utils.decorators import method_decorator
+from ecommerce.feeds import feed_response
+from ecommerce.conditional import conditional_on, queryset_state
+from ecommerce.projections import project, requested_fields
+from .cache import cached_payload
+from .catalog import CatalogQuery
+from .facets import facet_counts, price_edges
+from .autocomplete import AUTOCOMPLETE_LIMIT, suggest
+from ecommerce.search import supports_full_text
+from .spelling import did_you_mean
 
 # Create your views here.
 
+# Most ids or slugs a single product lookup may ask for
+MAX_LOOKUP_KEYS = 250
+
+def catalog_state(request, *args, **kwargs):
+    # Every storefront payload is built from categories and products only.
+    # The state is cached and invalidated by the same signals as the payloads,
+    # so a revalidation that ends in a 304 usually costs no query at all.
+    def build():
+        return queryset_state(Category.objects.all(), Product.objects.all())
+    
+    return cached_payload('catalog_state', {}, build)
+
+catalog_conditional = conditional_on(catalog_state)
+
+def cached_categories():
+    def build():
+        return CategorySerializer(Category.objects.all(), many=True).data
+    
+    return cached_payload('category_list', {}, build)
+
+def product_listing(request, products):
+    """
+    Cursor-paginated product list response for the storefront: filters, sort,
+    page size and fields all come from the request via CatalogQuery.
+    """
+    query = CatalogQuery(request, ProductSerializer)
+    page = query.paginate(query.build(products))
+    extra = {}
+    if query.search and not query.fuzzy and not query.cursor and not page.object_list:
+        # Nothing matched, usually a typo: search the closest known spelling
+        # instead, or failing that match words by trigram similarity. The
+        # response says which, so later pages ask for the same.
+        original = query.search
+        suggestion = did_you_mean(original)
+        if suggestion:
+            query.search = suggestion
+            page = query.paginate(query.build(products))
+            extra['did_you_mean'] = suggestion
+        if not page.object_list and supports_full_text(products):
+            query.search, query.fuzzy = original, True
+            page = query.paginate(query.build(products))
+            extra = {'fuzzy': True}
+    response = Response({
+        'products': ProductSerializer(page.object_list, many=True, fields=query.fields).data,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'page_size': query.page_size,
+        **extra,
+    })
+    if query.facets:
+        # Storefront listings hold available products only: no availability facet
+        response.data['facets'] = facet_counts(
+            query.filter(products), cached_categories(), price_edges(request), available_field=None
+        )
+    return response
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_conditional
 def store_home(request):
-    categories = Category.objects.all()[:5]
-    featured_products = Product.objects.filter(available=True)[:8]
+    def build():
+        categories = Category.objects.all()[:5]
+        featured_products = Product.objects.catalog()[:8]
+        return {
+            'categories': CategorySerializer(categories, many=True).data,
+            'featured_products': ProductSerializer(featured_products, many=True).data,
+        }
     
-    return Response({
-        'categories': CategorySerializer(categories, many=True).data,
-        'featured_products': ProductSerializer(featured_products, many=True).data,
-    })
+    return Response(cached_payload('store_home', {}, build))
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_conditional
 def category_list(request):
-    categories = Category.objects.all()
-    serializer = CategorySerializer(categories, many=True)
-    return Response(serializer.data)
+    return Response(cached_categories())
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_conditional
 def category_detail(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    products = category.products.filter(available=True)
+    query = CatalogQuery(request, ProductSerializer)
+    products = query.build(category.products.catalog())
     
     return Response({
         'category': CategorySerializer(category).data,
-        'products': ProductSerializer(products, many=True).data,
+        'products': ProductSerializer(products, many=True, fields=query.fields).data,
     })
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_conditional
 def product_list(request):
-    products = Product.objects.filter(available=True)
-    
-    # Filter products by category
-    category_slug = request.query_params.get('category')
-    if category_slug:
-        products = products.filter(categories__slug=category_slug)
-    
-    # Search products
-    search_query = request.query_params.get('search')
-    if search_query:
-        products = products.filter(name__icontains=search_query)
-    
-    # Handle limit parameter
-    limit = request.query_params.get('limit')
-    if limit:
-        try:
-            limit = int(limit)
-            products = products[:limit]
-        except ValueError:
-            pass
-    
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    return product_listing(request, Product.objects.catalog())
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_conditional
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, available=True)
-    # Get related products from the same category
-    related_categories = product.categories.all()
-    related_products = Product.objects.filter(categories__in=related_categories).exclude(id=product.id).distinct()[:4]
+    product = get_object_or_404(Product.objects.catalog(), slug=slug)
+    # Related products are precomputed by store.related; read the best four
+    related_products = Product.objects.catalog().filter(
+        related_from__product=product
+    ).order_by('-related_from__score')[:4]
     
     return Response({
         'product': ProductSerializer(product).data,
         'related_products': ProductSerializer(related_products, many=True).data,
     })
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocomplete(request):
+    # Search box suggestions: names and slugs only, served from an in-process
+    # index so keystrokes never reach the product tables.
+    prefix = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), 1), AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    if not prefix:
+        return Response({'products': [], 'categories': [], 'posts': []})
+    return Response(suggest(prefix, limit))
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@catalog_conditional
+def product_feed(request, feed_format):
+    # Merchant / comparison site feed
+    return feed_response(request, Product.objects.all(), feed_format)
+
+@method_decorator(catalog_conditional, name='get')
 class CategoryListView(generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
+    
+    def list(self, request, *args, **kwargs):
+        # Image URLs are absolute here, so the host is part of the cache key
+        def build():
+            return self.get_serializer(self.get_queryset(), many=True).data
+        
+        return Response(cached_payload('category_list', {'host': request.get_host()}, build))
 
+@method_decorator(catalog_conditional, name='get')
 class CategoryDetailView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request, slug):
         try:
             category = Category.objects.get(slug=slug)
-            products = Product.objects.filter(categories__in=[category], available=True)
+            query = CatalogQuery(request, ProductSerializer)
+            products = query.build(Product.objects.catalog().filter(categories__in=[category]))
             
             category_serializer = CategorySerializer(category)
-            products_serializer = ProductSerializer(products, many=True)
+            products_serializer = ProductSerializer(products, many=True, fields=query.fields)
             
             return Response({
                 'category': category_serializer.data,
@@ -104,22 +186,28 @@ class CategoryDetailView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+@method_decorator(catalog_conditional, name='get')
 class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.filter(available=True)
+    queryset = Product.objects.catalog()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    
+    def list(self, request, *args, **kwargs):
+        return product_listing(request, self.get_queryset())
 
+@method_decorator(catalog_conditional, name='get')
 class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.filter(available=True)
+    queryset = Product.objects.catalog()
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
+@method_decorator(catalog_conditional, name='get')
 class ProductBySlugView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request, slug):
         try:
-            product = Product.objects.get(slug=slug, available=True)
+            product = Product.objects.catalog().get(slug=slug)
             serializer = ProductSerializer(product)
             return Response(serializer.data)
         except Product.DoesNotExist:
@@ -127,3 +215,54 @@ class ProductBySlugView(APIView):
                 {'detail': 'Product not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+
+@method_decorator(catalog_conditional, name='get')
+class ProductLookupView(APIView):
+    """
+    Fetch many products by id or slug in one query, e.g. to hydrate a cart or
+    re-check prices at checkout.
+
+    GET ?ids=3,1,7 or ?slugs=a,b, or POST {"ids": [...]} / {"slugs": [...]} for
+    long lists. Products come back in request order; keys with no product get
+    {"id": 7, "not_found": true} in their place. Unavailable products are
+    returned (with available=false) so callers can tell them from deleted
+    ones. Defaults to the card projection; ?view=, ?fields= and ?omit= apply.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        params = request.query_params
+        if 'slugs' in params:
+            return self.lookup(request, 'slug', params['slugs'].split(','))
+        return self.lookup(request, 'id', params.get('ids', '').split(','))
+    
+    def post(self, request):
+        if 'slugs' in request.data:
+            return self.lookup(request, 'slug', request.data['slugs'])
+        return self.lookup(request, 'id', request.data.get('ids'))
+    
+    def lookup(self, request, key, values):
+        if not isinstance(values, list) or not values or values == ['']:
+            return Response({'detail': f'Provide a list of {key}s'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(values) > MAX_LOOKUP_KEYS:
+            return Response(
+                {'detail': f'At most {MAX_LOOKUP_KEYS} {key}s per lookup'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            values = [int(value) if key == 'id' else str(value) for value in values]
+        except (TypeError, ValueError):
+            return Response({'detail': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        fields = requested_fields(request, ProductSerializer)
+        if fields is None:
+            fields = ProductSerializer.Meta.projections['card']
+        queryset = project(Product.objects.with_categories(), ProductSerializer, fields, extra=[key])
+        found = queryset.in_bulk(set(values), field_name=key)
+        
+        keys = list(found)
+        products = ProductSerializer([found[value] for value in keys], many=True, fields=fields).data
+        by_key = dict(zip(keys, products))
+        return Response({
+            'products': [by_key.get(value) or {key: value, 'not_found': True} for value in values],
+        })
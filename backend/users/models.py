@@ -56,6 +56,8 @@ class UserProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     phone = models.CharField(max_length=20, blank=True, null=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Resized copies of avatar, filled in by ecommerce.images
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     
     # Address fields
     street = models.TextField(blank=True, null=True)
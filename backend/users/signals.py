@@ -0,0 +1,4 @@
+from ecommerce.images import register_variants
+from .models import UserProfile
+
+register_variants(UserProfile, 'avatar', 'avatar_variants')
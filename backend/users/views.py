@@ -16,6 +16,7 @@ from django.core.exceptions import ValidationError
 from rest_framework import serializers
 from django.http import Http404
 from rest_framework_simplejwt.views import TokenObtainPairView
+from ecommerce.images import ImageSrcsetField
 
 from .models import CustomUser, UserProfile, Address
 from .serializers import UserSerializer, RegisterSerializer, UserProfileSerializer, AddressSerializer
@@ -240,10 +241,11 @@ class ChangePasswordView(APIView):
 
 class UserProfileSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(source='user.email', read_only=True)
+    avatar_srcset = ImageSrcsetField(source='avatar_variants')
     
     class Meta:
         model = UserProfile
-        fields = ['id', 'phone', 'email', 'avatar', 'street', 'city', 'state', 'zipcode', 'country', 'is_default']
+        fields = ['id', 'phone', 'email', 'avatar', 'avatar_srcset', 'street', 'city', 'state', 'zipcode', 'country', 'is_default']
         
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', {})
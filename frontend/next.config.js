@@ -23,6 +23,16 @@ const nextConfig = {
         source: '/api/:path*',
         destination: 'http://localhost:8000/api/:path*',
       },
+      // Sitemap index and shards, pre-built by `manage.py update_sitemaps`
+      // into the media root and served as files with the rest of media
+      {
+        source: '/sitemap.xml',
+        destination: 'http://localhost:8000/media/sitemaps/sitemap.xml',
+      },
+      {
+        source: '/sitemaps/:file',
+        destination: 'http://localhost:8000/media/sitemaps/:file',
+      },
     ];
   },
 
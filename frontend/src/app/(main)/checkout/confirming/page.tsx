@@ -0,0 +1,123 @@
+'use client';
+
+import { useEffect, useState } from 'react';
+import { useRouter, useSearchParams } from 'next/navigation';
+import { Suspense } from 'react';
+import { Button } from '@/components/ui/button';
+import { Card, CardContent, CardFooter, CardHeader, CardTitle } from '@/components/ui/card';
+import { Clock } from 'lucide-react';
+import Link from 'next/link';
+import api from '@/lib/api';
+
+interface OrderStatus {
+  order_id: number;
+  status: string;
+  payment_status: string;
+  ref_id: string | null;
+  confirming: boolean;
+}
+
+// The backend verifies the payment in the background after ZarinPal's
+// callback; poll its status endpoint, slowing down, for up to two minutes
+const FIRST_POLL_DELAY = 1000;
+const MAX_POLL_DELAY = 5000;
+const GIVE_UP_AFTER = 2 * 60 * 1000;
+
+function ConfirmingPageContent() {
+  const router = useRouter();
+  const searchParams = useSearchParams();
+  const orderId = searchParams.get('order_id');
+
+  const [timedOut, setTimedOut] = useState(false);
+
+  useEffect(() => {
+    if (!orderId) {
+      router.replace('/checkout/failed');
+      return;
+    }
+
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout>;
+    const startedAt = Date.now();
+
+    const poll = async (delay: number) => {
+      try {
+        const response = await api.get<OrderStatus>(`/api/checkout/orders/${orderId}/status/`);
+        if (cancelled) return;
+        if (response.data.payment_status === 'paid') {
+          router.replace(`/checkout/success?order_id=${orderId}`);
+          return;
+        }
+        if (!response.data.confirming) {
+          router.replace(`/checkout/failed?order_id=${orderId}`);
+          return;
+        }
+      } catch (err) {
+        console.error('Error fetching order status:', err);
+      }
+      if (cancelled) return;
+      if (Date.now() - startedAt > GIVE_UP_AFTER) {
+        setTimedOut(true);
+        return;
+      }
+      timer = setTimeout(() => poll(Math.min(delay * 1.5, MAX_POLL_DELAY)), delay);
+    };
+
+    poll(FIRST_POLL_DELAY);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [orderId, router]);
+
+  return (
+    <div className="container mx-auto py-10" dir="rtl">
+      <div className="max-w-lg mx-auto">
+        <Card>
+          <CardHeader className="text-center">
+            <Clock className="mx-auto h-16 w-16 text-primary mb-4" />
+            <CardTitle className="text-2xl">در حال تایید پرداخت</CardTitle>
+          </CardHeader>
+
+          <CardContent className="space-y-4">
+            {timedOut ? (
+              <p className="text-center text-muted-foreground">
+                تایید پرداخت بیش از حد معمول طول کشیده است. وضعیت سفارش را می‌توانید در بخش سفارش‌های من دنبال کنید.
+              </p>
+            ) : (
+              <>
+                <div className="flex justify-center py-8">
+                  <div className="animate-spin h-8 w-8 border-4 border-primary border-t-transparent rounded-full"></div>
+                </div>
+                <p className="text-center text-muted-foreground">
+                  پرداخت شما دریافت شد و در حال تایید با درگاه بانکی است. لطفاً این صفحه را نبندید.
+                </p>
+              </>
+            )}
+          </CardContent>
+
+          {timedOut && (
+            <CardFooter className="flex flex-col gap-2">
+              <Link href="/account/orders" className="w-full">
+                <Button className="w-full">مشاهده سفارش‌های من</Button>
+              </Link>
+            </CardFooter>
+          )}
+        </Card>
+      </div>
+    </div>
+  );
+}
+
+export default function ConfirmingPage() {
+  return (
+    <Suspense fallback={
+      <div className="container mx-auto py-20 flex flex-col items-center justify-center" dir="rtl">
+        <div className="animate-spin h-8 w-8 border-4 border-primary border-t-transparent rounded-full"></div>
+        <p className="mt-4">در حال بارگیری اطلاعات سفارش...</p>
+      </div>
+    }>
+      <ConfirmingPageContent />
+    </Suspense>
+  );
+}